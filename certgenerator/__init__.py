@@ -1,7 +1,28 @@
+import sys
+from types import ModuleType
 import decorators
 import callbacks
 import cert_exceptions
 import test
 from config import Config
-from certificate import Certificate
+from context import get_context, reset_context
 from tools import Tools, validate_subject
+
+
+class LazyModule(ModuleType):
+    """
+    certgenerator module, certificate (and OpenSSL) is imported on first access of Certificate
+    """
+    def __getattr__(self, item):
+        if item == "Certificate":
+            from certificate import Certificate
+            setattr(self, item, Certificate)
+            return Certificate
+        raise AttributeError("module {m} has no attribute {a}".format(m=self.__name__, a=item))
+
+
+module = LazyModule(__name__, __doc__)
+module.__dict__.update(sys.modules[__name__].__dict__)
+# keep old module alive, its globals are used by LazyModule methods
+module._module = sys.modules[__name__]
+sys.modules[__name__] = module
@@ -0,0 +1,104 @@
+import csv
+import hashlib
+import os
+import tarfile
+import tempfile
+import time
+import zipfile
+from io import BytesIO
+from cert_exceptions import BadExtensionException
+
+
+class Archive:
+    extensions = {
+        ".tar": "w",
+        ".tar.gz": "w:gz",
+        ".tgz": "w:gz",
+        ".zip": None
+    }
+    manifest_name = "manifest.csv"
+
+    def __init__(self, path):
+        """
+        Write generated files in a single tar or zip file,
+        manifest.csv is added as last member when archive is closed
+        :param path: .tar, .tar.gz, .tgz or .zip
+        """
+        self.path = path
+        self.count = 0
+        self._tar = None
+        self._zip = None
+        ext = self.get_extension(path)
+        if ext is None:
+            raise BadExtensionException("file {f}: Extension {e} is expected"
+                                        .format(f=path, e=", ".join(sorted(self.extensions))))
+        if ext == ".zip":
+            self._zip = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, allowZip64=True)
+        else:
+            self._tar = tarfile.open(path, self.extensions[ext])
+        self.manifest = tempfile.NamedTemporaryFile(suffix=".csv")
+        self.writer = csv.writer(self.manifest)
+        self.writer.writerow(["serial", "type", "name", "size", "sha256"])
+
+    @classmethod
+    def get_extension(cls, path):
+        """
+        Return supported extension of path or None
+        :param path:
+        :return:
+        """
+        for ext in sorted(cls.extensions, key=len, reverse=True):
+            if path.endswith(ext):
+                return ext
+        return None
+
+    def write(self, name, data, mode=0644):
+        """
+        Add member to archive
+        :param name:
+        :param data:
+        :param mode:
+        :return:
+        """
+        if self._zip:
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = (0100000 | mode) << 16
+            self._zip.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = time.time()
+            info.mode = mode
+            self._tar.addfile(info, BytesIO(data))
+
+    def add(self, name, data, serial=None, mode=0644):
+        """
+        Add generated file to archive and manifest
+        :param name: path in archive
+        :param data:
+        :param serial:
+        :param mode:
+        :return:
+        """
+        self.write(name, data, mode=mode)
+        self.writer.writerow([serial or "", name.split(".")[-1], name, len(data), hashlib.sha256(data).hexdigest()])
+        self.count += 1
+
+    def close(self):
+        """
+        Add manifest and close archive
+        :return:
+        """
+        self.manifest.flush()
+        os.chmod(self.manifest.name, 0644)
+        if self._zip:
+            self._zip.write(self.manifest.name, self.manifest_name)
+            self._zip.close()
+        else:
+            info = self._tar.gettarinfo(self.manifest.name, self.manifest_name)
+            info.uid, info.gid, info.uname, info.gname = 0, 0, "", ""
+            with open(self.manifest.name, "rb") as f:
+                self._tar.addfile(info, f)
+            self._tar.close()
+        self.manifest.close()
@@ -0,0 +1,199 @@
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from timeit import default_timer
+from tools import Tools
+
+# OpenSSL is imported by Bench methods, cli imports STAGES at startup
+STAGES = ("keygen-1024", "keygen-2048", "keygen-4096", "keygen-p256", "keygen-p384", "keygen-ed25519", "sign",
+          "dump-key", "dump-csr", "parse-yaml", "get-san", "read-csv", "check-csr", "p12-export", "check-p12")
+
+
+def percentile(values, p):
+    """
+    Return percentile p of sorted values (nearest rank)
+    :param values:
+    :param p: 0 to 100
+    :return:
+    """
+    if not values:
+        return 0.0
+    rank = int(round(p / 100.0 * (len(values) - 1)))
+    return values[rank]
+
+
+class Bench:
+    def __init__(self, cert, rounds=20):
+        """
+        Time each stage of csr and p12 generation with real Certificate code
+        :param cert: Certificate
+        :param rounds: number of timed calls per stage
+        """
+        self.cert = cert
+        self.rounds = rounds
+        self.folder = None
+        self.password = "3z6F2Xfc"
+        self.stages = OrderedDict([
+            ("keygen-1024", lambda: self.keygen(1024)),
+            ("keygen-2048", lambda: self.keygen(2048)),
+            ("keygen-4096", lambda: self.keygen(4096)),
+            ("keygen-p256", lambda: self.keygen(key_type="ec", curve="P-256")),
+            ("keygen-p384", lambda: self.keygen(key_type="ec", curve="P-384")),
+            ("keygen-ed25519", lambda: self.keygen(key_type="ed25519")),
+            ("sign", self.sign),
+            ("dump-key", lambda: self.cert.generate_file(self.path("bench.key"), self.key)),
+            ("dump-csr", lambda: self.cert.generate_file(self.path("bench.csr"), self.req)),
+            ("parse-yaml", self.parse_yaml),
+            ("get-san", self.get_san),
+            ("read-csv", lambda: sum(1 for _ in self.cert.read_csv(self.path("bench.csv"), absolute=True))),
+            ("check-csr", lambda: self.cert.check_csr(self.path("bench.csr"), read=False)),
+            ("p12-export", self.p12_export),
+            ("check-p12", lambda: self.cert.check_p12(self.path("bench.p12"), password=self.password, read=False)),
+        ])
+        self.key = None
+        self.req = None
+        self.x509 = None
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def setup(self, csv_rows=1000):
+        """
+        Create key, csr, certificate, csv and p12 read by stages
+        :param csv_rows:
+        :return:
+        """
+        from OpenSSL import crypto
+        from workers import fill_subject
+        self.folder = tempfile.mkdtemp(prefix="certbench")
+        self.key = self.keygen(2048)
+        self.sign()
+        self.x509 = crypto.X509()
+        fill_subject(self.x509, self.cert.get_subject() or {"CN": "bench"}, self_signed=True)
+        self.x509.set_serial_number(1)
+        self.x509.gmtime_adj_notBefore(0)
+        self.x509.gmtime_adj_notAfter(3600)
+        self.x509.set_pubkey(self.key)
+        self.x509.sign(self.key, "sha256")
+        self.cert.generate_file(self.path("bench.csr"), self.req)
+        with open(self.path("bench.csv"), "w") as f:
+            f.write("serial\n")
+            for i in xrange(csv_rows):
+                f.write("bench{i}\n".format(i=i))
+        with open(self.path("bench.p12"), "wb") as f:
+            f.write(self.p12_export())
+
+    def teardown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def keygen(self, size=2048, key_type="rsa", curve="P-256"):
+        self.cert._key_size = size
+        self.cert._key_type = key_type
+        self.cert._curve = curve
+        return self.cert.generate_key()
+
+    def sign(self):
+        from workers import build_request
+        self.req = build_request(self.key, self.cert.get_subject() or {"CN": "bench"},
+                                 self.cert.get_template().extensions)
+        return self.req
+
+    def parse_yaml(self):
+        if self.cert.config and "yamlfile" in self.cert.config:
+            return self.cert.parse_yaml(self.cert.config.get("yamlfile"))
+        return self.cert.parse_yaml(self.cert.tools.config.get("config", "yamlfile"))
+
+    def get_san(self):
+        self.cert.template = None
+        return self.cert.get_san()
+
+    def p12_export(self):
+        from OpenSSL import crypto
+        pkcs12 = crypto.PKCS12()
+        pkcs12.set_privatekey(self.key)
+        pkcs12.set_certificate(self.x509)
+        return pkcs12.export(passphrase=self.password)
+
+    def time_stage(self, name):
+        """
+        Run stage and return its statistics
+        :param name:
+        :return:
+        """
+        func = self.stages[name]
+        times = []
+        for _ in xrange(self.rounds):
+            start = default_timer()
+            func()
+            times.append(default_timer() - start)
+        times.sort()
+        total = sum(times)
+        return OrderedDict([
+            ("stage", name),
+            ("rounds", len(times)),
+            ("total", total),
+            ("mean", total / len(times)),
+            ("ops_per_sec", len(times) / total if total else 0.0),
+            ("min", times[0]),
+            ("p50", percentile(times, 50)),
+            ("p95", percentile(times, 95)),
+            ("p99", percentile(times, 99)),
+            ("max", times[-1]),
+        ])
+
+    def run(self, stages=None, callback=None):
+        """
+        Run stages and return report
+        :param stages: names of stages, all if None
+        :param callback: called with statistics of each stage
+        :return:
+        """
+        from OpenSSL import SSL
+        results = []
+        key_size, key_type, curve = self.cert._key_size, self.cert._key_type, self.cert._curve
+        self.setup()
+        try:
+            for name in stages or STAGES:
+                result = self.time_stage(name)
+                results.append(result)
+                if callback:
+                    callback(result)
+        finally:
+            self.cert._key_size, self.cert._key_type, self.cert._curve = key_size, key_type, curve
+            self.teardown()
+        return OrderedDict([
+            ("version", Tools.get_app_info("__version__")),
+            ("python", sys.version.split()[0]),
+            ("openssl", SSL.SSLeay_version(SSL.SSLEAY_VERSION)),
+            ("platform", platform.platform()),
+            ("time", int(time.time())),
+            ("results", results),
+        ])
+
+    @staticmethod
+    def format(result):
+        """
+        Return one line of statistics
+        :param result:
+        :return:
+        """
+        return "{s:<14} {o:>10.1f} ops/s  mean {m:>9.3f} ms  p50 {p50:>9.3f} ms  p95 {p95:>9.3f} ms  " \
+               "p99 {p99:>9.3f} ms".format(s=result["stage"], o=result["ops_per_sec"], m=result["mean"] * 1000,
+                                          p50=result["p50"] * 1000, p95=result["p95"] * 1000,
+                                          p99=result["p99"] * 1000)
+
+    @staticmethod
+    def dump(report, path):
+        """
+        Write report as json
+        :param report:
+        :param path:
+        :return:
+        """
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,212 @@
+import csv
+import heapq
+import mmap
+import os
+from itertools import islice
+from io import BytesIO
+
+INDEX_HEADER = ["serial", "type", "offset", "length", "name"]
+
+
+class Bundle:
+    extension = ".pem"
+    # binary objects (p12) are written in archives, a PEM bundle only contains PEM objects
+    binary_types = ("p12",)
+    # index lines sorted in memory at once, larger indexes are sorted by runs merged at close
+    sort_lines = 100000
+
+    def __init__(self, path):
+        """
+        Append generated files to a single file (PEM bundle) instead of one file per key or csr,
+        offset and length of each file are written in a sidecar index [path].idx (tab separated)
+        sorted by serial when bundle is closed, so BundleReader finds a serial by bisection.
+        Index entries are appended unsorted to [path].idx.tmp, memory doesn't grow with the csv
+        :param path: .pem, bundle is only readable by owner because it contains private keys
+        """
+        self.path = path
+        self.index_path = path + ".idx"
+        self.count = 0
+        self.offset = 0
+        self.file = os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600), "wb")
+        self.unsorted = open(self.index_path + ".tmp", "w+b")
+        self.writer = csv.writer(self.unsorted, delimiter="\t", lineterminator="\n")
+
+    @classmethod
+    def is_bundle(cls, path):
+        return path.endswith(cls.extension)
+
+    def add(self, name, data, serial=None, mode=0644):
+        """
+        Append generated file to bundle, its index entry is sorted by close()
+        :param name: path relative to certificate folder, its extension is the type of the object
+        :param data:
+        :param serial:
+        :param mode: not used, bundle mode is 0600
+        :return:
+        """
+        kind = name.split(".")[-1]
+        if kind in self.binary_types:
+            raise ValueError("{n}: {k} can't be written in a PEM bundle".format(n=name, k=kind))
+        self.file.write(data)
+        self.writer.writerow([serial or "", kind, self.offset, len(data), name])
+        self.offset += len(data)
+        self.count += 1
+
+    def close(self):
+        """
+        Flush bundle and write index sorted by serial (objects of a serial keep their order):
+        runs of sort_lines lines are sorted in memory and written to temporary files, then merged
+        :return:
+        """
+        runs = []
+        try:
+            self.unsorted.seek(0)
+            while True:
+                lines = list(islice(self.unsorted, self.sort_lines))
+                if not lines:
+                    break
+                # sort is stable: objects of a serial keep their order in a run, runs are merged in order
+                lines.sort(key=self.key)
+                run = open("{p}.{n}".format(p=self.unsorted.name, n=len(runs)), "w+b")
+                runs.append(run)
+                run.writelines(lines)
+                run.seek(0)
+            with open(self.index_path, "wb") as index:
+                csv.writer(index, delimiter="\t", lineterminator="\n").writerow(INDEX_HEADER)
+                merged = heapq.merge(*[self.decorate(run, n) for n, run in enumerate(runs)])
+                index.writelines(line for _, _, _, line in merged)
+                index.flush()
+                os.fsync(index.fileno())
+        finally:
+            for f in runs + [self.unsorted]:
+                f.close()
+                os.remove(f.name)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+    @staticmethod
+    def key(line):
+        """
+        Return serial of index line as written in index
+        :param line:
+        :return:
+        """
+        return line[:line.find("\t")]
+
+    @classmethod
+    def decorate(cls, run, n):
+        """
+        Return (serial, run, position, line) of lines of a sorted run: equal serials are merged in order of runs
+        and positions, so objects of a serial keep the order they were added
+        :param run:
+        :param n: number of run
+        :return:
+        """
+        for position, line in enumerate(run):
+            yield cls.key(line), n, position, line
+
+
+class BundleReader:
+    def __init__(self, path):
+        """
+        Read objects of a PEM bundle, bundle and index are mapped in memory:
+        lines of a serial are found by bisection of the sorted index without parsing other lines
+        and only the requested objects are read from bundle
+        :param path: bundle, its index is [path].idx
+        """
+        self.path = path
+        self.file = open(path, "rb")
+        self.index_file = open(path + ".idx", "rb")
+        self.map = self.mmap(self.file)
+        self.index = self.mmap(self.index_file)
+        header = self.index[:self.index.find("\n")] if self.index else ""
+        # offset of first entry
+        self.start = len(header) + 1
+        if header.split("\t") != INDEX_HEADER:
+            self.close()
+            raise ValueError("{f}.idx is not an index of bundle".format(f=path))
+
+    @staticmethod
+    def mmap(f):
+        """
+        Return file mapped in memory, empty string for an empty file (mmap doesn't map empty file)
+        :param f:
+        :return:
+        """
+        if not os.fstat(f.fileno()).st_size:
+            return ""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def encode(serial):
+        """
+        Return serial as written in index
+        :param serial:
+        :return:
+        """
+        line = BytesIO()
+        csv.writer(line, delimiter="\t", lineterminator="\n").writerow([serial])
+        return line.getvalue()[:-1]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __contains__(self, serial):
+        return bool(self.lookup(serial))
+
+    def first(self, key):
+        """
+        Return offset of first index line whose serial is not lower than key (bisection on lines)
+        :param key: serial as written in index
+        :return:
+        """
+        low, high = self.start, len(self.index)
+        while low < high:
+            middle = (low + high) // 2
+            line = self.index.rfind("\n", 0, middle) + 1
+            if self.index[line:self.index.find("\t", line)] < key:
+                end = self.index.find("\n", middle)
+                low = end + 1 if end != -1 else len(self.index)
+            else:
+                high = line
+        return low
+
+    def lookup(self, serial):
+        """
+        Return index entries of serial
+        :param serial:
+        :return: list of (type, offset, length, name)
+        """
+        key = self.encode(serial)
+        prefix = key + "\t"
+        entries = []
+        start = self.first(key) if self.index else 0
+        while start < len(self.index) and self.index[start:start + len(prefix)] == prefix:
+            end = self.index.find("\n", start)
+            end = end if end != -1 else len(self.index)
+            _, kind, offset, length, name = next(csv.reader([self.index[start:end]], delimiter="\t"))
+            entries.append((kind, int(offset), int(length), name))
+            start = end + 1
+        return entries
+
+    def get(self, serial, kind=None):
+        """
+        Return objects of serial
+        :param serial:
+        :param kind: type of object (csr, key, pem, p12), all types if None
+        :return: list of (type, name, data)
+        """
+        return [(_kind, name, self.map[offset:offset + length])
+                for _kind, offset, length, name in self.lookup(serial)
+                if kind is None or _kind == kind]
+
+    def close(self):
+        for m in (self.map, self.index):
+            if m:
+                m.close()
+        self.file.close()
+        self.index_file.close()
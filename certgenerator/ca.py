@@ -0,0 +1,111 @@
+import fcntl
+import os
+import threading
+from OpenSSL import crypto
+from tools import Tools
+from workers import fill_subject, generate_key
+
+
+class SerialAllocator:
+    def __init__(self, path, block=1000):
+        """
+        Monotonic serial numbers stored in a file, serials are reserved by block
+        so the file is written once per block and not once per certificate.
+        Serials of a block not used (crash, end of run) are lost, never given twice
+        :param path: file containing next free serial (hex)
+        :param block: number of serials reserved at once
+        """
+        self.path = path
+        self.block = block
+        self.next_serial = 0
+        self.limit = 0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Reserve next block, a lock file is used so several processes can share serial file
+        (serial file itself is replaced by write_atomic)
+        :return:
+        """
+        with open(self.path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                start = 1
+                if os.path.exists(self.path):
+                    with open(self.path) as f:
+                        start = int(f.read().strip() or "1", 16)
+                Tools.write_atomic(self.path, "{s:X}\n".format(s=start + self.block), sync=True)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        self.next_serial, self.limit = start, start + self.block
+
+    def next(self):
+        """
+        Return next serial number
+        :return:
+        """
+        with self.lock:
+            if self.next_serial >= self.limit:
+                self.reserve()
+            serial = self.next_serial
+            self.next_serial += 1
+            return serial
+
+
+class LocalCA:
+    def __init__(self, folder):
+        """
+        Local CA signing csr in process, key and certificate are in folder (only readable by owner)
+        :param folder:
+        """
+        self.folder = folder
+        self.key_file = os.path.join(folder, "ca.key")
+        self.cert_file = os.path.join(folder, "ca.crt")
+        self.serials = SerialAllocator(os.path.join(folder, "serial"))
+
+    def exists(self):
+        return os.path.exists(self.key_file) and os.path.exists(self.cert_file)
+
+    def init(self, subject, key_type="rsa", key_size=4096, curve="P-256", days=3650):
+        """
+        Generate CA key and self signed certificate. Serial numbers of a CA initialized again continue
+        from serial file, a new CA starts from a random serial so certificates of two CA with
+        the same subject don't share serial numbers
+        :param subject:
+        :param key_type: rsa or ec
+        :param key_size:
+        :param curve:
+        :param days: validity of CA certificate
+        :return:
+        """
+        if not os.path.exists(self.folder):
+            os.mkdir(self.folder)
+        os.chmod(self.folder, 0700)
+        key = generate_key(key_type, key_size, curve)
+        cert = crypto.X509()
+        cert.set_version(2)
+        cert.set_serial_number(int(os.urandom(8).encode("hex"), 16))
+        fill_subject(cert, subject, self_signed=True)
+        cert.set_pubkey(key)
+        cert.gmtime_adj_notBefore(0)
+        cert.gmtime_adj_notAfter(days * 86400)
+        cert.add_extensions([
+            crypto.X509Extension("basicConstraints", True, "CA:TRUE"),
+            crypto.X509Extension("keyUsage", True, "keyCertSign, cRLSign"),
+            crypto.X509Extension("subjectKeyIdentifier", False, "hash", subject=cert),
+        ])
+        cert.sign(key, "sha256")
+        Tools.write_atomic(self.key_file, crypto.dump_privatekey(crypto.FILETYPE_PEM, key), mode=0600, sync=True)
+        Tools.write_atomic(self.cert_file, crypto.dump_certificate(crypto.FILETYPE_PEM, cert), sync=True)
+        if not os.path.exists(self.serials.path):
+            # 62 bits: positive serial with room for increments below 2^63
+            start = int(os.urandom(8).encode("hex"), 16) >> 2 or 1
+            Tools.write_atomic(self.serials.path, "{s:X}\n".format(s=start), sync=True)
+        return cert
+
+    def files(self):
+        """
+        Return (certificate, key) paths, loaded once per worker process by ca_sign_job()
+        :return:
+        """
+        return self.cert_file, self.key_file
@@ -1,6 +1,7 @@
 import click
 import sys
 from tools import validate_subject, Tools
+from shard import parse_shard
 
 
 def get_subject(ctx, param, value):
@@ -21,11 +22,20 @@ def print_version(ctx, param, value):
         return
 
     try:
-        tools = Tools()
-        version = tools.get_app_info("__version__")
-        name = tools.get_app_info("__title__")
+        version = Tools.get_app_info("__version__")
+        name = Tools.get_app_info("__title__")
         python_version = "{n} {v}".format(n="Python", v=sys.version)
         click.echo("{n} {v}\n{p}".format(n=name, v=version, p=python_version))
     except KeyError:
         pass
     ctx.exit()
+
+
+def get_shard(ctx, param, value):
+    if not value or ctx.resilient_parsing:
+        return
+
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
@@ -1,17 +1,57 @@
 import csv
+import errno
+import hashlib
 import logging
 import logging.handlers
 import os
 import json
 import click
 import shutil
+import sqlite3
+from collections import OrderedDict
+from contextlib import contextmanager
 from glob import glob
+from itertools import chain, islice
 from OpenSSL import crypto
-from tools import Tools, yaml
+from tools import Tools, get_yaml
+from context import get_context
+from archive import Archive
+from bundle import Bundle, BundleReader
+from claim import ClaimDir, claim_files, claim_path, default_owner
+from folder_index import FolderIndex
+from inventory import Inventory, inventory_batch
+from journal import Journal
+from keypool import KeyPool
+from template import RequestTemplate
+from pipeline import Pipeline
+from profiler import Profiler
+from state import RowState
+from reader import expand_paths, extract, load_csr, load_data, load_p12, read_batch, read_job
+from report import Report
+from shard import in_shard, merge_reports, missing_shards, shard_files, shard_path
+from workers import KEY_TYPES, CURVES, WorkerPool, ca_sign_job, fill_subject, generate_key, key_bits, new_request, \
+    sign_job, sign_request
 from cert_exceptions import *
 
 
 class Certificate:
+    # stages timed with --profile: (stage, methods)
+    profile_stages = [
+        ("keygen", ["generate_key"]),
+        ("subject", ["prepare_request"]),
+        ("sign", ["sign_request"]),
+        ("dump", ["generate_file"]),
+        ("p12", ["export_p12"]),
+        ("template", ["get_template"]),
+        ("exists", ["path_exists"]),
+        ("read", ["check_csr", "check_p12"]),
+        ("shell", ["shell"]),
+        ("output", ["output"]),
+        ("inventory", ["inventory_csr", "inventory_add"]),
+    ]
+    profile_tools_stages = [
+        ("write", ["write_atomic"]),
+    ]
 
     def __init__(self, logger=None, opts={}):
         """
@@ -24,18 +64,22 @@ class Certificate:
         self._logger = logger
         self.allowed = ["Digital Signature", "Non Repudiation", "Key Encipherment"]
         self.ctx = None
+        self.index = None
 
-        # Set directories path
-        self.tools = Tools()
-        self.tools.load_config()
+        # Set directories path, config.ini is read and folders are created once per process
+        context = get_context()
+        folders = context.folders()
+        self.tools = context.new_tools()
         self.basedir = self.tools.here
         self.Documents = self.tools.documents
-        self.config_folder = self.get_folder(os.path.join(self.basedir, "config"))
-        self.app_folder = self.get_folder(self.tools.app_folder)
-        self.certificate_folder = self.get_folder(os.path.join(self.app_folder, "certificate"))
-        self.csv_folder = self.get_folder(os.path.join(self.app_folder, "csv"))
-        self.csr_folder = self.get_folder(os.path.join(self.certificate_folder, "csr"))
-        self.p12_folder = self.get_folder(os.path.join(self.certificate_folder, "p12"))
+        self.config_folder = folders["config"]
+        self.app_folder = folders["app"]
+        self.certificate_folder = folders["certificate"]
+        self.csv_folder = folders["csv"]
+        self.csr_folder = folders["csr"]
+        self.p12_folder = folders["p12"]
+        self.pem_folder = os.path.join(self.certificate_folder, "pem")
+        self.ca_folder = os.path.join(self.app_folder, "ca")
 
         # Set default usage
         self.TYPE_RSA = crypto.TYPE_RSA
@@ -45,10 +89,33 @@ class Certificate:
         self.p12_file = None
         self._level = logging.WARNING
         self._key_size = 2048
+        self._key_type = "rsa"
+        self._curve = "P-256"
         self._ca = False
         self.usage = ','.join(self.allowed)
         self.config = None
         self.subject = {}
+        self.keypool = None
+        self.template = None
+        self.archive = None
+        self.journal = None
+        # rows done but not synced yet: files, journal records and done claims are synced by batch of sync_batch rows
+        self.pending = []
+        self.pending_folders = set()
+        self.sync_batch = 64
+        self.state = None
+        self.claims = None
+        self.claim_run = None
+        self.claim_owner = default_owner()
+        self.shard = None
+        self.csv_path = None
+        self.profiler = None
+        self.profile = False
+        self.report = None
+        # messages go to stderr for the whole command when report is written on stdout
+        self.report_stdout = False
+        self.inventory = None
+        self.inventory_path = os.path.join(self.certificate_folder, "inventory.sqlite")
 
         # Set click ctx
         try:
@@ -88,6 +155,21 @@ class Certificate:
         except ValueError:
             pass
 
+        # Set key type and curve
+        try:
+            if opts.get('key_type') in KEY_TYPES:
+                self._key_type = opts.get('key_type')
+            del opts['key_type']
+        except KeyError:
+            pass
+
+        try:
+            if opts.get('curve') in CURVES:
+                self._curve = opts.get('curve')
+            del opts['curve']
+        except KeyError:
+            pass
+
         # Set config
         try:
             self.config = opts.get('config')
@@ -101,11 +183,49 @@ class Certificate:
         except KeyError:
             pass
 
+        # Process only serials of a shard (index, count)
+        try:
+            self.shard = opts.get('shard')
+            del opts['shard']
+        except KeyError:
+            pass
+
+        # Serials of csv file shared with other processes (--claim)
+        try:
+            self.claim_run = opts.get('claim')
+            del opts['claim']
+        except KeyError:
+            pass
+        if self.claim_run and (os.path.basename(self.claim_run) != self.claim_run or self.claim_run.startswith(".")):
+            self.output("{r} is not a valid run name", level=logging.ERROR, r=self.claim_run)
+
+        # Time stages
+        try:
+            if opts.get('profile') or opts.get('profile_output'):
+                self.profile = True
+                self.enable_profiler(pstats=opts.get('profile_output'))
+            del opts['profile']
+        except KeyError:
+            pass
+
+        try:
+            del opts['profile_output']
+        except KeyError:
+            pass
+
+        # Take keys from key pool
+        try:
+            if opts.get('keypool'):
+                self.keypool = KeyPool(os.path.join(self.app_folder, "keypool"))
+            del opts['keypool']
+        except KeyError:
+            pass
+
         self.copy_config_files()
 
         self.opts = opts
         self.output('[*] We have already set options:', level=logging.DEBUG)
-        self.output('{o}'.format(o=self.opts), level=logging.DEBUG)
+        self.output('{o}', level=logging.DEBUG, o=self.opts)
 
         if self.config and "yamlfile" in self.config:
             self.load_subject(self.config.get("yamlfile"))
@@ -129,13 +249,23 @@ class Certificate:
 
     def generate_key(self):
         """
-        Generate private key
+        Generate private key, take it from key pool if enabled and not empty,
+        key pool only holds RSA keys
         :return: key
         """
-        key = crypto.PKey()
-        key.generate_key(self.TYPE_RSA, self._key_size)
-
-        return key
+        if self.keypool and self._key_type == "rsa":
+            key = self.keypool.take(self._key_size)
+            if key:
+                self.output("key taken from key pool", level=logging.DEBUG)
+                return key
+        return generate_key(self._key_type, self._key_size, self._curve)
+
+    def key_bits(self):
+        """
+        Return key size in bits of generated keys
+        :return:
+        """
+        return key_bits(self._key_type, self._key_size, self._curve)
 
     def generate_csr(self, force=False):
         """
@@ -145,38 +275,48 @@ class Certificate:
         """
         self.get_csr_name()
 
-        san = self.get_san()
-
-        req = crypto.X509Req()
-        self.fill_subject(req)
-
-        base_constraints = ([
-            crypto.X509Extension("keyUsage", False, self.usage),
-            crypto.X509Extension("basicConstraints", False, "CA:{c}".format(c=self.is_ca())),
-        ])
-        x509_extensions = base_constraints
-
-        if san:
-            san_constraint = crypto.X509Extension("subjectAltName", False, san)
-            x509_extensions.append(san_constraint)
-
-        req.add_extensions(x509_extensions)
+        template = self.get_template()
 
         key = self.generate_key()
-        req.set_pubkey(key)
-        req.sign(key, "sha256")
+        req = self.prepare_request(template.extensions)
+        req = self.sign_request(req, key)
 
-        self.output("=========== generate {} ============".format(self.name), level=logging.DEBUG)
+        self.output("=========== generate {n} ============", level=logging.DEBUG, n=self.name)
         if force:
             self.overwrite_csr(req=req, key=key)
         else:
             self.write_csr(req=req, key=key)
 
-    def generate_multiple(self, csv_file=None, force=False):
+    def prepare_request(self, extensions):
+        """
+        Create csr with subject and extensions
+        :param extensions:
+        :return:
+        """
+        return new_request(self.subject, extensions)
+
+    @staticmethod
+    def sign_request(req, key):
+        """
+        Sign csr with key
+        :param req:
+        :param key:
+        :return:
+        """
+        return sign_request(req, key)
+
+    def generate_multiple(self, csv_file=None, force=False, jobs=1, resume=False, pipeline=False,
+                          incremental=False, lease=300):
         """
         Generate .csr for each serial
         :param csv_file:
         :param force
+        :param jobs: number of worker processes, sequential if 1
+        :param resume: skip serials recorded in journal of previous run
+        :param pipeline: read, sign, write and report in separate threads connected by bounded queues
+        :param incremental: generate only serials new or changed since last successful run
+        :param lease: seconds after which a claim not renewed (crashed process) is taken over, used with option claim:
+                      name of a run shared with other processes, each serial is generated by the process claiming it
         :return:
         """
 
@@ -184,10 +324,108 @@ class Certificate:
 
         _list = self.get_list_from_csv(csv_file=csv_file, absolute=absolute)
 
-        for name in _list:
-            self.create_request(name=name)
-            self.set_subject(CN=name)
-            self.generate_csr(force=force)
+        base_subject = dict(self.subject)
+
+        with self.claim_output(lease=lease), \
+                self.state_output("csr", self.row_settings(None, base_subject), incremental=incremental), \
+                self.journal_output("csr", resume=resume), self.folder_index(self.csr_folder):
+            if self.state:
+                _list = self.state.filter(_list)
+            if self.claims:
+                _list = self.claims.filter(_list)
+            if pipeline:
+                self.output("[*] Start pipeline with {j} workers", level=logging.DEBUG, j=jobs)
+                Pipeline(self, jobs=jobs, force=force).run(_list, base_subject)
+                return
+
+            if jobs and jobs > 1:
+                self.generate_multiple_parallel(_list, base_subject, jobs=jobs, force=force)
+                return
+
+            for name in _list:
+                if self.journaled(name):
+                    continue
+                self.subject = dict(base_subject)
+                self.create_request(name=name)
+                self.set_subject(CN=name)
+                self.generate_csr(force=self.must_overwrite(name, force))
+
+    def generate_multiple_parallel(self, _list, base_subject, jobs, force=False):
+        """
+        Generate .csr for each serial using a pool of worker processes,
+        workers return pem and files are written by this process only
+        :param _list:
+        :param base_subject:
+        :param jobs:
+        :param force:
+        :return:
+        """
+        def requests():
+            for name in _list:
+                if self.journaled(name):
+                    continue
+                csr_file = os.path.join(self.csr_folder, name, name + ".csr")
+                key_file = os.path.join(self.csr_folder, name, name + ".key")
+                if not self.must_overwrite(name, force) and not self.archive and self.exists(csr_file) \
+                        and self.exists(key_file):
+                    self.output("{n} already exists => abort", n=name)
+                    self.row_done(name, [key_file, csr_file], status="exists", key_size=self.key_bits())
+                    continue
+                yield self.new_job(name, base_subject)
+
+        self.output("[*] Start {j} workers", level=logging.DEBUG, j=jobs)
+        with WorkerPool(jobs) as pool:
+            for name, req, key, durations in pool.imap(sign_job, requests()):
+                if self.profiler:
+                    for stage, duration in durations.items():
+                        self.profiler.add(stage, duration)
+                self.create_request(name=name)
+                self.output("=========== generate {n} ============", level=logging.DEBUG, n=name)
+                if self.must_overwrite(name, force):
+                    self.overwrite_csr(req=req, key=key)
+                else:
+                    self.write_csr(req=req, key=key)
+
+    def new_job(self, name, base_subject):
+        """
+        Return job of sign_job() for serial
+        :param name:
+        :param base_subject: CN is the serial if not defined
+        :return:
+        """
+        job = self.row_settings(name, base_subject)
+        job["key"] = self.keypool.take_pem(self._key_size) if self.keypool and self._key_type == "rsa" else None
+        return job
+
+    def row_settings(self, name, base_subject):
+        """
+        Return settings of csr of serial
+        :param name: None to leave CN undefined if not in base subject
+        :param base_subject: CN is the serial if not defined
+        :return:
+        """
+        subject = dict(base_subject)
+        if name is not None:
+            subject.setdefault("CN", name)
+        return {
+            "name": name,
+            "subject": subject,
+            "usage": self.usage,
+            "ca": self.is_ca(),
+            "san": self.get_san(),
+            "key_type": self._key_type,
+            "key_size": self._key_size,
+            "curve": self._curve
+        }
+
+    def must_overwrite(self, name, force=False):
+        """
+        Return True if files of serial are replaced: --force or serial changed since last incremental run
+        :param name:
+        :param force:
+        :return:
+        """
+        return force or (self.state is not None and name in self.state.changed)
 
     def generate_p12(self, key=None, pem=None, p12=None, password="3z6F2Xfc", force=False):
         """
@@ -199,7 +437,7 @@ class Certificate:
         :param force:
         :return:
         """
-        self.output("=========== generate {} ============".format(p12), level=logging.DEBUG)
+        self.output("=========== generate {n} ============", level=logging.DEBUG, n=p12)
         generated = True
         if self.check_extension(p12, "p12"):
             if not self.exists(self.p12_folder):
@@ -209,16 +447,13 @@ class Certificate:
                 generated = self.overwrite_p12(p12=p12, key=key, pem=pem, password=password)
             else:
                 generated = self.write_p12(p12=p12, key=key, pem=pem, password=password)
-        try:
-            os.remove(p12)
-        except OSError:
-            pass
         if generated:
-            self.output("=========== {} generated ============".format(p12), level=logging.DEBUG)
+            self.output("=========== {n} generated ============", level=logging.DEBUG, n=p12)
         else:
-            self.output("=========== {} not generated ============".format(p12), level=logging.DEBUG)
+            self.output("=========== {n} not generated ============", level=logging.DEBUG, n=p12)
 
-    def generate_multiple_p12(self, pem_folder, key_folder=None, csv_file=None, password="3z6F2Xfc", force=False):
+    def generate_multiple_p12(self, pem_folder, key_folder=None, csv_file=None, password="3z6F2Xfc", force=False,
+                              resume=False):
         """
         Generate multiple p12 file
         :param pem_folder:
@@ -226,6 +461,7 @@ class Certificate:
         :param csv_file:
         :param password:
         :param force:
+        :param resume: skip serials recorded in journal of previous run
         :return:
         """
 
@@ -239,19 +475,541 @@ class Certificate:
             if self.exists(key_folder, trigger_error=True):
                 pass
 
+        if not pem_folder and os.path.exists(self.pem_folder):
+            # certificates signed by local CA
+            pem_folder = self.pem_folder
         if not pem_folder:
             self.output("pem folder must be defined", level=logging.ERROR)
 
         if self.exists(pem_folder, trigger_error=True):
+            with self.journal_output("p12", resume=resume), \
+                    self.folder_index(key_folder or certificate, pem_folder, self.p12_folder):
+                for name in _list:
+                    if self.journaled(name):
+                        continue
+                    if key_folder:
+                        key = os.path.join(key_folder, name + ".key")
+                    else:
+                        key = os.path.join(certificate, name, name + ".key")
+                    pem = os.path.join(pem_folder, name + ".pem")
+                    p12 = name + ".p12"
+                    if self.exists(key) and self.exists(pem):
+                        self.generate_p12(key=key, pem=pem, p12=p12, password=password, force=force)
+                    else:
+                        self.row_done(name, [key, pem], status="failed", error="key or pem not found")
+
+    def sign_multiple(self, ca, csv_file=None, days=365, jobs=1, force=False, resume=False):
+        """
+        Sign csr of each serial with local CA, certificates are written in certificate/pem/[serial].pem
+        where create-multiple-p12 looks for them
+        :param ca: LocalCA
+        :param csv_file:
+        :param days: validity of certificates
+        :param jobs: number of worker processes, sequential if 1
+        :param force: overwrite existing certificates
+        :param resume: skip serials recorded in journal of previous run
+        :return:
+        """
+        if not ca.exists():
+            self.output("local CA not found in {f}, use \"cert ca init\"", level=logging.ERROR, f=ca.folder)
+
+        _list = self.get_list_from_csv(csv_file=csv_file, absolute=self.is_absolute(csv_file))
+
+        pem_folder = self.pem_folder if self.archive else self.get_folder(self.pem_folder)
+
+        def requests():
             for name in _list:
-                if key_folder:
-                    key = os.path.join(key_folder, name + ".key")
-                else:
-                    key = os.path.join(certificate, name, name + ".key")
+                if self.journaled(name):
+                    continue
+                csr = os.path.join(self.csr_folder, name, name + ".csr")
                 pem = os.path.join(pem_folder, name + ".pem")
-                p12 = name + ".p12"
-                if self.exists(key) and self.exists(pem):
-                    self.generate_p12(key=key, pem=pem, p12=p12, password=password, force=force)
+                if not force and not self.archive and self.exists(pem):
+                    self.output("{n} already exists => abort", n=name)
+                    self.row_done(name, [pem], status="exists")
+                    continue
+                if not self.exists(csr):
+                    self.row_done(name, [csr], status="failed", error="csr not found")
+                    continue
+                yield {"name": name, "csr": csr, "serial": ca.serials.next(), "days": days, "ca": ca.files()}
+
+        def sign(pool):
+            for name, data, durations, error in (pool.imap(ca_sign_job, requests()) if pool else
+                                                 (ca_sign_job(job) for job in requests())):
+                if self.profiler:
+                    for stage, duration in durations.items():
+                        self.profiler.add(stage, duration)
+                pem = os.path.join(pem_folder, name + ".pem")
+                if error:
+                    self.output("{n} not signed: {e}", level=logging.DEBUG, n=name, e=error)
+                    self.row_done(name, [os.path.join(self.csr_folder, name, name + ".csr")], status="failed",
+                                  error=error)
+                    continue
+                self.name = name
+                self.generate_file(pem, data)
+                if self.inventory and not self.archive:
+                    certificate = crypto.load_certificate(crypto.FILETYPE_PEM, data)
+                    self.inventory_add(name, "pem", pem, certificate.get_pubkey(), certificate.get_subject())
+                self.row_done(name, [pem])
+                self.echo("{n} signed in {p}\n".format(n=name, p=self.destination(pem_folder)))
+
+        with self.journal_output("crt", resume=resume), self.folder_index(self.csr_folder, pem_folder):
+            if jobs and jobs > 1:
+                self.output("[*] Start {j} workers", level=logging.DEBUG, j=jobs)
+                with WorkerPool(jobs) as pool:
+                    sign(pool)
+            else:
+                sign(None)
+
+    @contextmanager
+    def inventory_output(self):
+        """
+        Record generated files in inventory (certificate/inventory.sqlite), not used with --archive.
+        A shard writes its own inventory merged by merge_shards(), a process of a claim run
+        its own inventory merged by merge_claims()
+        :return:
+        """
+        if self.archive:
+            yield None
+            return
+        path = self.output_path(self.inventory_path)
+        try:
+            self.inventory = Inventory(path, wal=not self.claim_run)
+        except sqlite3.Error as e:
+            self.output("inventory {f} not available: {e}", level=logging.WARNING, f=path, e=e)
+            yield None
+            return
+        try:
+            yield self.inventory
+        finally:
+            inventory, self.inventory = self.inventory, None
+            try:
+                inventory.close()
+            except sqlite3.Error as e:
+                self.output("inventory {f} not saved: {e}", level=logging.WARNING, f=path, e=e)
+
+    def inventory_add(self, serial, kind, path, key=None, subject=None):
+        """
+        Record file written in certificate folder in inventory
+        :param serial:
+        :param kind: csr, key, pem or p12
+        :param path:
+        :param key: public or private key
+        :param subject: X509Name
+        :return:
+        """
+        if self.inventory is None or self.archive:
+            return
+        try:
+            self.inventory.add(serial, kind, path, key=key, subject=subject)
+        except sqlite3.Error as e:
+            self.output("{f} not recorded in inventory: {e}", level=logging.WARNING, f=path, e=e)
+
+    def inventory_csr(self, name, req, key_file, csr_file):
+        """
+        Record key and csr in inventory, key has the fingerprint of csr public key
+        :param name:
+        :param req: X509Req or pem
+        :param key_file:
+        :param csr_file:
+        :return:
+        """
+        if self.inventory is None or self.archive:
+            return
+        if isinstance(req, basestring):
+            req = crypto.load_certificate_request(crypto.FILETYPE_PEM, req)
+        self.inventory_add(name, "key", key_file, req.get_pubkey())
+        self.inventory_add(name, "csr", csr_file, req.get_pubkey(), req.get_subject())
+
+    def rebuild_inventory(self, password=None, jobs=1, batch=64):
+        """
+        Record files of csr, pem and p12 folders in inventory, rows of files not found anymore are removed
+        :param password: used to read p12 files
+        :param jobs: number of worker processes, sequential if 1
+        :param batch: number of files read by a worker at once
+        :return: (number of recorded files, number of unreadable files, number of removed rows)
+        """
+        folders = [self.csr_folder, self.pem_folder, self.p12_folder]
+        extensions = (".csr", ".key", ".pem", ".p12")
+
+        def paths():
+            for folder in folders:
+                for root, names, files in os.walk(folder):
+                    names.sort()
+                    for name in sorted(files):
+                        if name.endswith(extensions):
+                            yield os.path.abspath(os.path.join(root, name))
+
+        def batches():
+            jobs_ = ({"path": path, "password": password} for path in paths())
+            while True:
+                chunk = list(islice(jobs_, batch))
+                if not chunk:
+                    return
+                yield chunk
+
+        recorded, failed, seen = 0, 0, set()
+        with self.inventory_output() as inventory:
+            if inventory is None:
+                self.output("inventory can't be rebuilt", level=logging.ERROR)
+            known = inventory.paths(folders)
+            if jobs and jobs > 1:
+                with WorkerPool(jobs) as pool:
+                    results = chain.from_iterable(pool.imap(inventory_batch, batches()))
+                    recorded, failed = self.record_rows(inventory, results, seen)
+            else:
+                results = chain.from_iterable(inventory_batch(chunk) for chunk in batches())
+                recorded, failed = self.record_rows(inventory, results, seen)
+            removed = known - seen
+            inventory.remove(removed)
+        return recorded, failed, len(removed)
+
+    def merge_shards(self, report=None):
+        """
+        Merge inventories written by shards (inventory.shard-[I]-of-[N].sqlite) in inventory
+        and reports written by shards in report, shard files are kept
+        :param report: path given to --report of bulk commands, reports are not merged if None
+        :return: (number of merged shards, number of inventory rows, number of report records)
+        """
+        inventories = shard_files(self.inventory_path)
+        reports = shard_files(report) if report else []
+        for label, files, expected in (("inventory", inventories, True), ("report", reports, bool(report))):
+            if expected and not files:
+                self.output("no {l} of shard found", level=logging.WARNING, l=label)
+            missing = missing_shards(files)
+            if missing:
+                self.output("{l} of shards {m} not found", level=logging.WARNING, l=label, m=", ".join(missing))
+        return self.merge_outputs(inventories, reports, report)
+
+    def merge_claims(self, run, report=None):
+        """
+        Merge inventories written by processes of claim run (inventory.claim-[run].[owner].sqlite) in inventory
+        and their reports in report, files of processes are kept
+        :param run:
+        :param report: path given to --report of create-multiple, reports are not merged if None
+        :return: (number of merged processes, number of inventory rows, number of report records)
+        """
+        inventories = claim_files(self.inventory_path, run)
+        reports = claim_files(report, run) if report else []
+        for label, files, expected in (("inventory", inventories, True), ("report", reports, bool(report))):
+            if expected and not files:
+                self.output("no {l} of run {r} found", level=logging.WARNING, l=label, r=run)
+        return self.merge_outputs(inventories, reports, report)
+
+    def merge_outputs(self, inventories, reports, report=None):
+        """
+        Merge inventories in inventory and concatenate reports in report
+        :param inventories: list of (key, path)
+        :param reports: list of (key, path)
+        :param report:
+        :return: (number of inventories, number of inventory rows, number of report records)
+        """
+        rows = 0
+        with self.inventory_output() as inventory:
+            if inventory is not None:
+                for _, path in inventories:
+                    self.output("[*] Merge {f}", level=logging.DEBUG, f=path)
+                    rows += inventory.merge(path)
+        records = merge_reports(reports, report) if reports else 0
+        return len(inventories), rows, records
+
+    def record_rows(self, inventory, results, seen):
+        """
+        Add rows of rebuild_inventory() to inventory
+        :param inventory:
+        :param results: (row, error)
+        :param seen: recorded paths are added to this set
+        :return: (number of recorded files, number of unreadable files)
+        """
+        recorded, failed = 0, 0
+        for row, error in results:
+            if error:
+                failed += 1
+                self.output("{f} can't be read: {e}", level=logging.DEBUG, f=row["path"], e=error)
+            inventory.add_row(row)
+            seen.add(row["path"])
+            recorded += 1
+        return recorded, failed
+
+    @contextmanager
+    def journal_output(self, kind, resume=False):
+        """
+        Record done serials of csv file in journal/[kind]_[csv name]_[hash].journal
+        :param kind: csr, crt or p12
+        :param resume: load journal of previous run instead of starting a new one
+        :return:
+        """
+        if self.archive or self.claims:
+            if resume:
+                self.output("--resume can't be used with --{o}", level=logging.ERROR,
+                            o="archive" if self.archive else "claim")
+            yield None
+            return
+        path = self.csv_run_file("journal", kind)
+        self.journal = Journal(path, resume=resume)
+        if resume:
+            self.output("{n} serials already done in {j}", level=logging.INFO, n=len(self.journal.done), j=path)
+        try:
+            yield self.journal
+        finally:
+            try:
+                self.sync_rows()
+            finally:
+                journal, self.journal = self.journal, None
+                journal.close()
+
+    @contextmanager
+    def state_output(self, kind, settings, incremental=False):
+        """
+        Skip serials unchanged since last successful run, fingerprints are in state/[kind]_[csv name]_[hash].state
+        and are replaced only if the run ends without error
+        :param kind: csr
+        :param settings: settings of csr shared by all serials
+        :param incremental:
+        :return:
+        """
+        if not incremental:
+            yield None
+            return
+        if self.archive or self.claims:
+            self.output("--incremental can't be used with --{o}", level=logging.ERROR,
+                        o="archive" if self.archive else "claim")
+        self.state = RowState(self.csv_run_file("state", kind), settings)
+        self.output("{n} serials in {s}", level=logging.DEBUG, n=len(self.state.previous), s=self.state.path)
+        try:
+            yield self.state
+            self.state.save()
+            self.output("{n} serials unchanged => skip, {c} changed", level=logging.INFO, n=self.state.unchanged,
+                        c=len(self.state.changed))
+        finally:
+            self.state = None
+
+    @contextmanager
+    def claim_output(self, lease=300):
+        """
+        Share serials of csv file with other processes running the same command with the same run name (option claim
+        checked by __init__), claims and done serials are in claim/[run]/ (done serials are skipped when the run is
+        started again)
+        :param lease: seconds
+        :return:
+        """
+        if not self.claim_run:
+            yield None
+            return
+        folder = os.path.join(self.get_folder(os.path.join(self.certificate_folder, "claim")), self.claim_run)
+        self.claims = ClaimDir(folder, lease=lease, owner=self.claim_owner).start()
+        self.output("[*] Claim serials in {f} as {o}", level=logging.DEBUG, f=folder, o=self.claims.owner)
+        try:
+            yield self.claims
+        finally:
+            try:
+                self.sync_rows()
+            finally:
+                claims, self.claims = self.claims, None
+                claims.close()
+        count = claims.count
+        self.echo("{c} serials claimed ({r} taken over), {d} done and {b} in progress by other processes\n".format(
+            c=count["claimed"], r=count["reclaimed"], d=count["done"], b=count["busy"]))
+        if count["lost"]:
+            self.output("{l} serials taken over by another process before they were done", level=logging.WARNING,
+                        l=count["lost"])
+
+    def csv_run_file(self, extension, kind):
+        """
+        Return [extension]/[kind]_[csv name]_[hash].[extension] in certificate folder for csv file of current run,
+        each shard has its own file
+        :param extension: journal or state, also name of the folder
+        :param kind: csr, crt or p12
+        :return:
+        """
+        folder = self.get_folder(os.path.join(self.certificate_folder, extension))
+        csv_name = os.path.splitext(os.path.basename(self.csv_path))[0]
+        digest = hashlib.sha1(os.path.abspath(self.csv_path)).hexdigest()[:8]
+        return shard_path(os.path.join(folder, "{k}_{n}_{d}.{e}".format(k=kind, n=csv_name, d=digest, e=extension)),
+                          self.shard)
+
+    @contextmanager
+    def folder_index(self, *folders):
+        """
+        Answer existence checks in folders from an in memory index during a bulk command
+        :param folders:
+        :return:
+        """
+        self.index = FolderIndex(folders)
+        self.output("[*] Index {f}", level=logging.DEBUG, f=", ".join(self.index.roots))
+        try:
+            yield self.index
+        finally:
+            self.index = None
+
+    def index_add(self, path, folder=False):
+        """
+        Add created file or folder to index
+        :param path:
+        :param folder:
+        :return:
+        """
+        if self.index is not None:
+            self.index.add(os.path.abspath(path), folder=folder)
+
+    def journaled(self, name):
+        """
+        Return True if serial is recorded in journal of resumed run
+        :param name:
+        :return:
+        """
+        if self.journal and name in self.journal:
+            self.output("{n} already done => skip", level=logging.DEBUG, n=name)
+            self.row_done(name, [], status="journal")
+            return True
+        return False
+
+    def row_done(self, name, paths, status="generated", key_size=None, error=None):
+        """
+        Record result of a csv row in journal and report
+        :param name: serial
+        :param paths: files of serial
+        :param status: generated, exists (not overwritten), journal (done by previous run) or failed
+        :param key_size:
+        :param error:
+        :return:
+        """
+        self.journal_row(name, paths, status=status)
+        self.report_row(name, paths, status=status, key_size=key_size, error=error)
+
+    def durable(self):
+        """
+        Return True if written files must be on disk before their row is recorded as done (journal or claim)
+        :return:
+        """
+        return self.journal is not None or self.claims is not None
+
+    def journal_row(self, name, paths, status="generated"):
+        """
+        Record csv row in journal and claim folder once its files are on disk, rows are synced by batch
+        :param name: serial
+        :param paths:
+        :param status:
+        :return:
+        """
+        if self.durable() and status in ("generated", "exists"):
+            self.pending.append((name, paths, status))
+            if len(self.pending) >= self.sync_batch:
+                self.sync_rows()
+
+    def sync_rows(self):
+        """
+        fsync files and folders of pending rows once, then record rows in journal (one fsync) and claim folder.
+        A crash loses at most sync_batch records, their rows are generated again by next run
+        :return:
+        """
+        rows, self.pending = self.pending, []
+        folders, self.pending_folders = self.pending_folders, set()
+        if not rows:
+            return
+        for _, paths, status in rows:
+            if status == "generated":
+                for path in paths:
+                    Tools.sync_file(path)
+                    folders.add(os.path.dirname(path))
+        for folder in sorted(folders):
+            Tools.sync_folder(folder)
+        if self.journal:
+            self.journal.add_batch(rows)
+        if self.claims:
+            self.claims.done_batch([name for name, _, _ in rows])
+
+    def report_row(self, name, paths, status="generated", key_size=None, error=None, durations=None):
+        """
+        Write result of csv row in report
+        :param name: serial
+        :param paths:
+        :param status:
+        :param key_size:
+        :param error:
+        :param durations: seconds spent in each stage, default is durations timed by profiler since last row
+        :return:
+        """
+        if self.report:
+            if self.archive:
+                paths = [os.path.relpath(path, self.certificate_folder) for path in paths]
+            if durations is None:
+                durations = self.profiler.take_row()
+            self.report.add(name, status, paths, key_size=key_size, durations=durations, error=error,
+                            archive=self.archive.path if self.archive else None)
+
+    @contextmanager
+    def report_output(self, path=None):
+        """
+        Write result of each csv row in a ndjson report, a shard or a process of a claim run writes its own report
+        merged by merge_shards() or merge_claims()
+        :param path: file path or "-" for stdout, no report if None
+        :return:
+        """
+        if not path:
+            yield None
+            return
+        if path != "-":
+            path = self.output_path(path)
+        try:
+            self.report = Report(path)
+        except IOError as e:
+            self.output(e, level=logging.ERROR)
+            yield None
+            return
+        self.report_stdout = self.report.stdout
+        # stages are timed for each row
+        self.enable_profiler()
+        self.profiler.take_row()
+        self.output("[*] Write report in {f}", level=logging.DEBUG, f=path)
+        try:
+            yield self.report
+        finally:
+            report, self.report = self.report, None
+            report.close()
+            self.echo("report: {c}\n".format(c=", ".join("{n} {s}".format(n=n, s=s)
+                                                        for s, n in sorted(report.count.items()))))
+
+    def echo(self, message):
+        """
+        Display message, on stderr if report is written on stdout
+        :param message:
+        :return:
+        """
+        click.echo(message, err=self.report_stdout)
+
+    def enable_profiler(self, pstats=None):
+        """
+        Time stages of this certificate, used by --profile and --report
+        :param pstats: dump cProfile stats in this file
+        :return:
+        """
+        if self.profiler is None:
+            self.profiler = Profiler(pstats=pstats)
+            self.profiler.instrument(self, self.profile_stages)
+            self.profiler.instrument(self.tools, self.profile_tools_stages)
+
+    def profile_report(self):
+        """
+        Display time spent in each stage and write cProfile stats if requested
+        :return:
+        """
+        if self.profiler and self.profile:
+            self.profiler.stop()
+            self.echo("+++++profile+++++")
+            for result in self.profiler.summary():
+                self.echo(Profiler.format(result))
+            if self.profiler.pstats:
+                self.echo("cProfile stats written in {f}".format(f=self.profiler.pstats))
+
+    def keypool_report(self):
+        """
+        Display key pool hit and miss counters
+        :return:
+        """
+        if self.keypool:
+            stats = self.keypool.stats()
+            self.output("key pool: {h} hit, {m} miss", level=logging.INFO, h=stats["hit"], m=stats["miss"])
+            self.echo("key pool: {h} hit, {m} miss\n".format(h=stats["hit"], m=stats["miss"]))
 
     def get_csr_name(self):
         """
@@ -272,33 +1030,29 @@ class Certificate:
             self.set_subject(CN=name)
             self.create_request(name=name)
 
+    def get_template(self):
+        """
+        Return request template, compile it again only if yaml file has been modified
+        :return:
+        """
+        if self.template is None or self.template.is_stale():
+            yaml_file = None
+            if self.config and "yamlfile" in self.config:
+                yaml_file = os.path.join(self.app_folder, self.config.get("yamlfile"))
+                if self.exists(yaml_file, trigger_error=True):
+                    self.check_extension(yaml_file, "yaml")
+                self.output("[+] Reading values file: {f}", level=logging.DEBUG, f=self.config.get("yamlfile"))
+            self.template = RequestTemplate(self.usage, self.is_ca(), yaml_file=yaml_file, san=self.opts.get("san"))
+            if self.template.san:
+                self.output("Subject Alt Name (san): {san} added", level=logging.DEBUG, san=self.template.san)
+        return self.template
+
     def get_san(self):
         """
         check if san is given
         :return:
         """
-        cfg = {}
-        ss = []
-        if self.config and "yamlfile" in self.config:
-            cfg = self.parse_yaml(self.config.get("yamlfile"))
-
-        if "san" in cfg:
-            for entry in cfg["san"].split(" "):
-                ss.append("DNS: {e}".format(e=entry))
-        else:
-            try:
-                for entry in self.opts["san"]:
-                    ss.append("DNS: {e}".format(e=entry))
-            except KeyError:
-                pass
-
-        if ss:
-            ss = ", ".join(ss)
-            self.output("Subject Alt Name (san): {san} added".format(san=ss), level=logging.DEBUG)
-
-        if len(ss):
-            return ss
-        return None
+        return self.get_template().san
 
     def create_request(self, name):
         """
@@ -308,9 +1062,17 @@ class Certificate:
         """
         self.name = name
         r_folder = os.path.join(self.csr_folder, name)
-        if not self.exists(r_folder):
-            os.mkdir(r_folder)
-            self.output("{} folder created".format(r_folder), level=logging.DEBUG)
+        # folder index is not used here: folder may be created by another process since index was built (--claim)
+        if not self.archive and not os.path.isdir(r_folder):
+            try:
+                os.mkdir(r_folder)
+                self.output("{n} folder created", level=logging.DEBUG, n=r_folder)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+            if self.durable():
+                self.pending_folders.add(self.csr_folder)
+            self.index_add(r_folder, folder=True)
         self.csr_file = os.path.join(r_folder, name + ".csr")
         self.key_file = os.path.join(r_folder, name + ".key")
 
@@ -321,7 +1083,12 @@ class Certificate:
         :return:
         """
         if not self.exists(path):
-            os.mkdir(path)
+            try:
+                os.mkdir(path)
+            except OSError as e:
+                # created by another process
+                if e.errno != errno.EEXIST:
+                    raise
         return path
 
     def load_subject(self, cfg=None):
@@ -333,7 +1100,10 @@ class Certificate:
         _cfg = None
         if cfg:
             try:
-                _cfg = self.parse_yaml(cfg)
+                if self.config and cfg == self.config.get("yamlfile"):
+                    _cfg = self.get_template().cfg
+                else:
+                    _cfg = self.parse_yaml(cfg)
             except Exception as err:
                 self.output(err, level=logging.ERROR)
         else:
@@ -350,30 +1120,16 @@ class Certificate:
         :param self_signed:
         :return:
         """
-        if "C" in self.subject:
-            cert.get_subject().countryName = self.subject.get("C")
-        if "ST" in self.subject:
-            cert.get_subject().stateOrProvinceName = self.subject.get("ST")
-        if "L" in self.subject:
-            cert.get_subject().localityName = self.subject.get("L")
-        if "O" in self.subject:
-            cert.get_subject().organizationName = self.subject.get("O")
-        if "OU" in self.subject:
-            cert.get_subject().organizationalUnitName = self.subject.get("OU")
-        if "CN" in self.subject:
-            cert.get_subject().CN = self.subject.get("CN")
-        if "emailAddress" in self.subject:
-            cert.get_subject().emailAddress = self.subject.get('emailAddress')
-        if self_signed:
-            cert.set_issuer(cert.get_subject())
-
-    def set_subject(self, _dict={}, **kwargs):
+        fill_subject(cert, self.subject, self_signed=self_signed)
+
+    def set_subject(self, _dict=None, **kwargs):
         """
         add or update subject
         :param _dict
         :param kwargs:
         :return:
         """
+        _dict = dict(_dict or {})
         _dict.update(kwargs)
 
         fields = ["C", "CN", "ST", "L", "O", "OU", "emailAddress"]
@@ -387,7 +1143,7 @@ class Certificate:
                 if (k == "CN") and self.subject.get(k) and len(self.subject[k]) > 0:
                     continue
                 self.subject.update({k: v})
-                self.output("subject => {k} : {v} added".format(k=k, v=self.subject[k]), level=logging.DEBUG)
+                self.output("subject => {k} : {v} added", level=logging.DEBUG, k=k, v=self.subject[k])
 
     def get_subject(self, key=None):
         """
@@ -409,16 +1165,7 @@ class Certificate:
         :param password:
         :return:
         """
-        if self.exists(key, trigger_error=True) and self.exists(pem, trigger_error=True):
-            if self.check_extension(key, "key") and self.check_extension(pem, "pem"):
-                cmd = "openssl pkcs12 -inkey {key} -in {pem} -export -out {p12} -password pass:{p}" \
-                    .format(key=key, pem=pem, p12=p12, p=password)
-                self.shell(cmd)
-                if self.exists(p12) and self.check_p12(path=p12, password=password, read=False):
-                    self.output("move {p} to {f}".format(p=p12, f=self.p12_folder), level=logging.DEBUG)
-                    os.rename(p12, os.path.join(self.p12_folder, p12))
-                    click.echo("{n} generated in {p}\n".format(n=p12, p=self.p12_folder))
-        return True
+        return self.export_p12(p12=p12, key=key, pem=pem, password=password)
 
     def write_p12(self, p12, key, pem, password):
         """
@@ -428,20 +1175,64 @@ class Certificate:
         :param password:
         :return:
         """
-        if self.exists(os.path.join(self.p12_folder, p12)):
-            self.output("{f} already exists, abort".format(f=p12))
+        if not self.archive and self.exists(os.path.join(self.p12_folder, p12)):
+            self.output("{f} already exists, abort", f=p12)
+            self.row_done(os.path.splitext(p12)[0], [os.path.join(self.p12_folder, p12)], status="exists")
             return False
-        else:
-            if self.exists(key, trigger_error=True) and self.exists(pem, trigger_error=True):
-                if self.check_extension(key, "key") and self.check_extension(pem, "pem"):
-                    cmd = "openssl pkcs12 -inkey {key} -in {pem} -export -out {p12} -password pass:{p}" \
-                        .format(key=key, pem=pem, p12=p12, p=password)
-                    self.shell(cmd)
-                    if self.exists(p12) and self.check_p12(path=p12, password=password, read=False):
-                        self.output("move {p} to {f}".format(p=p12, f=self.p12_folder), level=logging.DEBUG)
-                        os.rename(p12, os.path.join(self.p12_folder, p12))
-                        click.echo("{n} generated in {p}\n".format(n=p12, p=self.p12_folder))
-        return True
+        return self.export_p12(p12=p12, key=key, pem=pem, password=password)
+
+    def export_p12(self, p12, key, pem, password):
+        """
+        Build p12 from key and pem files and write it in p12 folder
+        :param p12:
+        :param key:
+        :param pem:
+        :param password:
+        :return:
+        """
+        if self.exists(key, trigger_error=True) and self.exists(pem, trigger_error=True):
+            if self.check_extension(key, "key") and self.check_extension(pem, "pem"):
+                try:
+                    with open(key) as f:
+                        private_key = crypto.load_privatekey(crypto.FILETYPE_PEM, f.read())
+                    with open(pem) as f:
+                        certificate = crypto.load_certificate(crypto.FILETYPE_PEM, f.read())
+                except (IOError, crypto.Error) as e:
+                    self.output("Failed to read {k} or {p}\n {e}", k=key, p=pem, e=e)
+                    self.row_done(os.path.splitext(p12)[0], [key, pem], status="failed", error=e)
+                    return False
+                if not self.key_match(private_key, certificate):
+                    self.output("{k} doesn't match {p}, abort", k=key, p=pem)
+                    self.row_done(os.path.splitext(p12)[0], [key, pem], status="failed",
+                                  key_size=private_key.bits(), error="key doesn't match pem")
+                    return False
+                pkcs12 = crypto.PKCS12()
+                pkcs12.set_privatekey(private_key)
+                pkcs12.set_certificate(certificate)
+                path = os.path.join(self.p12_folder, p12)
+                if self.archive:
+                    self.archive.add(os.path.relpath(path, self.certificate_folder),
+                                     pkcs12.export(passphrase=password), serial=os.path.splitext(p12)[0])
+                else:
+                    self.tools.write_atomic(path, pkcs12.export(passphrase=password))
+                    self.index_add(path)
+                    self.inventory_add(os.path.splitext(p12)[0], "p12", path, private_key, certificate.get_subject())
+                self.row_done(os.path.splitext(p12)[0], [path], key_size=private_key.bits())
+                self.output("p12 : {n} generated", level=logging.DEBUG, n=path)
+                self.echo("{n} generated in {p}\n".format(n=p12, p=self.destination(self.p12_folder)))
+                return True
+        return False
+
+    @staticmethod
+    def key_match(key, certificate):
+        """
+        Check private key belongs to certificate
+        :param key:
+        :param certificate:
+        :return:
+        """
+        return crypto.dump_publickey(crypto.FILETYPE_PEM, key) == \
+            crypto.dump_publickey(crypto.FILETYPE_PEM, certificate.get_pubkey())
 
     def overwrite_csr(self, req, key):
         """
@@ -452,8 +1243,10 @@ class Certificate:
         """
         self.generate_file(self.key_file, key)
         self.generate_file(self.csr_file, req)
-        self.output("=========== {} generated ============".format(self.name), level=logging.DEBUG)
-        click.echo("{n} generated in {p}\n".format(n=self.name, p=self.csr_folder))
+        self.inventory_csr(self.name, req, self.key_file, self.csr_file)
+        self.row_done(self.name, [self.key_file, self.csr_file], key_size=self.key_bits())
+        self.output("=========== {n} generated ============", level=logging.DEBUG, n=self.name)
+        self.echo("{n} generated in {p}\n".format(n=self.name, p=self.destination(self.csr_folder)))
 
     def write_csr(self, req, key):
         """
@@ -462,30 +1255,90 @@ class Certificate:
         :param key:
         :return:
         """
-        if self.exists(self.csr_file) and self.exists(self.key_file):
-            self.output("{} already exists => abort".format(self.name))
+        if not self.archive and self.exists(self.csr_file) and self.exists(self.key_file):
+            self.output("{n} already exists => abort", n=self.name)
+            self.row_done(self.name, [self.key_file, self.csr_file], status="exists", key_size=self.key_bits())
         else:
-            self.generate_file(self.key_file, key)
-            self.generate_file(self.csr_file, req)
-            self.output("=========== {} generated ============".format(self.name), level=logging.DEBUG)
-            click.echo("{n} generated in {p}\n".format(n=self.name, p=self.csr_folder))
+            self.overwrite_csr(req=req, key=key)
 
     def generate_file(self, mk_file, request):
         """
-        Generate .csr/key files.
+        Generate .csr/key files, or add them to archive if archive output is enabled.
         :param mk_file:
-        :param request:
+        :param request: X509 object or pem already dumped by a worker
         :return:
         """
-        with open(mk_file, "w") as f:
-            if ".csr" in mk_file:
-                f.write(crypto.dump_certificate_request(crypto.FILETYPE_PEM, request))
-                self.output("csr : {} generated".format(mk_file), level=logging.DEBUG)
-            elif ".key" in mk_file:
-                f.write(crypto.dump_privatekey(crypto.FILETYPE_PEM, request))
-                self.output("private key : {} generated".format(mk_file), level=logging.DEBUG)
-            elif ".crt" in mk_file:
-                f.write(crypto.dump_certificate(crypto.FILETYPE_PEM, request))
+        if ".csr" in mk_file:
+            label, dump = "csr", crypto.dump_certificate_request
+        elif ".key" in mk_file:
+            label, dump = "private key", crypto.dump_privatekey
+        elif ".crt" in mk_file or ".pem" in mk_file:
+            label, dump = "certificate", crypto.dump_certificate
+        else:
+            label, dump = "file", None
+
+        data = request
+        if not isinstance(request, basestring):
+            data = dump(crypto.FILETYPE_PEM, request) if dump else ""
+
+        if self.archive:
+            self.archive.add(os.path.relpath(mk_file, self.certificate_folder), data, serial=self.name,
+                             mode=0600 if label == "private key" else 0644)
+        else:
+            self.tools.write_atomic(mk_file, data)
+            self.index_add(mk_file)
+        self.output("{l} : {f} generated", level=logging.DEBUG, l=label, f=mk_file)
+
+    @contextmanager
+    def archive_output(self, path=None, force=False, bundle=True):
+        """
+        Write generated files in archive (.tar, .tar.gz, .tgz or .zip) or in a PEM bundle (.pem)
+        instead of certificate folder, a shard or a process of a claim run writes its own archive
+        :param path: if None, files are written in certificate folder
+        :param force: overwrite existing archive
+        :param bundle: False if generated files aren't PEM (p12)
+        :return:
+        """
+        if not path:
+            yield None
+            return
+        if Bundle.is_bundle(path) and not bundle:
+            self.output("p12 can't be written in a PEM bundle, use .tar, .tar.gz, .tgz or .zip", level=logging.ERROR)
+        path = os.path.abspath(self.output_path(path))
+        if self.exists(path) and not force:
+            self.output("{f} already exists, use -f to overwrite it", level=logging.ERROR, f=path)
+        try:
+            self.archive = Bundle(path) if Bundle.is_bundle(path) else Archive(path)
+        except BadExtensionException as e:
+            self.output(e, level=logging.ERROR)
+        except IOError as e:
+            self.output(e, level=logging.ERROR)
+        self.output("[*] Write generated files in {f}", level=logging.DEBUG, f=path)
+        try:
+            yield self.archive
+        finally:
+            archive, self.archive = self.archive, None
+            archive.close()
+            self.echo("{n} files archived in {p}\n".format(n=archive.count, p=archive.path))
+
+    def output_path(self, path):
+        """
+        Return path of inventory, report or archive written by this process:
+        each shard and each process of a claim run writes its own file
+        :param path:
+        :return:
+        """
+        return claim_path(shard_path(path, self.shard), self.claim_run, self.claim_owner)
+
+    def destination(self, folder):
+        """
+        Return where generated files are written
+        :param folder:
+        :return:
+        """
+        if self.archive:
+            return self.archive.path
+        return folder
 
     def is_ca(self):
         """
@@ -494,13 +1347,19 @@ class Certificate:
         """
         return "TRUE" if self._ca else "FALSE"
 
-    def output(self, msg, level=logging.WARNING):
+    def output(self, msg, level=logging.WARNING, **kwargs):
         """
         Generate output to CLI and log file
-        :param msg:
+        :param msg: formatted with kwargs only if message is displayed or logged
         :param level:
+        :param kwargs:
         :return:
         """
+        echo = level == logging.WARNING or (self._verbose and level >= self._level) or self._debug
+        if not echo and level < logging.ERROR and not (self._logger and self._logger.isEnabledFor(level)):
+            return
+        if kwargs:
+            msg = msg.format(**kwargs)
 
         # Output to log
         if level == logging.DEBUG:
@@ -511,8 +1370,8 @@ class Certificate:
             self._logger.warning(msg)
         elif level == logging.ERROR:
             self._logger.error(msg)
-            click.echo(self.ctx.get_help() + "\n")
-            click.echo("\n========ERROR========\n{m}\n========ERROR========\n".format(m=msg))
+            self.echo(self.ctx.get_help() + "\n")
+            self.echo("\n========ERROR========\n{m}\n========ERROR========\n".format(m=msg))
             raise click.Abort()
         elif level == logging.CRITICAL:
             self._logger.critical(msg)
@@ -521,12 +1380,12 @@ class Certificate:
             self._logger.error("[!] Invalid level for message: {m}".format(m=msg))
         # Output to CLI if needed
         if level == logging.WARNING:
-            click.echo("{m}\n".format(m=msg))
+            self.echo("{m}\n".format(m=msg))
         elif self._verbose and (level >= self._level):
-            click.echo("{m}\n".format(m=msg))
+            self.echo("{m}\n".format(m=msg))
 
         elif self._debug:
-            click.echo("{m}\n".format(m=msg))
+            self.echo("{m}\n".format(m=msg))
 
     def read(self, path, password=None, plain_text=False):
         """
@@ -545,6 +1404,64 @@ class Certificate:
             else:
                 self.output(".csr or .p12 expected", logging.ERROR)
 
+    def read_bundle(self, path, serial, kind=None, fields=None):
+        """
+        Read objects of serial in a PEM bundle written by --archive [bundle].pem
+        :param path: bundle
+        :param serial:
+        :param kind: type of object (csr, key, pem), all types if None
+        :param fields: extract only these fields, all if None
+        :return: records of objects, path of record is the name of object in bundle
+        """
+        self.exists(path, trigger_error=True)
+        try:
+            bundle = BundleReader(path)
+        except (IOError, ValueError) as e:
+            self.output(e, level=logging.ERROR)
+        records = []
+        with bundle:
+            if serial not in bundle:
+                self.output("{s} not found in {f}", level=logging.ERROR, s=serial, f=path)
+            for _kind, name, data in bundle.get(serial, kind):
+                record = OrderedDict([("path", name), ("type", _kind)])
+                try:
+                    record.update(extract(load_data(_kind, data), fields))
+                except crypto.Error as e:
+                    record["error"] = str(e) or e.__class__.__name__
+                records.append(record)
+        return records
+
+    def read_multiple(self, paths, password=None, fields=None, jobs=1, batch=64):
+        """
+        Read csr and p12 files, folders are walked and glob patterns expanded
+        :param paths:
+        :param password: asked once if a p12 is found and password is not given
+        :param fields: extract only these fields, all if None
+        :param jobs: number of worker processes, sequential if 1
+        :param batch: number of files read by a worker at once
+        :return: iterator over records of files, errors included
+        """
+        state = {"password": password}
+
+        def read_jobs():
+            for path in expand_paths(paths):
+                if state["password"] is None and path.endswith(".p12"):
+                    state["password"] = str(click.prompt("Enter password", hide_input=True, err=True))
+                yield {"path": path, "password": state["password"], "fields": fields}
+
+        if not jobs or jobs == 1:
+            for job in read_jobs():
+                yield read_job(job)
+            return
+
+        self.output("[*] Start {j} workers", level=logging.DEBUG, j=jobs)
+        _jobs = read_jobs()
+        batches = iter(lambda: list(islice(_jobs, batch)), [])
+        with WorkerPool(jobs) as pool:
+            for records in pool.imap(read_batch, batches):
+                for record in records:
+                    yield record
+
     def check_csr(self, path, read=True, plain_text=False):
         """
         Check csr
@@ -559,29 +1476,11 @@ class Certificate:
 
                 with open(path) as f:
                     _file = f.read()
-                self.output("Read {f}".format(f=path), level=logging.DEBUG)
-                req = crypto.load_certificate_request(crypto.FILETYPE_PEM, _file)
-                key = req.get_pubkey()
-                extensions = self.get_cert_ext(req)
-                key_type = 'RSA' if key.type() == crypto.TYPE_RSA else 'DSA'
-                self.output("get subject", level=logging.DEBUG)
-                subject = req.get_subject()
-                components = dict(subject.get_components())
-                result = {
-                    "Common name:": components['CN'] if "CN" in components else "",
-                    "Organisation:": components['O'] if "O" in components else "",
-                    "Orgainistional unit": components['OU'] if "OU" in components else "",
-                    "City/locality:": components['L'] if 'L' in components else "",
-                    "State/province:": components['ST'] if "ST" in components else "",
-                    "Country:": components['C'] if "C" in components else "",
-                    "Signature algorithm:": '',
-                    "Key algorithm:": key_type,
-                    "Key size:": key.bits(),
-                    "extensions:": extensions
-                }
+                self.output("Read {f}", level=logging.DEBUG, f=path)
+                parsed = load_csr(_file)
                 if read:
                     self.output("Generate json", level=logging.DEBUG)
-                    return json.dumps(result, indent=4)
+                    return json.dumps(extract(parsed), indent=4)
                 return True
             except Exception as e:
                 m = "Failed to read {f}\n {e}\nTry read {f} -t".format(f=path, e=e)
@@ -596,7 +1495,7 @@ class Certificate:
             if result:
                 return result
             else:
-                self.output("unable to read {f}".format(f=path), level=logging.ERROR)
+                self.output("unable to read {f}", level=logging.ERROR, f=path)
 
     def check_p12(self, path, password=None, read=True):
         """
@@ -606,49 +1505,21 @@ class Certificate:
         :param read:
         :return:
         """
-        # if password:
-        #     cmd = "openssl pkcs12 -info -in {p12} -noout -password pass:{p}".format(p12=path, p=password)
-        # else:
-        #     cmd = "openssl pkcs12 -info -in {p12}".format(p12=path)
-        # result = self.shell(cmd)
-        # if result:
-        #     return result
-        # else:
-        #     return False
-
         try:
             if not password:
                 password = str(click.prompt("Enter password"))
-            self.output("Read {f}".format(f=path), level=logging.DEBUG)
-            p12 = crypto.load_pkcs12(open(path, 'rb').read(), password)
-
-            s = str(p12.get_certificate().get_subject()).split("<X509Name object ")[1].split(">")[0].split("/")
-            subject = {}
-            for i in s:
-                try:
-                    subject[i.split("=")[0]] = i.split("=")[1]
-                except IndexError:
-                    pass
-
-            result = {
-                "certificate:": {
-                    "subject": subject
-                },
-                "private_key:": {
-                    "type": str(p12.get_privatekey().type()),
-                    "bits": str(p12.get_privatekey().bits())
-                },
-                "ca:": str(p12.get_ca_certificates())
-            }
+            self.output("Read {f}", level=logging.DEBUG, f=path)
+            with open(path, 'rb') as f:
+                parsed = load_p12(f.read(), password)
             if read:
                 self.output("Generate json", level=logging.DEBUG)
-                return json.dumps(result, indent=4)
+                return json.dumps(extract(parsed), indent=4)
             return True
         except Exception as e:
             if read:
-                self.output("Failed to read {f}\n {e}".format(f=path, e=e), level=logging.ERROR)
+                self.output("Failed to read {f}\n {e}", level=logging.ERROR, f=path, e=e)
             else:
-                self.output("Failed to read {f}\n {e}".format(f=path, e=e), level=logging.WARNING)
+                self.output("Failed to read {f}\n {e}", level=logging.WARNING, f=path, e=e)
                 return False
 
     @staticmethod
@@ -664,20 +1535,32 @@ class Certificate:
         return ext
 
     def get_list_from_csv(self, csv_file=None, absolute=False):
-        _list = []
+        """
+        Return an iterator over serials of csv file, the first row is read
+        to detect missing or empty csv before any generation
+        :param csv_file:
+        :param absolute:
+        :return:
+        """
+        _list = None
         if csv_file:
             _list = self.read_csv(_file=csv_file, absolute=absolute)
         elif self.custom and "csvfile" in self.custom:
             _list = self.read_csv(_file=self.custom.get("csvfile"))
         elif self.config and "csvfile" in self.config:
             _list = self.read_csv(_file=self.config.get("csvfile"))
-        if not _list:
+        try:
+            first = next(_list)
+        except (TypeError, StopIteration):
             self.output("no csv file or list detected", level=logging.ERROR)
-        return _list
+        if self.shard:
+            self.output("[*] Process shard {i}/{n}", level=logging.DEBUG, i=self.shard[0], n=self.shard[1])
+            return in_shard(chain([first], _list), self.shard)
+        return chain([first], _list)
 
     def read_csv(self, _file, absolute=False):
         """
-        Return dict form csv file
+        Yield serials from csv file, one row at a time
         :param _file:
         :param absolute:
         :return:
@@ -685,21 +1568,20 @@ class Certificate:
         csv_file = os.path.join(self.csv_folder, _file)
         if absolute:
             csv_file = _file
-        csv_list = []
+        self.csv_path = csv_file
         column = "serial"
         try:
             if self.check_extension(csv_file, "csv"):
-                self.output("[+] Reading values file: {f}".format(f=_file), level=logging.DEBUG)
+                self.output("[+] Reading values file: {f}", level=logging.DEBUG, f=_file)
                 with open(csv_file) as f:
                     reader = csv.DictReader(f)
                     for row in reader:
-                        csv_list.append(row[column])
-                return csv_list
+                        yield row[column]
         except IOError as err:
             self.output(err, level=logging.ERROR)
         except KeyError:
-            self.output("You must name your head column: '{c}' in the csv file: {f}".format(c=column, f=csv_file),
-                        level=logging.ERROR)
+            self.output("You must name your head column: '{c}' in the csv file: {f}", level=logging.ERROR,
+                        c=column, f=csv_file)
 
     def exists(self, path, trigger_error=False, trigger_warning=False):
         """
@@ -710,16 +1592,28 @@ class Certificate:
         :return:
         """
         try:
-            if os.path.exists(path):
+            if self.path_exists(path):
                 return True
             if trigger_error:
-                self.output("{f} doesn't exist".format(f=path), level=logging.ERROR)
+                self.output("{f} doesn't exist", level=logging.ERROR, f=path)
             else:
                 if trigger_warning:
-                    self.output("{f} doesn't exist".format(f=path))
+                    self.output("{f} doesn't exist", f=path)
                 return False
         except TypeError as e:
-            self.output("path not given: {e}".format(e=e), level=logging.ERROR)
+            self.output("path not given: {e}", level=logging.ERROR, e=e)
+
+    def path_exists(self, path):
+        """
+        Check path in folder index if path is indexed, on disk otherwise
+        :param path:
+        :return:
+        """
+        if self.index is not None and isinstance(path, basestring):
+            absolute = os.path.abspath(path)
+            if self.index.covers(absolute):
+                return self.index.exists(absolute)
+        return os.path.exists(path)
 
     def parse_yaml(self, cfg):
         """
@@ -730,9 +1624,9 @@ class Certificate:
         _file = os.path.join(self.app_folder, cfg)
         if self.exists(_file, trigger_error=True):
             if self.check_extension(_file, "yaml"):
-                self.output("[+] Reading values file: {f}".format(f=cfg), level=logging.DEBUG)
+                self.output("[+] Reading values file: {f}", level=logging.DEBUG, f=cfg)
                 with open(_file, 'r') as stream:
-                    _cfg = yaml.load(stream)
+                    _cfg = get_yaml().load(stream)
                 return _cfg
 
     def check_extension(self, _file, expected_ext, trigger_error=True):
@@ -753,8 +1647,7 @@ class Certificate:
             else:
                 return True
         except BadExtensionException, e:
-            self.output("File with extension {e} is expected, \"{g}\" given"
-                        .format(e=expected_ext, g=e), logging.ERROR)
+            self.output("File with extension {e} is expected, \"{g}\" given", logging.ERROR, e=expected_ext, g=e)
 
     @staticmethod
     def is_absolute(path):
@@ -772,11 +1665,11 @@ class Certificate:
         :param strip:
         :return:
         """
-        self.output('> {}'.format(cmd), level=logging.DEBUG)
+        self.output('> {c}', level=logging.DEBUG, c=cmd)
         return self.tools.shell(cmd, strip)
 
 
 if __name__ == "__main__":
     tools = Tools()
     my_cert = Certificate(tools.get_logger())
-    print(my_cert.read_csv(_file="/Users/john/Desktop/cert/csv/bulk_enroll_devices.csv", absolute=True))
+    print(list(my_cert.read_csv(_file="/Users/john/Desktop/cert/csv/bulk_enroll_devices.csv", absolute=True)))
@@ -0,0 +1,303 @@
+import binascii
+import errno
+import json
+import os
+import re
+import socket
+import threading
+import time
+from collections import Counter
+from shard import split_extension
+from tools import Tools
+
+
+def default_owner():
+    """
+    Return owner of claims of this process: host:pid
+    :return:
+    """
+    return "{h}:{p}".format(h=socket.gethostname(), p=os.getpid())
+
+
+def claim_path(path, run, owner):
+    """
+    Return path of a file written by one process of a claim run: [name].claim-[run].[owner][extension],
+    processes of a run don't share inventory, report or archive
+    :param path:
+    :param run: path is returned as is if None
+    :param owner:
+    :return:
+    """
+    if not run:
+        return path
+    root, ext = split_extension(path)
+    return "{r}.claim-{n}.{o}{e}".format(r=root, n=run, o=re.sub(r"[^\w.-]", "-", owner), e=ext)
+
+
+def claim_files(path, run):
+    """
+    Return files written by processes of claim run for path, sorted by owner
+    :param path: path given to bulk command
+    :param run:
+    :return: list of (owner, file)
+    """
+    folder, name = os.path.split(os.path.abspath(path))
+    root, ext = split_extension(name)
+    pattern = re.compile(re.escape(root) + r"\.claim-" + re.escape(run) + r"\.(.+)" + re.escape(ext) + "$")
+    files = []
+    for entry in os.listdir(folder) if os.path.isdir(folder) else []:
+        match = pattern.match(entry)
+        if match:
+            files.append((match.group(1), os.path.join(folder, entry)))
+    return sorted(files)
+
+
+class ClaimDir:
+    def __init__(self, folder, lease=300, owner=None):
+        """
+        Rows of a csv file shared by several processes, local or on nodes sharing the folder.
+        A row is claimed by creating [serial].claim with O_EXCL, the claim is renewed (mtime) while the row
+        is in progress and replaced by [serial].done when its files are written.
+        A claim not renewed for lease seconds (crashed process) is taken over by the next process reading the row,
+        lease must be longer than the clock difference between nodes.
+        Each claim contains a token (owner and a random nonce) checked before the claim is renewed or removed:
+        a claim taken over from a stalled process is never renewed, removed or marked done by that process
+        :param folder: shared by processes of the same run
+        :param lease: seconds
+        :param owner: written in claims, default is host:pid
+        """
+        self.folder = folder
+        self.lease = lease
+        self.owner = owner or default_owner()
+        # serial => token of its claim
+        self.held = {}
+        self.count = Counter()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        if not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+    def __enter__(self):
+        return self.start()
+
+    def start(self):
+        """
+        Start renewing claims in a thread
+        :return: self
+        """
+        self.thread = threading.Thread(target=self.renew_loop, name="certgen-claim")
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def path(self, name, state="claim"):
+        return os.path.join(self.folder, "{n}.{s}".format(n=name, s=state))
+
+    def filter(self, names):
+        """
+        Yield serials claimed by this process, serials done or claimed by another process are skipped
+        :param names:
+        :return:
+        """
+        for name in names:
+            if self.claim(name):
+                yield name
+
+    def claim(self, name):
+        """
+        Claim serial
+        :param name:
+        :return: True if serial is claimed by this process
+        """
+        if os.path.exists(self.path(name, "done")):
+            self.count["done"] += 1
+            return False
+        if self.create(name):
+            reclaimed = False
+        elif self.expired(self.path(name)) and self.take_over(name):
+            reclaimed = True
+        else:
+            self.count["busy"] += 1
+            return False
+        # done() creates [serial].done before removing the claim: a claim created after the check above
+        # may belong to a serial done meanwhile by another process
+        if os.path.exists(self.path(name, "done")):
+            self.drop(name)
+            self.count["done"] += 1
+            return False
+        self.count["claimed"] += 1
+        if reclaimed:
+            self.count["reclaimed"] += 1
+        return True
+
+    def create(self, name):
+        """
+        Create claim of serial, fails if serial is already claimed
+        :param name:
+        :return:
+        """
+        try:
+            fd = os.open(self.path(name), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0644)
+        except OSError as e:
+            if e.errno == errno.EEXIST:
+                return False
+            raise
+        token = "{o}:{n}".format(o=self.owner, n=binascii.hexlify(os.urandom(8)))
+        try:
+            os.write(fd, json.dumps({"owner": self.owner, "token": token, "time": int(time.time())}) + "\n")
+        finally:
+            os.close(fd)
+        with self.lock:
+            self.held[name] = token
+        return True
+
+    def owns(self, name, token):
+        """
+        Return True if claim of serial is still the claim created with token
+        :param name:
+        :param token:
+        :return:
+        """
+        try:
+            with open(self.path(name)) as f:
+                return json.loads(f.readline()).get("token") == token
+        except (IOError, ValueError, AttributeError):
+            return False
+
+    def expired(self, path):
+        try:
+            return time.time() - os.stat(path).st_mtime > self.lease
+        except OSError:
+            # released or done meanwhile
+            return False
+
+    def take_over(self, name):
+        """
+        Take over expired claim: only one process can rename it, the renamed claim is checked again
+        because it may have been renewed or created again between expired() and rename
+        :param name:
+        :return:
+        """
+        path = self.path(name)
+        stale = "{p}.{o}.stale".format(p=path, o=self.owner.replace(os.sep, "_"))
+        try:
+            os.rename(path, stale)
+        except OSError:
+            return False
+        if not self.expired(stale):
+            try:
+                os.link(stale, path)
+            except OSError:
+                pass
+            os.unlink(stale)
+            return False
+        os.unlink(stale)
+        return self.create(name)
+
+    def done(self, name):
+        """
+        Record serial as done and remove its claim, files of serial must already be on disk
+        :param name:
+        :return:
+        """
+        self.done_batch([name])
+
+    def done_batch(self, names):
+        """
+        Record serials as done and remove their claims, files of serials must already be on disk.
+        [serial].done files are synced before claims are removed: a crash never leaves a serial without claim and done.
+        A serial whose claim was taken over by another process is not marked done, the other process does it
+        :param names:
+        :return:
+        """
+        with self.lock:
+            held = [(name, self.held.pop(name)) for name in names if name in self.held]
+        owned = [(name, token) for name, token in held if self.owns(name, token)]
+        self.count["lost"] += len(held) - len(owned)
+        if not owned:
+            return
+        for name, _ in owned:
+            fd = os.open(self.path(name, "done"), os.O_WRONLY | os.O_CREAT, 0644)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        Tools.sync_folder(self.folder)
+        for name, token in owned:
+            self.remove_owned(name, token)
+
+    def drop(self, name):
+        """
+        Remove claim of serial not processed
+        :param name:
+        :return:
+        """
+        with self.lock:
+            token = self.held.pop(name, None)
+        if token:
+            self.remove_owned(name, token)
+
+    def renew_loop(self):
+        while not self.stopped.wait(self.lease / 3.0):
+            self.renew()
+
+    def renew(self):
+        """
+        Renew claims of serials in progress, a claim taken over by another process is no longer held
+        :return:
+        """
+        with self.lock:
+            held = list(self.held.items())
+        for name, token in held:
+            if not self.owns(name, token):
+                with self.lock:
+                    if self.held.get(name) == token:
+                        del self.held[name]
+                        self.count["lost"] += 1
+                continue
+            try:
+                os.utime(self.path(name), None)
+            except OSError:
+                pass
+
+    def release(self):
+        """
+        Remove claims of serials not done, other processes can claim them without waiting for the lease.
+        A claim taken over by another process is kept
+        :return:
+        """
+        with self.lock:
+            held, self.held = self.held, {}
+        for name, token in held.items():
+            self.remove_owned(name, token)
+
+    def remove_owned(self, name, token):
+        """
+        Remove claim of serial if it is still the claim created with token
+        :param name:
+        :param token:
+        :return:
+        """
+        if self.owns(name, token):
+            self.remove(self.path(name))
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def close(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.release()
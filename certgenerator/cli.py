@@ -1,11 +1,15 @@
 import click
+import glob
 import json
+import os
 import callbacks
 import decorators
-from certificate import Certificate
-from tools import Tools, edit_config
+from bench import STAGES
+from context import LazyTools, get_context, reset_context
+from tools import edit_config
 
-tools = Tools()
+# OpenSSL and config.ini are loaded only by commands using them
+tools = LazyTools()
 
 
 @click.group(context_settings=dict(help_option_names=['-h', '--help']))
@@ -35,6 +39,7 @@ def init(cert_folder, csv_file, yaml):
     :return:
     """
     edit_config(cert_folder, csv_file, yaml)
+    reset_context()
 
 
 @main.command()
@@ -43,7 +48,9 @@ def init(cert_folder, csv_file, yaml):
 @click.argument('name', type=str, required=False)
 @decorators.global_options("csr")
 @decorators.debug_options
-def create(logger, ctx, name, config, force, key_size, san, verbose, debug, **subject):
+@decorators.profile_options
+def create(logger, ctx, name, config, force, key_size, key_type, curve, san, keypool, verbose, debug, profile,
+           profile_output, **subject):
     """
     Create a single CSR
     \f
@@ -54,13 +61,21 @@ def create(logger, ctx, name, config, force, key_size, san, verbose, debug, **su
     :param config:
     :param force:
     :param key_size:
+    :param key_type:
+    :param curve:
     :param san:
+    :param keypool:
     :param verbose:
     :param debug:
+    :param profile:
+    :param profile_output:
     :param subject:
     :return:
     """
-    tools.set_options(ctx=ctx, config=config, san=san, size=key_size, subject=subject, verbose=verbose, debug=debug)
+    from certificate import Certificate
+    tools.set_options(ctx=ctx, config=config, san=san, size=key_size, key_type=key_type, curve=curve,
+                      subject=subject, keypool=keypool, verbose=verbose, debug=debug, profile=profile,
+                      profile_output=profile_output)
 
     if name:
         tools.set_options(name=str(name))
@@ -70,16 +85,34 @@ def create(logger, ctx, name, config, force, key_size, san, verbose, debug, **su
     if 'subject' in tools.opts:
         cert.load_subject()
 
-    cert.generate_csr(force=force)
+    with cert.inventory_output():
+        cert.generate_csr(force=force)
+    cert.keypool_report()
+    cert.profile_report()
 
 
 @main.command(short_help="Create multiple CSR")
 @click.pass_context
 @decorators.pass_logger
 @decorators.csv_options
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=1,
+              help="Number of worker processes used to generate keys, default is 1")
+@click.option('-pl', '--pipeline', is_flag=True,
+              help="Read csv, generate keys, write files and report in stages connected by bounded queues")
+@click.option('-in', '--incremental', is_flag=True,
+              help="Generate only serials new or changed (subject, san, key) since last successful run")
+@click.option('-cl', '--claim', type=str, metavar="RUN",
+              help="Share csv with other processes started with the same run name, each serial is claimed"
+                   " by one process")
+@click.option('--lease', type=click.IntRange(min=1), default=300, show_default=True,
+              help="Seconds after which the claim of a crashed process is taken over")
+@decorators.bulk_options
 @decorators.global_options("csr")
 @decorators.debug_options
-def create_multiple(logger, ctx, csv_file, config, force, key_size, san, verbose, debug, **subject):
+@decorators.profile_options
+def create_multiple(logger, ctx, csv_file, jobs, pipeline, incremental, claim, lease, archive, resume, report, shard,
+                    config, force, key_size, key_type, curve, san, keypool, verbose, debug, profile, profile_output,
+                    **subject):
     """
     Create multiple certificate using csv file
     \f
@@ -87,25 +120,47 @@ def create_multiple(logger, ctx, csv_file, config, force, key_size, san, verbose
     :param logger:
     :param ctx:
     :param csv_file:
+    :param jobs:
+    :param pipeline:
+    :param incremental:
+    :param claim:
+    :param lease:
+    :param archive:
+    :param resume:
+    :param report:
+    :param shard:
     :param config:
     :param force:
     :param key_size:
+    :param key_type:
+    :param curve:
     :param san:
+    :param keypool:
     :param verbose:
     :param debug:
+    :param profile:
+    :param profile_output:
     :param subject:
     :return:
     """
-    tools.set_options(ctx=ctx, config=config, san=san, size=key_size, subject=subject, verbose=verbose, debug=debug)
+    from certificate import Certificate
+    tools.set_options(ctx=ctx, config=config, san=san, size=key_size, key_type=key_type, curve=curve,
+                      subject=subject, keypool=keypool, shard=shard, claim=claim, verbose=verbose, debug=debug,
+                      profile=profile, profile_output=profile_output)
     cert = Certificate(logger=logger, opts=tools.opts)
 
     if 'subject' in tools.opts:
         cert.load_subject()
 
-    if csv_file:
-        cert.generate_multiple(csv_file=csv_file, force=force)
-    else:
-        cert.generate_multiple(force=force)
+    with cert.archive_output(archive, force=force), cert.report_output(report), cert.inventory_output():
+        if csv_file:
+            cert.generate_multiple(csv_file=csv_file, force=force, jobs=jobs, resume=resume, pipeline=pipeline,
+                                   incremental=incremental, lease=lease)
+        else:
+            cert.generate_multiple(force=force, jobs=jobs, resume=resume, pipeline=pipeline, incremental=incremental,
+                                   lease=lease)
+    cert.keypool_report()
+    cert.profile_report()
 
 
 @main.command(short_help="Create one p12")
@@ -118,7 +173,8 @@ def create_multiple(logger, ctx, csv_file, config, force, key_size, san, verbose
               default="3z6F2Xfc")
 @decorators.global_options("p12")
 @decorators.debug_options
-def create_p12(logger, ctx, name, pem, key, password, config, force, verbose, debug):
+@decorators.profile_options
+def create_p12(logger, ctx, name, pem, key, password, config, force, verbose, debug, profile, profile_output):
     """
     \b
     Create a simple p12
@@ -135,12 +191,18 @@ def create_p12(logger, ctx, name, pem, key, password, config, force, verbose, de
     :param force:
     :param verbose:
     :param debug:
+    :param profile:
+    :param profile_output:
     :return:
     """
-    tools.set_options(ctx=ctx, config=config, verbose=verbose, debug=debug)
+    from certificate import Certificate
+    tools.set_options(ctx=ctx, config=config, verbose=verbose, debug=debug, profile=profile,
+                      profile_output=profile_output)
 
     cert = Certificate(logger=logger, opts=tools.opts)
-    cert.generate_p12(key=key, pem=pem, p12=name, password=password, force=force)
+    with cert.inventory_output():
+        cert.generate_p12(key=key, pem=pem, p12=name, password=password, force=force)
+    cert.profile_report()
 
 
 @main.command(short_help="Create multiple p12")
@@ -153,9 +215,12 @@ def create_p12(logger, ctx, name, pem, key, password, config, force, verbose, de
                    " if not defined, it will search key in certificate folder")
 @click.option('-pass', '--password', type=str, hide_input=True, help="Define password, default is '3z6F2Xfc'",
               default="3z6F2Xfc")
+@decorators.bulk_options
 @decorators.global_options("p12")
 @decorators.debug_options
-def create_multiple_p12(logger, ctx, csv_file, pem_folder, key_folder, password, config, force, verbose, debug):
+@decorators.profile_options
+def create_multiple_p12(logger, ctx, csv_file, pem_folder, key_folder, password, archive, resume, report, shard,
+                        config, force, verbose, debug, profile, profile_output):
     """
     Create multiple p12 using csv file
     \f
@@ -166,44 +231,544 @@ def create_multiple_p12(logger, ctx, csv_file, pem_folder, key_folder, password,
     :param pem_folder:
     :param key_folder:
     :param password:
+    :param archive:
+    :param resume:
+    :param report:
+    :param shard:
     :param config:
     :param force:
     :param verbose:
     :param debug:
+    :param profile:
+    :param profile_output:
     :return:
     """
-    tools.set_options(ctx=ctx, config=config, verbose=verbose, debug=debug)
+    from certificate import Certificate
+    tools.set_options(ctx=ctx, config=config, shard=shard, verbose=verbose, debug=debug, profile=profile,
+                      profile_output=profile_output)
 
     cert = Certificate(logger, opts=tools.opts)
-    if csv_file:
-        cert.generate_multiple_p12(csv_file=csv_file, pem_folder=pem_folder,
-                                   key_folder=key_folder, password=password, force=force)
-    else:
-        cert.generate_multiple_p12(pem_folder=pem_folder, key_folder=key_folder, password=password, force=force)
-
-
-@main.command()
+    with cert.archive_output(archive, force=force, bundle=False), cert.report_output(report), \
+            cert.inventory_output():
+        if csv_file:
+            cert.generate_multiple_p12(csv_file=csv_file, pem_folder=pem_folder,
+                                       key_folder=key_folder, password=password, force=force, resume=resume)
+        else:
+            cert.generate_multiple_p12(pem_folder=pem_folder, key_folder=key_folder, password=password, force=force,
+                                       resume=resume)
+    cert.profile_report()
+
+
+@main.command(short_help="Read csr or p12")
 @click.pass_context
 @decorators.pass_logger
-@click.argument("path", type=str)
+@click.argument("path", type=str, nargs=-1)
 @click.option('-pass', '--password', type=str, hide_input=True, help="password used for create p12")
+@click.option('-b', '--bundle', type=str, help="Read objects of a serial in a PEM bundle (--archive *.pem)")
+@click.option('-sr', '--serial', type=str, help="Serial read in bundle")
+@click.option('-ty', '--type', 'kind', type=click.Choice(['csr', 'key', 'pem']),
+              help="Type of object read in bundle, all types if not defined", show_choices=True)
 @click.option('-t', '--plain-text', is_flag=True, help="Display certificate in plain text instead of json")
-def read(logger, ctx, path, password, plain_text):
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=1,
+              help="Number of worker processes used to read files, default is 1")
+@click.option('-fi', '--fields', type=str,
+              help="Extract only these fields, separated by comma (ex: --fields subject,key_size)")
+@decorators.profile_options
+def read(logger, ctx, path, password, bundle, serial, kind, plain_text, jobs, fields, profile, profile_output):
     """
+    \b
     Read csr or p12
+    Several files, folders or glob patterns (ex: "csr/*/*.csr") are read
+    as one compact json line per file
+    Objects of a serial in a PEM bundle are read with --bundle and --serial
     \f
 
     :param logger:
     :param ctx:
     :param path:
     :param password:
+    :param bundle:
+    :param serial:
+    :param kind:
     :param plain_text:
+    :param jobs:
+    :param fields:
+    :param profile:
+    :param profile_output:
+    :return:
+    """
+    from certificate import Certificate
+    from reader import FIELDS
+    tools.set_options(ctx=ctx, profile=profile, profile_output=profile_output)
+
+    cert = Certificate(logger=logger, opts=tools.opts)
+    if bundle:
+        if path:
+            raise click.BadParameter("can't be used with --bundle", param_hint="'PATH'")
+        if not serial:
+            raise click.BadParameter("required to read a bundle", param_hint="'--serial'")
+    elif not path:
+        raise click.BadParameter("PATH or --bundle is required", param_hint="'PATH'")
+    multiple = bundle or len(path) > 1 or os.path.isdir(path[0]) or glob.has_magic(path[0]) or jobs > 1 or fields
+    if not multiple:
+        click.echo(cert.read(path=path[0], password=password, plain_text=plain_text))
+    else:
+        if plain_text:
+            raise click.BadParameter("can't be used to read several files", param_hint="'--plain-text'")
+        if fields:
+            fields = [field.strip() for field in fields.split(",") if field.strip()]
+            for field in fields:
+                if field not in FIELDS:
+                    raise click.BadParameter("invalid field {f}, choose from {c}"
+                                             .format(f=field, c=", ".join(FIELDS)), param_hint="'--fields'")
+        if bundle:
+            records = cert.read_bundle(bundle, serial, kind=kind, fields=fields)
+        else:
+            records = cert.read_multiple(path, password=password, fields=fields, jobs=jobs)
+        for record in records:
+            click.echo(json.dumps(record, separators=(",", ":")))
+    cert.profile_report()
+
+
+@main.command(short_help="Benchmark csr and p12 generation")
+@click.pass_context
+@decorators.pass_logger
+@click.option('-n', '--rounds', type=click.IntRange(min=1), default=20, help="Timed calls per stage, default is 20")
+@click.option('-st', '--stage', multiple=True, type=click.Choice(STAGES),
+              help="Run only this stage (ex: --stage keygen-2048 --stage sign ...)")
+@click.option('-o', '--output', type=str, help="Write json report in file")
+@click.option('-c', '--config', is_flag=True, help="Use config.ini and csr.yaml")
+def bench(logger, ctx, rounds, stage, output, config):
+    """
+    Time each stage of csr and p12 generation
+    \f
+
+    :param logger:
+    :param ctx:
+    :param rounds:
+    :param stage:
+    :param output:
+    :param config:
     :return:
     """
-    tools.set_options(ctx=ctx)
+    from bench import Bench
+    from certificate import Certificate
+    tools.set_options(ctx=ctx, config=config)
 
     cert = Certificate(logger=logger, opts=tools.opts)
-    click.echo(cert.read(path=path, password=password, plain_text=plain_text))
+    report = Bench(cert, rounds=rounds).run(stages=stage, callback=lambda r: click.echo(Bench.format(r)))
+    if output:
+        Bench.dump(report, output)
+        click.echo("\nreport written in {f}".format(f=output))
+
+
+@main.command(short_help="Serve csr generation over a unix socket or localhost http")
+@click.pass_context
+@decorators.pass_logger
+@click.option('-so', '--socket', 'socket_path', type=str,
+              help="Unix socket, only usable by owner, default is {folder}/cert.sock")
+@click.option('-p', '--port', type=click.IntRange(min=1, max=65535), help="Listen on 127.0.0.1:port instead of socket")
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=1,
+              help="Number of worker processes used to generate keys, default is 1")
+@click.option('-mr', '--max-requests', type=click.IntRange(min=1), default=8, show_default=True,
+              help="Requests generated at the same time, other requests are rejected (503)")
+@click.option('--timeout', type=click.IntRange(min=1), default=60, show_default=True,
+              help="Seconds to wait for a worker")
+@click.option('-tk', '--token', type=str, envvar="CERT_SERVE_TOKEN",
+              help="Requests must send 'Authorization: Bearer TOKEN', required with --port"
+                   " (prefer environment variable CERT_SERVE_TOKEN)")
+@decorators.global_options("csr")
+@decorators.debug_options
+def serve(logger, ctx, socket_path, port, jobs, max_requests, timeout, token, config, force, key_size, key_type, curve,
+          san, keypool, verbose, debug, **subject):
+    """
+    Keep a csr generator ready and answer json requests:
+    POST /csr {"name": ..., "subject": {...}, "san": [...], "key_type": ..., "key_size": ..., "curve": ...,
+    "write": false, "force": false}, GET /health and GET /metrics.
+    Options are the defaults of requests, pem are returned or written in certificate folder with "write": true
+    \f
+
+    :param logger:
+    :param ctx:
+    :param socket_path:
+    :param port:
+    :param jobs:
+    :param max_requests:
+    :param timeout:
+    :param token:
+    :param config:
+    :param force:
+    :param key_size:
+    :param key_type:
+    :param curve:
+    :param san:
+    :param keypool:
+    :param verbose:
+    :param debug:
+    :param subject:
+    :return:
+    """
+    import signal
+    from certificate import Certificate
+    from serve import Engine, make_server
+    if port and not token:
+        raise click.BadParameter("required to listen on a tcp port, any local user can connect to it",
+                                 param_hint="'--token'")
+    tools.set_options(ctx=ctx, config=config, san=san, size=key_size, key_type=key_type, curve=curve,
+                      subject=subject, keypool=keypool, verbose=verbose, debug=debug)
+    cert = Certificate(logger=logger, opts=tools.opts)
+
+    if 'subject' in tools.opts:
+        cert.load_subject()
+    # parse template before first request
+    cert.get_template()
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    socket_path = None if port else socket_path or os.path.join(cert.app_folder, "cert.sock")
+    with Engine(cert, jobs=jobs, max_requests=max_requests, timeout=timeout, force=force,
+                token=str(token) if token else None) as engine, \
+            cert.inventory_output():
+        try:
+            server = make_server(engine, socket_path=socket_path, port=port)
+        except (IOError, OSError) as e:
+            tools.error(e)
+        signal.signal(signal.SIGTERM, stop)
+        click.echo("serving on {a}".format(a=socket_path or "http://127.0.0.1:{p}".format(p=port)))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if socket_path and os.path.exists(socket_path):
+                os.unlink(socket_path)
+        click.echo("stopped after {n} csr".format(n=engine.count["generated"]))
+
+
+"""
+    KEYPOOL SECTION:
+        - Fill key pool
+        - Display available keys
+"""
+
+
+@main.group()
+def keypool():
+    """
+    Pre-generate keys used by create commands (--keypool)
+    """
+
+
+@keypool.command(short_help="Add keys to key pool")
+@click.option('-s', '--size', type=click.Choice(['1024', '2048', '4096']), default='2048',
+              help="Define key size", show_choices=True, show_default=True)
+@click.option('-n', '--count', type=click.IntRange(min=1), required=True, help="Number of keys")
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=1,
+              help="Number of worker processes used to generate keys, default is 1")
+@click.option('-w', '--watch', is_flag=True,
+              help="Keep running in background and keep COUNT keys available in key pool")
+@click.option('-i', '--interval', type=click.IntRange(min=1), default=5,
+              help="Seconds between two checks with --watch, default is 5")
+def fill(size, count, jobs, watch, interval):
+    """
+    Generate keys in key pool
+    \f
+
+    :param size:
+    :param count:
+    :param jobs:
+    :param watch:
+    :param interval:
+    :return:
+    """
+    from keypool import KeyPool, KeyPoolFiller
+    pool = KeyPool(os.path.join(tools.get_certificate_folder(), "keypool"))
+    size = int(size)
+    if watch:
+        filler = KeyPoolFiller(pool, size, count, interval=interval, jobs=jobs)
+        filler.start()
+        click.echo("keep {n} keys of {s} bits in {p}, press Ctrl+C to stop".format(n=count, s=size, p=pool.folder))
+        try:
+            while filler.is_alive():
+                filler.join(1)
+        except KeyboardInterrupt:
+            filler.stop()
+    else:
+        added = pool.fill(size, count, jobs=jobs)
+        click.echo("{n} keys of {s} bits added in {p}".format(n=added, s=size, p=pool.get_folder(size)))
+
+
+@keypool.command(short_help="Display key pool")
+def status():
+    """
+    Display available keys in key pool
+    """
+    from keypool import KeyPool
+    pool = KeyPool(os.path.join(tools.get_certificate_folder(), "keypool"))
+    click.echo("+++++keypool+++++\n{c}".format(c=json.dumps(pool.sizes(), indent=2)))
+
+
+"""
+    CA SECTION:
+        - Create local CA
+        - Sign csr with local CA
+"""
+
+
+@main.group()
+def ca():
+    """
+    Local CA signing csr of create commands
+    """
+
+
+@ca.command(name="init", short_help="Create local CA")
+@click.option('-cn', '--common-name', type=str, default="CertGenerator local CA", show_default=True,
+              help="Common Name of CA certificate")
+@click.option('-kt', '--key-type', type=click.Choice(['rsa', 'ec']), default='rsa', show_default=True,
+              help="Define key type", show_choices=True)
+@click.option('-ks', '--key-size', type=click.Choice(['2048', '4096']), default='4096', show_default=True,
+              help="Define key size", show_choices=True)
+@click.option('-cu', '--curve', type=click.Choice(['P-256', 'P-384', 'P-521']), default='P-384', show_default=True,
+              help="Define curve of ec key", show_choices=True)
+@click.option('--days', type=click.IntRange(min=1), default=3650, show_default=True,
+              help="Validity of CA certificate")
+@click.option('-f', '--force', is_flag=True, help="Overwrite existing CA")
+def ca_init(common_name, key_type, key_size, curve, days, force):
+    """
+    Generate CA key and self signed certificate in {folder}/ca/
+    \f
+
+    :param common_name:
+    :param key_type:
+    :param key_size:
+    :param curve:
+    :param days:
+    :param force:
+    :return:
+    """
+    from ca import LocalCA
+    local_ca = LocalCA(os.path.join(tools.get_certificate_folder(), "ca"))
+    if local_ca.exists() and not force:
+        tools.error("local CA already exists in {f}, use -f to overwrite it".format(f=local_ca.folder))
+    local_ca.init({"CN": common_name}, key_type=key_type, key_size=int(key_size), curve=curve, days=days)
+    click.echo("local CA created in {f}".format(f=local_ca.folder))
+
+
+@ca.command(name="sign", short_help="Sign multiple CSR with local CA")
+@click.pass_context
+@decorators.pass_logger
+@decorators.csv_options
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=1,
+              help="Number of worker processes used to sign csr, default is 1")
+@click.option('--days', type=click.IntRange(min=1), default=365, show_default=True,
+              help="Validity of certificates")
+@decorators.bulk_options
+@decorators.global_options("p12")
+@decorators.debug_options
+@decorators.profile_options
+def ca_sign(logger, ctx, csv_file, jobs, days, archive, resume, report, shard, config, force, verbose, debug,
+            profile, profile_output):
+    """
+    Sign csr of each serial of csv file with local CA,
+    certificates are written in {folder}/certificate/pem/ and used by create-multiple-p12
+    \f
+
+    :param logger:
+    :param ctx:
+    :param csv_file:
+    :param jobs:
+    :param days:
+    :param archive:
+    :param resume:
+    :param report:
+    :param shard:
+    :param config:
+    :param force:
+    :param verbose:
+    :param debug:
+    :param profile:
+    :param profile_output:
+    :return:
+    """
+    from ca import LocalCA
+    from certificate import Certificate
+    tools.set_options(ctx=ctx, config=config, shard=shard, verbose=verbose, debug=debug, profile=profile,
+                      profile_output=profile_output)
+    cert = Certificate(logger, opts=tools.opts)
+    local_ca = LocalCA(cert.ca_folder)
+    with cert.archive_output(archive, force=force), cert.report_output(report), cert.inventory_output():
+        cert.sign_multiple(local_ca, csv_file=csv_file, days=days, jobs=jobs, force=force, resume=resume)
+    cert.profile_report()
+
+
+"""
+    INVENTORY SECTION:
+        - Query inventory
+        - Display statistics
+        - Rebuild inventory from certificate folder
+"""
+
+
+@main.group()
+def inventory():
+    """
+    Inventory of generated keys, csr, certificates and p12 (certificate/inventory.sqlite)
+    """
+
+
+@inventory.command(short_help="Query inventory")
+@click.option('-sr', '--serial', type=str, help="Files of this serial")
+@click.option('-ty', '--type', 'kind', type=click.Choice(['csr', 'key', 'pem', 'p12']), help="Files of this type")
+@click.option('-kt', '--key-type', type=click.Choice(['RSA', 'EC', 'ED25519'], case_sensitive=False),
+              help="Files with this key type")
+@click.option('-ks', '--key-size', type=int, help="Files with this key size")
+@click.option('-m', '--missing', type=click.Choice(['csr', 'key', 'pem', 'p12']),
+              help="Only serials without file of this type (ex: --type csr --missing p12)")
+def query(serial, kind, key_type, key_size, missing):
+    """
+    Display files matching all filters, one json line per file
+    \f
+
+    :param serial:
+    :param kind:
+    :param key_type:
+    :param key_size:
+    :param missing:
+    :return:
+    """
+    from inventory import Inventory
+    with Inventory(inventory_path()) as inv:
+        for row in inv.query(serial=serial, kind=kind, key_type=key_type.upper() if key_type else None,
+                             key_size=key_size, missing=missing):
+            click.echo(json.dumps(row, separators=(",", ":")))
+
+
+@inventory.command(short_help="Display inventory statistics")
+def stats():
+    """
+    Display number of serials, files by type and keys by type and size
+    """
+    from inventory import Inventory
+    with Inventory(inventory_path()) as inv:
+        click.echo("+++++inventory+++++\n{c}".format(c=json.dumps(inv.stats(), indent=2)))
+
+
+@inventory.command(short_help="Rebuild inventory from certificate folder")
+@click.pass_context
+@decorators.pass_logger
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=1,
+              help="Number of worker processes used to read files, default is 1")
+@click.option('-pass', '--password', type=str, default="3z6F2Xfc", help="Password used to read p12")
+@decorators.debug_options
+def rebuild(logger, ctx, jobs, password, verbose, debug):
+    """
+    Record csr, key, pem and p12 files of certificate folder,
+    files not found anymore are removed from inventory
+    \f
+
+    :param logger:
+    :param ctx:
+    :param jobs:
+    :param password:
+    :param verbose:
+    :param debug:
+    :return:
+    """
+    from certificate import Certificate
+    tools.set_options(ctx=ctx, verbose=verbose, debug=debug)
+    cert = Certificate(logger, opts=tools.opts)
+    recorded, failed, removed = cert.rebuild_inventory(password=password, jobs=jobs)
+    click.echo("{r} files recorded ({f} unreadable), {d} removed in {p}".format(r=recorded, f=failed, d=removed,
+                                                                             p=cert.inventory_path))
+
+
+def inventory_path():
+    """
+    Return path of inventory
+    :return:
+    """
+    return os.path.join(get_context().folders()["certificate"], "inventory.sqlite")
+
+
+"""
+    SHARD SECTION:
+        - Merge files written by shards
+"""
+
+
+@main.group()
+def shard():
+    """
+    Files written by bulk commands run with --shard I/N
+    """
+
+
+@shard.command(short_help="Merge inventories and reports of shards")
+@click.pass_context
+@decorators.pass_logger
+@click.option('-rp', '--report', type=str,
+              help="Report path given to the bulk command, reports of shards are concatenated in this file")
+@decorators.debug_options
+def merge(logger, ctx, report, verbose, debug):
+    """
+    Merge inventories of shards in {folder}/certificate/inventory.sqlite
+    and reports of shards ([report].shard-[I]-of-[N]) in report, files of shards are kept
+    \f
+
+    :param logger:
+    :param ctx:
+    :param report:
+    :param verbose:
+    :param debug:
+    :return:
+    """
+    from certificate import Certificate
+    tools.set_options(ctx=ctx, verbose=verbose, debug=debug)
+    cert = Certificate(logger, opts=tools.opts)
+    shards, rows, records = cert.merge_shards(report=report)
+    click.echo("{s} inventories merged ({r} rows) in {p}".format(s=shards, r=rows, p=cert.inventory_path))
+    if report:
+        click.echo("{n} records merged in {p}".format(n=records, p=report))
+
+
+@main.group()
+def claim():
+    """
+    Files written by create-multiple run with --claim RUN
+    """
+
+
+@claim.command(name="merge", short_help="Merge inventories and reports of processes of a claim run")
+@click.pass_context
+@decorators.pass_logger
+@click.argument('run', type=str)
+@click.option('-rp', '--report', type=str,
+              help="Report path given to create-multiple, reports of processes are concatenated in this file")
+@decorators.debug_options
+def claim_merge(logger, ctx, run, report, verbose, debug):
+    """
+    Merge inventories of processes of RUN in {folder}/certificate/inventory.sqlite
+    and their reports ([report].claim-[RUN].[host]-[pid]) in report, files of processes are kept
+    \f
+
+    :param logger:
+    :param ctx:
+    :param run:
+    :param report:
+    :param verbose:
+    :param debug:
+    :return:
+    """
+    from certificate import Certificate
+    tools.set_options(ctx=ctx, verbose=verbose, debug=debug)
+    cert = Certificate(logger, opts=tools.opts)
+    processes, rows, records = cert.merge_claims(run, report=report)
+    click.echo("{n} inventories merged ({r} rows) in {p}".format(n=processes, r=rows, p=cert.inventory_path))
+    if report:
+        click.echo("{n} records merged in {p}".format(n=records, p=report))
 
 
 """
@@ -252,6 +817,7 @@ def edit(cert_folder, csv_file, yaml):
     :return:
     """
     edit_config(cert_folder, csv_file, yaml)
+    reset_context()
 
 
 @config.command()
@@ -0,0 +1,94 @@
+import os
+import threading
+from tools import Tools
+
+_context = None
+_lock = threading.Lock()
+
+
+def get_context():
+    """
+    Return application context shared by cli, decorators and Certificate, built on first call
+    :return:
+    """
+    global _context
+    if _context is None:
+        with _lock:
+            if _context is None:
+                _context = AppContext()
+    return _context
+
+
+def reset_context():
+    """
+    Forget shared context, next call of get_context() reads config.ini again
+    :return:
+    """
+    global _context
+    with _lock:
+        _context = None
+
+
+class AppContext:
+    def __init__(self):
+        """
+        config.ini, app info, app folders and logger loaded once per process
+        """
+        self.tools = Tools()
+        self.config = self.tools.config
+        self._logger = None
+        self._folders = None
+        self._lock = threading.Lock()
+
+    @property
+    def about(self):
+        return self.tools.get_app_info()
+
+    @property
+    def logger(self):
+        """
+        Return logger, log folder and handler are created on first call
+        :return:
+        """
+        with self._lock:
+            if self._logger is None:
+                self._logger = self.tools.get_logger()
+        return self._logger
+
+    def new_tools(self):
+        """
+        Return Tools using shared config, opts are not shared
+        :return:
+        """
+        return Tools(config=self.config)
+
+    def folders(self):
+        """
+        Return config, app, certificate, csv, csr and p12 folders, created on first call
+        :return:
+        """
+        with self._lock:
+            if self._folders is None:
+                app_folder = self.tools.app_folder
+                certificate_folder = os.path.join(app_folder, "certificate")
+                folders = [
+                    ("config", os.path.join(self.tools.here, "config")),
+                    ("app", app_folder),
+                    ("certificate", certificate_folder),
+                    ("csv", os.path.join(app_folder, "csv")),
+                    ("csr", os.path.join(certificate_folder, "csr")),
+                    ("p12", os.path.join(certificate_folder, "p12")),
+                ]
+                for _, path in folders:
+                    if not os.path.exists(path):
+                        os.mkdir(path)
+                self._folders = dict(folders)
+        return self._folders
+
+
+class LazyTools(object):
+    """
+    Tools of shared context, config.ini is not read by "cert --help"
+    """
+    def __getattr__(self, item):
+        return getattr(get_context().tools, item)
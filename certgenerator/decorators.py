@@ -2,7 +2,7 @@ import click
 import functools
 import os
 from functools import update_wrapper
-from tools import Tools
+from context import get_context
 import callbacks
 
 
@@ -17,10 +17,16 @@ def global_options(argument="csr"):
             click.option('-f', '--force', is_flag=True, help="Overwrite existing file"),
             click.option('-ks', '--key-size', type=click.Choice(['1024', '2048', '4096']),
                          help="Define key size", show_choices=True),
+            click.option('-kt', '--key-type', type=click.Choice(['rsa', 'ec', 'ed25519']),
+                         help="Define key type (default: rsa)", show_choices=True),
+            click.option('-cu', '--curve', type=click.Choice(['P-256', 'P-384', 'P-521']),
+                         help="Define curve of ec key (default: P-256)", show_choices=True),
             click.option('-sa', '--san', multiple=True, type=str,
                          help="Add Subject Alt Name (ex: --san test.com --san test1.com ...)"),
             click.option('-s', '--subject', is_flag=True, expose_value=False,
-                         callback=callbacks.get_subject, help="define subject")
+                         callback=callbacks.get_subject, help="define subject"),
+            click.option('-kp', '--keypool', is_flag=True,
+                         help="Take keys from key pool, generate them if the pool is empty")
         ]
         if argument in _type:
             if argument is "csr":
@@ -45,14 +51,25 @@ def debug_options(f):
     return functools.reduce(lambda x, opt: opt(x), options, f)
 
 
+def profile_options(f):
+    """Define profile options
+    """
+    options = [
+        click.option('--profile', is_flag=True, help="Display time spent in each stage"),
+        click.option('--profile-output', type=str, help="Write cProfile stats in file (.pstats)")
+    ]
+    return functools.reduce(lambda x, opt: opt(x), options, f)
+
+
 def folder_options(f):
     """Define certificate folder options and csv file
     """
     options = [
         click.option("-cert", "--cert-folder",
+                     cls=LazyHelpOption,
                      type=str,
-                     help="Define path to save generated csr and p12, default is {p}"
-                     .format(p=os.path.join(Tools().app_folder, "certificate"))),
+                     help_func=lambda: "Define path to save generated csr and p12, default is {p}"
+                     .format(p=os.path.join(get_context().tools.app_folder, "certificate"))),
         click.option("-y", "--yaml",
                      is_flag=True,
                      help="Copy and edit Yaml file in generated path")
@@ -71,15 +88,49 @@ def csv_options(f):
     return functools.reduce(lambda x, opt: opt(x), options, f)
 
 
+def bulk_options(f):
+    """Define options of commands using csv file
+    """
+    options = [
+        click.option('-a', '--archive', type=str,
+                     help="Write all generated files and a manifest in a single archive (.tar, .tar.gz, .tgz or .zip)"
+                          " or in a PEM bundle with an index (.pem)"),
+        click.option('-r', '--resume', is_flag=True,
+                     help="Skip serials already done by previous run of the same csv file"),
+        click.option('-rp', '--report', type=str,
+                     help="Write one json record per serial in file as soon as it is done (- for stdout)"),
+        click.option('-sh', '--shard', type=str, callback=callbacks.get_shard, metavar="I/N",
+                     help="Process only serials of shard I of N (stable hash of serial), journal, report, archive"
+                          " and inventory of each shard are written in their own file"),
+    ]
+
+    return functools.reduce(lambda x, opt: opt(x), options, f)
+
+
 def pass_logger(func):
     """Marks a callback as wanting to receive the logger
     object as first argument
     """
     def wrapper(*args, **kwargs):
-        return func(Tools().get_logger(), *args, **kwargs)
+        return func(get_context().logger, *args, **kwargs)
     return update_wrapper(wrapper, func)
 
 
+class LazyHelpOption(click.Option):
+    def __init__(self, *args, **kwargs):
+        """
+        Option with a help built by a function only when help is displayed
+        :param args:
+        :param kwargs: help_func is a function returning help text
+        """
+        self.help_func = kwargs.pop("help_func")
+        super(LazyHelpOption, self).__init__(*args, **kwargs)
+
+    def get_help_record(self, ctx):
+        self.help = self.help_func()
+        return super(LazyHelpOption, self).get_help_record(ctx)
+
+
 class RemoveOption(object):
     def __init__(self, config, option):
         self.option = option
@@ -0,0 +1,77 @@
+import os
+
+MISSING = None
+
+
+class FolderIndex:
+    def __init__(self, roots):
+        """
+        In memory index of folders used by a bulk command, each folder is listed
+        at most once and existence checks are answered without stat
+        :param roots: indexed folders, listed immediately
+        """
+        self.roots = [os.path.abspath(root) for root in roots if root]
+        self.entries = {}
+        for root in self.roots:
+            self.names(root)
+
+    def covers(self, path):
+        """
+        Return True if path is in an indexed folder
+        :param path: absolute path
+        :return:
+        """
+        for root in self.roots:
+            if path == root or path.startswith(root + os.sep):
+                return True
+        return False
+
+    def names(self, folder):
+        """
+        Return names in folder, MISSING if folder doesn't exist
+        :param folder: absolute path
+        :return:
+        """
+        if folder not in self.entries:
+            if folder not in self.roots and not self.exists(folder):
+                self.entries[folder] = MISSING
+            else:
+                try:
+                    self.entries[folder] = set(os.listdir(folder))
+                except OSError:
+                    self.entries[folder] = MISSING
+        return self.entries[folder]
+
+    def exists(self, path):
+        """
+        Check if path exists
+        :param path: absolute path covered by index
+        :return:
+        """
+        if path in self.roots:
+            return self.names(path) is not MISSING
+        parent, name = os.path.split(path)
+        names = self.names(parent)
+        return names is not MISSING and name in names
+
+    def add(self, path, folder=False):
+        """
+        Add created file or folder to index
+        :param path: absolute path
+        :param folder: True if path is a new empty folder
+        :return:
+        """
+        if not self.covers(path):
+            return
+        if folder and self.entries.get(path) is MISSING:
+            self.entries[path] = set()
+        if path in self.roots:
+            return
+        parent, name = os.path.split(path)
+        if parent not in self.entries:
+            # parent not listed yet, it will be listed from disk
+            return
+        if self.entries[parent] is MISSING:
+            self.entries[parent] = set()
+            self.add(parent)
+        self.entries[parent].add(name)
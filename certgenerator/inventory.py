@@ -0,0 +1,227 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from OpenSSL import crypto
+from reader import KEY_TYPES, load_data
+
+COLUMNS = ["path", "serial", "type", "key_type", "key_size", "fingerprint", "subject_hash", "subject", "created",
+           "updated"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifact (
+    path TEXT PRIMARY KEY,
+    serial TEXT NOT NULL,
+    type TEXT NOT NULL,
+    key_type TEXT,
+    key_size INTEGER,
+    fingerprint TEXT,
+    subject_hash TEXT,
+    subject TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifact_serial ON artifact (serial, type);
+CREATE INDEX IF NOT EXISTS artifact_type ON artifact (type, key_type, key_size);
+CREATE INDEX IF NOT EXISTS artifact_fingerprint ON artifact (fingerprint);
+"""
+
+# created is kept when a file is written again
+UPSERT = """
+INSERT OR REPLACE INTO artifact ({c})
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, COALESCE((SELECT created FROM artifact WHERE path = ?), ?), ?)
+""".format(c=", ".join(COLUMNS))
+
+# rows of an attached inventory (shard) are added or replace older rows of the same path
+MERGE = """
+INSERT OR REPLACE INTO main.artifact ({c})
+SELECT {s}, COALESCE((SELECT m.created FROM main.artifact m WHERE m.path = s.path), s.created), s.updated
+FROM shard.artifact s
+WHERE NOT EXISTS (SELECT 1 FROM main.artifact m WHERE m.path = s.path AND m.updated >= s.updated)
+""".format(c=", ".join(COLUMNS), s=", ".join("s." + c for c in COLUMNS[:8]))
+
+
+def describe(serial, kind, path, key=None, subject=None, created=None):
+    """
+    Return inventory row of a file
+    :param serial:
+    :param kind: csr, key, pem or p12
+    :param path: absolute path
+    :param key: public or private key (PKey)
+    :param subject: X509Name
+    :param created: default is now
+    :return:
+    """
+    now = time.time()
+    row = OrderedDict([("path", path), ("serial", serial), ("type", kind), ("key_type", None), ("key_size", None),
+                       ("fingerprint", None), ("subject_hash", None), ("subject", None),
+                       ("created", created or now), ("updated", now)])
+    if key is not None:
+        row["key_type"] = KEY_TYPES.get(key.type(), str(key.type()))
+        row["key_size"] = key.bits()
+        row["fingerprint"] = hashlib.sha256(crypto.dump_publickey(crypto.FILETYPE_ASN1, key)).hexdigest()
+    if subject is not None:
+        row["subject_hash"] = "{h:08x}".format(h=subject.hash())
+        row["subject"] = "".join("/{k}={v}".format(k=k, v=v) for k, v in subject.get_components())
+    return row
+
+
+def inventory_job(job):
+    """
+    Worker: read file and return its inventory row, key fields are None if file can't be read
+    :param job: dict with path and password (p12)
+    :return: (row, error)
+    """
+    path = job["path"]
+    serial, ext = os.path.splitext(os.path.basename(path))
+    kind = ext[1:]
+    created = os.path.getmtime(path)
+    try:
+        with open(path, "rb") as f:
+            parsed = load_data(kind, f.read(), job.get("password"))
+        subject = parsed.subject_of.get_subject() if parsed.subject_of is not None else None
+        return describe(serial, kind, path, parsed.key, subject, created=created), None
+    except (IOError, crypto.Error) as e:
+        return describe(serial, kind, path, created=created), str(e) or e.__class__.__name__
+
+
+def inventory_batch(jobs):
+    """
+    Worker: inventory rows of several files
+    :param jobs:
+    :return:
+    """
+    return [inventory_job(job) for job in jobs]
+
+
+class Inventory:
+    def __init__(self, path, batch=500, wal=True):
+        """
+        SQLite inventory of generated files, rows are committed by batch and when inventory is closed
+        :param path:
+        :param batch: number of rows written before commit
+        :param wal: False for an inventory on a shared folder (WAL needs shared memory of one host)
+        """
+        self.path = path
+        self.batch = batch
+        self.pending = 0
+        self.lock = threading.Lock()
+        # written by writer thread of pipeline, lock serializes access
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode={m}".format(m="WAL" if wal else "DELETE"))
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def add(self, serial, kind, path, key=None, subject=None):
+        """
+        Record generated file
+        :param serial:
+        :param kind: csr, key, pem or p12
+        :param path:
+        :param key: public or private key (PKey)
+        :param subject: X509Name
+        :return:
+        """
+        self.add_row(describe(serial, kind, os.path.abspath(path), key, subject))
+
+    def add_row(self, row):
+        values = list(row.values())
+        with self.lock:
+            self.db.execute(UPSERT, values[:8] + [row["path"], row["created"], row["updated"]])
+            self.pending += 1
+            if self.pending >= self.batch:
+                self.db.commit()
+                self.pending = 0
+
+    def merge(self, path):
+        """
+        Add rows of another inventory
+        :param path:
+        :return: number of rows added or replaced
+        """
+        with self.lock:
+            self.db.commit()
+            self.pending = 0
+            self.db.execute("ATTACH DATABASE ? AS shard", (path,))
+            try:
+                count = self.db.execute(MERGE).rowcount
+                self.db.commit()
+            finally:
+                self.db.execute("DETACH DATABASE shard")
+        return count
+
+    def paths(self, folders):
+        """
+        Return recorded paths in folders
+        :param folders:
+        :return:
+        """
+        paths = set()
+        for folder in folders:
+            prefix = os.path.join(os.path.abspath(folder), "")
+            paths.update(path for (path,) in self.db.execute(
+                "SELECT path FROM artifact WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)))
+        return paths
+
+    def remove(self, paths):
+        with self.lock:
+            self.db.executemany("DELETE FROM artifact WHERE path = ?", [(path,) for path in paths])
+
+    def query(self, serial=None, kind=None, key_type=None, key_size=None, missing=None):
+        """
+        Return rows matching all given filters
+        :param serial:
+        :param kind: csr, key, pem or p12
+        :param key_type: RSA, EC, ED25519
+        :param key_size:
+        :param missing: only serials without file of this type (ex: csr without p12)
+        :return: iterator over rows
+        """
+        where, args = [], []
+        for column, value in (("serial", serial), ("type", kind), ("key_type", key_type), ("key_size", key_size)):
+            if value is not None:
+                where.append("a.{c} = ?".format(c=column))
+                args.append(value)
+        if missing:
+            where.append("NOT EXISTS (SELECT 1 FROM artifact b WHERE b.serial = a.serial AND b.type = ?)")
+            args.append(missing)
+        sql = "SELECT {c} FROM artifact a".format(c=", ".join("a." + c for c in COLUMNS))
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY a.serial, a.type"
+        for values in self.db.execute(sql, args):
+            yield OrderedDict(zip(COLUMNS, values))
+
+    def stats(self):
+        """
+        Return number of files by type, key type and key size
+        :return:
+        """
+        result = OrderedDict([("serials", self.db.execute("SELECT COUNT(DISTINCT serial) FROM artifact").fetchone()[0]),
+                              ("files", OrderedDict())])
+        for kind, count in self.db.execute("SELECT type, COUNT(*) FROM artifact GROUP BY type ORDER BY type"):
+            result["files"][kind] = count
+        result["keys"] = [OrderedDict([("key_type", key_type), ("key_size", key_size), ("count", count)])
+                          for key_type, key_size, count in self.db.execute(
+                "SELECT key_type, key_size, COUNT(*) FROM artifact WHERE type = 'key' "
+                "GROUP BY key_type, key_size ORDER BY key_type, key_size")]
+        return result
+
+    def close(self):
+        """
+        Commit pending rows and close database, database is closed even if commit fails
+        :return:
+        """
+        with self.lock:
+            try:
+                self.db.commit()
+            finally:
+                self.db.close()
@@ -0,0 +1,67 @@
+import json
+import os
+import time
+
+
+class Journal:
+    def __init__(self, path, resume=False):
+        """
+        Append only journal of serials done by a bulk command, one json record per line
+        :param path:
+        :param resume: load serials already done, otherwise start a new journal
+        """
+        self.path = path
+        self.done = set()
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+        if resume and os.path.exists(path):
+            self.load()
+        else:
+            flags |= os.O_TRUNC
+        self.fd = os.open(path, flags, 0644)
+
+    def load(self):
+        """
+        Load serials of journal, a record interrupted by a crash is removed
+        :return:
+        """
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                offset += len(line)
+                try:
+                    self.done.add(json.loads(line)["serial"])
+                except (ValueError, KeyError):
+                    continue
+        if offset != os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+
+    def __contains__(self, serial):
+        return serial in self.done
+
+    def add(self, serial, paths, status="generated"):
+        """
+        Record serial as done, record is on disk when function returns
+        :param serial:
+        :param paths: files produced for serial
+        :param status: generated or exists
+        :return:
+        """
+        self.add_batch([(serial, paths, status)])
+
+    def add_batch(self, rows):
+        """
+        Record serials as done with one write and one fsync, records are on disk when function returns
+        :param rows: list of (serial, paths, status)
+        :return:
+        """
+        now = int(time.time())
+        os.write(self.fd, "".join(json.dumps({"serial": serial, "status": status, "paths": paths, "time": now}) + "\n"
+                                  for serial, paths, status in rows))
+        os.fsync(self.fd)
+        self.done.update(serial for serial, _, _ in rows)
+
+    def close(self):
+        os.close(self.fd)
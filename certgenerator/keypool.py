@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+import uuid
+from itertools import repeat
+from OpenSSL import crypto
+from tools import Tools
+from workers import WorkerPool, generate_key_pem
+
+
+class KeyPool:
+    def __init__(self, folder):
+        """
+        Spool of pre-generated private keys, one folder per key size
+        :param folder:
+        """
+        self.folder = folder
+        self.hits = 0
+        self.misses = 0
+        self._available = {}
+        self.makedir(self.folder)
+
+    @staticmethod
+    def makedir(path):
+        """
+        Create directory only readable by owner
+        :param path:
+        :return:
+        """
+        if not os.path.exists(path):
+            os.mkdir(path)
+        os.chmod(path, 0700)
+
+    def get_folder(self, size):
+        """
+        Return spool folder of key size and create it if not exist
+        :param size:
+        :return:
+        """
+        path = os.path.join(self.folder, str(size))
+        if not os.path.exists(path):
+            self.makedir(path)
+        return path
+
+    def list_keys(self, size):
+        """
+        Return key files ready to be used
+        :param size:
+        :return:
+        """
+        return [k for k in os.listdir(self.get_folder(size)) if k.endswith(".key")]
+
+    def count(self, size):
+        """
+        Return number of available keys
+        :param size:
+        :return:
+        """
+        return len(self.list_keys(size))
+
+    def put(self, size, pem):
+        """
+        Write key in spool, the key is visible only when fully written
+        :param size:
+        :param pem:
+        :return:
+        """
+        name = "{t}_{u}.key".format(t=int(time.time()), u=uuid.uuid4().hex)
+        Tools.write_atomic(os.path.join(self.get_folder(size), name), pem, mode=0600, sync=True)
+
+    def take_pem(self, size):
+        """
+        Claim and remove a key from spool
+        :param size:
+        :return: pem or None if the spool is empty
+        """
+        folder = self.get_folder(size)
+        refreshed = False
+        while True:
+            if not self._available.get(size):
+                if refreshed:
+                    break
+                self._available[size] = self.list_keys(size)
+                refreshed = True
+                continue
+            path = os.path.join(folder, self._available[size].pop())
+            claimed = "{p}.{pid}".format(p=path, pid=os.getpid())
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                # already taken by another process
+                continue
+            with open(claimed) as f:
+                pem = f.read()
+            os.remove(claimed)
+            self.hits += 1
+            return pem
+        self.misses += 1
+        return None
+
+    def take(self, size):
+        """
+        Return a PKey from spool
+        :param size:
+        :return: key or None if the spool is empty
+        """
+        pem = self.take_pem(size)
+        if pem:
+            return crypto.load_privatekey(crypto.FILETYPE_PEM, pem)
+        return None
+
+    def fill(self, size, count, jobs=1):
+        """
+        Generate keys and add them to spool
+        :param size:
+        :param count:
+        :param jobs: number of worker processes
+        :return: number of keys added
+        """
+        if count <= 0:
+            return 0
+        if jobs > 1:
+            with WorkerPool(jobs) as pool:
+                for pem in pool.imap(generate_key_pem, repeat(size, count)):
+                    self.put(size, pem)
+        else:
+            for _ in xrange(count):
+                self.put(size, generate_key_pem(size))
+        return count
+
+    def top_up(self, size, count, jobs=1):
+        """
+        Fill spool until count keys are available
+        :param size:
+        :param count:
+        :param jobs:
+        :return: number of keys added
+        """
+        return self.fill(size, count - self.count(size), jobs=jobs)
+
+    def sizes(self):
+        """
+        Return available keys for each key size
+        :return:
+        """
+        return dict((int(s), self.count(s)) for s in sorted(os.listdir(self.folder)) if s.isdigit())
+
+    def stats(self):
+        """
+        Return hit and miss counters
+        :return:
+        """
+        return {"hit": self.hits, "miss": self.misses}
+
+
+class KeyPoolFiller(threading.Thread):
+    def __init__(self, pool, size, count, interval=5, jobs=1):
+        """
+        Background thread keeping count keys available in pool
+        :param pool:
+        :param size:
+        :param count:
+        :param interval: seconds between two checks
+        :param jobs: number of worker processes
+        """
+        threading.Thread.__init__(self, name="keypool-filler")
+        self.daemon = True
+        self.pool = pool
+        self.size = size
+        self.count = count
+        self.interval = interval
+        self.jobs = jobs
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.pool.top_up(self.size, self.count, jobs=self.jobs)
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
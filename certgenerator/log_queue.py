@@ -0,0 +1,91 @@
+import atexit
+import logging
+import threading
+import Queue
+
+_stop = object()
+
+
+class QueueHandler(logging.Handler):
+    def __init__(self, queue, log_file=None):
+        """
+        Put records in a queue, handler of QueueListener writes them in background
+        (logging.handlers.QueueHandler of python 3)
+        :param queue:
+        :param log_file: path written by listener, used to add a single handler per log file
+        """
+        logging.Handler.__init__(self)
+        self.queue = queue
+        self.log_file = log_file
+
+    def prepare(self, record):
+        """
+        Merge args in message, record is sent to another thread
+        :param record:
+        :return:
+        """
+        msg = self.format(record)
+        record.msg = msg
+        record.message = msg
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+
+class QueueListener:
+    def __init__(self, queue, handler):
+        """
+        Write records of queue with handler in a background thread
+        (logging.handlers.QueueListener of python 3)
+        :param queue:
+        :param handler:
+        """
+        self.queue = queue
+        self.handler = handler
+        self._thread = None
+
+    def start(self):
+        """
+        Start thread, records left in queue are written at exit
+        :return:
+        """
+        self._thread = threading.Thread(target=self.monitor, name="certgen-log")
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def monitor(self):
+        while True:
+            record = self.queue.get()
+            if record is _stop:
+                break
+            self.handler.handle(record)
+
+    def stop(self):
+        """
+        Write records left in queue and stop thread
+        :return:
+        """
+        if self._thread:
+            self.queue.put(_stop)
+            self._thread.join()
+            self._thread = None
+            self.handler.close()
+
+
+def queue_handler(handler, log_file=None):
+    """
+    Return QueueHandler writing records with handler in a started QueueListener
+    :param handler:
+    :param log_file:
+    :return:
+    """
+    queue = Queue.Queue(-1)
+    QueueListener(queue, handler).start()
+    return QueueHandler(queue, log_file=log_file)
@@ -0,0 +1,248 @@
+import logging
+import os
+import sys
+import threading
+import Queue
+from collections import Counter, deque
+from timeit import default_timer
+from workers import WorkerPool, sign_job
+
+_end = object()
+
+
+class Pipeline:
+    def __init__(self, cert, jobs=1, queue_size=64, force=False):
+        """
+        Generate csr of csv rows in 4 stages running in their own thread:
+        reader (csv rows to jobs), signer (keygen and sign, in worker processes if jobs > 1),
+        writer (key and csr files, journal) and reporter (report and console).
+        Stages are connected by bounded queues, a stage waits when the next one is late
+        so memory doesn't grow with the size of the csv file
+        :param cert: Certificate, its journal, folder index, archive and report are used
+        :param jobs: number of worker processes, keygen and sign run in signer thread if 1
+        :param queue_size: max items waiting between two stages
+        :param force: overwrite existing files
+        """
+        self.cert = cert
+        self.jobs = jobs
+        self.force = force
+        self.jobs_queue = Queue.Queue(queue_size)
+        self.write_queue = Queue.Queue(queue_size)
+        self.report_queue = Queue.Queue(queue_size)
+        self.count = Counter()
+        self.stopped = threading.Event()
+        self.errors = []
+        self.threads = []
+        self._ended = set()
+
+    def start(self, names, base_subject):
+        """
+        Start stages and return immediately, use join() to wait for the end
+        :param names: serials (iterator of csv rows)
+        :param base_subject: subject of csr, CN is the serial if not defined
+        :return: self
+        """
+        self.threads = [
+            self.stage("reader", self.read, None, self.jobs_queue, names, base_subject),
+            self.stage("signer", self.sign, self.jobs_queue, self.write_queue),
+            self.stage("writer", self.write, self.write_queue, self.report_queue),
+            self.stage("reporter", self.reporter, self.report_queue, None),
+        ]
+        return self
+
+    def done(self):
+        """
+        Return True when all stages are finished
+        :return:
+        """
+        return not any(thread.is_alive() for thread in self.threads)
+
+    def join(self, timeout=None):
+        """
+        Wait for the end of stages, error of a stage is raised again here
+        :param timeout: seconds, None to wait for the end
+        :return: count of rows by status (generated, exists, journal), None if timeout expired
+        """
+        end = None if timeout is None else default_timer() + timeout
+        for thread in self.threads:
+            # join with timeout to keep Ctrl+C working
+            while thread.is_alive():
+                if end is not None and default_timer() >= end:
+                    return None
+                thread.join(0.5 if end is None else min(0.5, max(end - default_timer(), 0)))
+        if self.errors:
+            exc_type, exc, tb = self.errors[0]
+            raise exc_type, exc, tb
+        return self.count
+
+    def run(self, names, base_subject):
+        """
+        Start stages and wait for the end
+        :param names:
+        :param base_subject:
+        :return: count of rows by status
+        """
+        return self.start(names, base_subject).join()
+
+    def stage(self, name, func, inbox, outbox, *args):
+        """
+        Start thread running func(items of inbox, *args), end of stream is sent to outbox when func returns.
+        If func fails, all stages stop and inbox is read until its end so previous stage is never blocked
+        :param name:
+        :param func:
+        :param inbox: queue read by stage, None for first stage
+        :param outbox: queue written by stage, None for last stage
+        :param args:
+        :return: thread
+        """
+        def target():
+            try:
+                if inbox is None:
+                    func(*args)
+                else:
+                    func(self.consume(inbox), *args)
+            except BaseException:
+                self.errors.append(sys.exc_info())
+                self.stopped.set()
+                if inbox is not None and inbox not in self._ended:
+                    for _ in self.consume(inbox):
+                        pass
+            finally:
+                if outbox is not None:
+                    outbox.put(_end)
+
+        thread = threading.Thread(target=target, name="certgen-{n}".format(n=name))
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def consume(self, queue):
+        """
+        Yield items of queue until end of stream, items are dropped when pipeline is stopped
+        :param queue:
+        :return:
+        """
+        while True:
+            item = queue.get()
+            if item is _end:
+                self._ended.add(queue)
+                return
+            if not self.stopped.is_set():
+                yield item
+
+    def read(self, names, base_subject):
+        """
+        Reader: send a job for each serial to generate, skipped serials go to writer
+        :param names:
+        :param base_subject:
+        :return:
+        """
+        cert = self.cert
+        for name in names:
+            if self.stopped.is_set():
+                return
+            csr_file = os.path.join(cert.csr_folder, name, name + ".csr")
+            key_file = os.path.join(cert.csr_folder, name, name + ".key")
+            if cert.journal and name in cert.journal:
+                job = {"name": name, "skip": "journal", "paths": []}
+            elif not cert.must_overwrite(name, self.force) and not cert.archive and cert.exists(csr_file) \
+                    and cert.exists(key_file):
+                job = {"name": name, "skip": "exists", "paths": [key_file, csr_file]}
+            else:
+                job = cert.new_job(name, base_subject)
+            job["durations"] = self.take_row()
+            self.jobs_queue.put(job)
+
+    def sign(self, jobs):
+        """
+        Signer: generate key and csr of jobs, in this thread or in worker processes
+        :param jobs:
+        :return:
+        """
+        if self.jobs <= 1:
+            for job in jobs:
+                self.write_queue.put(self.signed(job, None if "skip" in job else sign_job(job)))
+            return
+
+        pending = deque()
+
+        def to_sign():
+            for job in jobs:
+                if "skip" in job:
+                    self.write_queue.put(self.signed(job, None))
+                else:
+                    pending.append(job)
+                    yield job
+
+        with WorkerPool(self.jobs) as pool:
+            for result in pool.imap(sign_job, to_sign()):
+                self.write_queue.put(self.signed(pending.popleft(), result))
+
+    def signed(self, job, result):
+        """
+        Return item sent to writer, keygen and sign durations of worker are added to profiler
+        :param job:
+        :param result: result of sign_job, None if serial is skipped
+        :return:
+        """
+        item = {"name": job["name"], "skip": job.get("skip"), "paths": job.get("paths", []),
+                "durations": job["durations"]}
+        if result:
+            item["req"], item["key"], durations = result[1:]
+            for stage, duration in durations.items():
+                if self.cert.profiler:
+                    self.cert.profiler.add(stage, duration)
+                item["durations"][stage] = item["durations"].get(stage, 0.0) + duration
+        return item
+
+    def take_row(self, durations=None):
+        """
+        Add durations timed by profiler in current stage since last row
+        :param durations:
+        :return:
+        """
+        durations = durations if durations is not None else {}
+        if self.cert.profiler:
+            for stage, duration in self.cert.profiler.take_row().items():
+                durations[stage] = durations.get(stage, 0.0) + duration
+        return durations
+
+    def write(self, items):
+        """
+        Writer: write key and csr files and record serial in journal
+        :param items:
+        :return:
+        """
+        cert = self.cert
+        for item in items:
+            if not item["skip"]:
+                cert.create_request(name=item["name"])
+                cert.generate_file(cert.key_file, item["key"])
+                cert.generate_file(cert.csr_file, item["req"])
+                cert.inventory_csr(item["name"], item["req"], cert.key_file, cert.csr_file)
+                item["paths"] = [cert.key_file, cert.csr_file]
+            cert.journal_row(item["name"], item["paths"], status=item["skip"] or "generated")
+            self.take_row(item["durations"])
+            self.report_queue.put(item)
+
+    def reporter(self, items):
+        """
+        Reporter: write report and display result of each serial
+        :param items:
+        :return:
+        """
+        cert = self.cert
+        key_size = cert.key_bits()
+        folder = cert.destination(cert.csr_folder)
+        for item in items:
+            name, status = item["name"], item["skip"] or "generated"
+            cert.report_row(name, item["paths"], status=status, key_size=key_size if status != "journal" else None,
+                            durations=item["durations"])
+            self.count[status] += 1
+            if status == "generated":
+                cert.output("=========== {n} generated ============", level=logging.DEBUG, n=name)
+                cert.echo("{n} generated in {p}\n".format(n=name, p=folder))
+            elif status == "exists":
+                cert.output("{n} already exists => abort", n=name)
+            else:
+                cert.output("{n} already done => skip", level=logging.DEBUG, n=name)
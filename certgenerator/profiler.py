@@ -0,0 +1,169 @@
+import cProfile
+import random
+import threading
+from collections import OrderedDict
+from functools import update_wrapper
+from timeit import default_timer
+from bench import percentile
+
+
+class Stage:
+    samples = 10000
+
+    def __init__(self):
+        """
+        Count and total duration of a stage, p95 is computed on a sample of durations
+        """
+        self.count = 0
+        self.total = 0.0
+        self.durations = []
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        if len(self.durations) < self.samples:
+            self.durations.append(duration)
+        else:
+            i = random.randrange(self.count)
+            if i < self.samples:
+                self.durations[i] = duration
+
+
+class Profiler:
+    def __init__(self, pstats=None):
+        """
+        Time stages of instrumented objects, nothing is wrapped if profiler is not created,
+        running stages and current row are kept per thread (stages of pipeline run in threads)
+        :param pstats: dump cProfile stats in this file
+        """
+        self.stages = OrderedDict()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.pstats = pstats
+        self.cprofile = None
+        if pstats:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    @property
+    def running(self):
+        if not hasattr(self.local, "running"):
+            self.local.running = []
+        return self.local.running
+
+    @property
+    def row(self):
+        if not hasattr(self.local, "row"):
+            self.local.row = OrderedDict()
+        return self.local.row
+
+    @row.setter
+    def row(self, value):
+        self.local.row = value
+
+    @property
+    def row_start(self):
+        if not hasattr(self.local, "row_start"):
+            self.local.row_start = default_timer()
+        return self.local.row_start
+
+    @row_start.setter
+    def row_start(self, value):
+        self.local.row_start = value
+
+    def wrap(self, name, func):
+        """
+        Return func timed in stage name
+        :param name:
+        :param func:
+        :return:
+        """
+        with self.lock:
+            self.stages.setdefault(name, Stage())
+
+        def wrapper(*args, **kwargs):
+            start = default_timer()
+            self.running.append((name, start))
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.running.pop()
+                end = default_timer()
+                self.add(name, end - start, row_duration=end - max(start, self.row_start))
+        return update_wrapper(wrapper, func)
+
+    def add(self, name, duration, row_duration=None):
+        """
+        Add duration to stage and to current row
+        :param name:
+        :param duration: seconds
+        :param row_duration: part of duration after start of current row, default is duration
+        :return:
+        """
+        with self.lock:
+            self.stages.setdefault(name, Stage()).add(duration)
+        self.row[name] = self.row.get(name, 0.0) + (duration if row_duration is None else row_duration)
+
+    def take_row(self):
+        """
+        Return durations of stages since last call,
+        stages still running count until now and the rest goes to next row
+        :return:
+        """
+        now = default_timer()
+        row, self.row = self.row, OrderedDict()
+        for name, start in self.running:
+            row[name] = row.get(name, 0.0) + now - max(start, self.row_start)
+        self.row_start = now
+        return row
+
+    def instrument(self, obj, stages):
+        """
+        Replace methods of obj by timed methods
+        :param obj:
+        :param stages: list of (stage name, list of method names)
+        :return:
+        """
+        for name, methods in stages:
+            for method in methods:
+                setattr(obj, method, self.wrap(name, getattr(obj, method)))
+
+    def stop(self):
+        """
+        Stop cProfile and write pstats file
+        :return:
+        """
+        if self.cprofile:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.pstats)
+            self.cprofile = None
+
+    def summary(self):
+        """
+        Return statistics of each called stage
+        :return:
+        """
+        results = []
+        for name, stage in self.stages.items():
+            if not stage.count:
+                continue
+            durations = sorted(stage.durations)
+            results.append(OrderedDict([
+                ("stage", name),
+                ("count", stage.count),
+                ("total", stage.total),
+                ("mean", stage.total / stage.count),
+                ("p95", percentile(durations, 95)),
+            ]))
+        return results
+
+    @staticmethod
+    def format(result):
+        """
+        Return one line of statistics
+        :param result:
+        :return:
+        """
+        return "{s:<10} {c:>8}  total {t:>10.3f} s  mean {m:>9.3f} ms  p95 {p:>9.3f} ms"\
+            .format(s=result["stage"], c=result["count"], t=result["total"], m=result["mean"] * 1000,
+                    p=result["p95"] * 1000)
@@ -0,0 +1,256 @@
+import glob
+import hashlib
+import os
+from collections import OrderedDict
+from OpenSSL import crypto
+from workers import TYPE_EC, TYPE_ED25519
+
+EXTENSIONS = (".csr", ".p12")
+
+KEY_TYPES = {
+    crypto.TYPE_RSA: "RSA",
+    crypto.TYPE_DSA: "DSA",
+    TYPE_EC: "EC",
+    TYPE_ED25519: "ED25519"
+}
+
+
+class Parsed:
+    def __init__(self, kind, subject_of, key, ca=None):
+        """
+        Objects read from a csr or p12 file
+        :param kind: csr or p12
+        :param subject_of: X509Req of csr or X509 certificate of p12 (None if p12 has no certificate)
+        :param key: public key of csr or private key of p12
+        :param ca: ca certificates of p12
+        """
+        self.kind = kind
+        self.subject_of = subject_of
+        self.key = key
+        self.ca = ca or []
+        self._der = None
+
+    def der(self):
+        """
+        Return csr or certificate in DER format, dumped once
+        :return:
+        """
+        if self._der is None:
+            if self.kind == "csr":
+                self._der = crypto.dump_certificate_request(crypto.FILETYPE_ASN1, self.subject_of)
+            else:
+                self._der = crypto.dump_certificate(crypto.FILETYPE_ASN1, self.subject_of)
+        return self._der
+
+
+def get_name(name):
+    """
+    Return X509Name as dict in order of components, a value containing "/" or "=" is kept as is
+    :param name:
+    :return:
+    """
+    return OrderedDict(name.get_components())
+
+
+def get_time(asn1):
+    """
+    Return ASN1 time (YYYYMMDDhhmmssZ) as ISO 8601
+    :param asn1:
+    :return:
+    """
+    if not asn1:
+        return None
+    return "{y}-{m}-{d}T{H}:{M}:{S}Z".format(y=asn1[0:4], m=asn1[4:6], d=asn1[6:8], H=asn1[8:10], M=asn1[10:12],
+                                              S=asn1[12:14])
+
+
+def get_serial(cert):
+    return "{s:X}".format(s=cert.get_serial_number())
+
+
+def get_validity(cert):
+    return OrderedDict([("not_before", get_time(cert.get_notBefore())), ("not_after", get_time(cert.get_notAfter()))])
+
+
+def get_certificate(cert):
+    """
+    Return fields of a ca certificate
+    :param cert: X509
+    :return:
+    """
+    return OrderedDict([
+        ("subject", get_name(cert.get_subject())),
+        ("issuer", get_name(cert.get_issuer())),
+        ("serial", get_serial(cert)),
+        ("validity", get_validity(cert)),
+        ("fingerprints", get_fingerprints(crypto.dump_certificate(crypto.FILETYPE_ASN1, cert))),
+    ])
+
+
+def get_fingerprints(der):
+    return OrderedDict([("sha1", hashlib.sha1(der).hexdigest()), ("sha256", hashlib.sha256(der).hexdigest())])
+
+
+def get_extensions(parsed):
+    if parsed.kind == "csr":
+        return [str(ext) for ext in parsed.subject_of.get_extensions()]
+    return [str(parsed.subject_of.get_extension(i)) for i in range(parsed.subject_of.get_extension_count())]
+
+
+def get_signature_algorithm(parsed):
+    if parsed.kind == "csr":
+        return parsed.subject_of.to_cryptography().signature_algorithm_oid._name
+    return parsed.subject_of.get_signature_algorithm()
+
+
+def certificate_field(func):
+    """
+    Return field calling func with certificate of p12, None for csr or p12 without certificate
+    :param func:
+    :return:
+    """
+    def field(parsed):
+        if parsed.kind == "csr" or parsed.subject_of is None:
+            return None
+        return func(parsed.subject_of)
+    return field
+
+
+FIELDS = OrderedDict([
+    ("subject", lambda parsed: get_name(parsed.subject_of.get_subject()) if parsed.subject_of else None),
+    ("issuer", certificate_field(lambda cert: get_name(cert.get_issuer()))),
+    ("serial", certificate_field(get_serial)),
+    ("validity", certificate_field(get_validity)),
+    ("signature_algorithm", lambda parsed: get_signature_algorithm(parsed) if parsed.subject_of else None),
+    ("key_type", lambda parsed: KEY_TYPES.get(parsed.key.type(), str(parsed.key.type())) if parsed.key else None),
+    ("key_size", lambda parsed: parsed.key.bits() if parsed.key else None),
+    ("extensions", lambda parsed: get_extensions(parsed) if parsed.subject_of else []),
+    ("fingerprints", lambda parsed: get_fingerprints(parsed.der()) if parsed.subject_of else None),
+    ("ca", lambda parsed: [get_certificate(ca) for ca in parsed.ca]),
+])
+
+
+def load_csr(data):
+    """
+    :param data: csr in PEM format
+    :return: Parsed
+    """
+    req = crypto.load_certificate_request(crypto.FILETYPE_PEM, data)
+    return Parsed("csr", req, req.get_pubkey())
+
+
+def load_p12(data, password=None):
+    """
+    :param data: p12 file content
+    :param password:
+    :return: Parsed
+    """
+    p12 = crypto.load_pkcs12(data, password)
+    return Parsed("p12", p12.get_certificate(), p12.get_privatekey(), ca=p12.get_ca_certificates())
+
+
+def load_certificate(data):
+    """
+    :param data: certificate in PEM format
+    :return: Parsed
+    """
+    cert = crypto.load_certificate(crypto.FILETYPE_PEM, data)
+    return Parsed("crt", cert, cert.get_pubkey())
+
+
+def load_key(data):
+    """
+    :param data: private key in PEM format
+    :return: Parsed
+    """
+    return Parsed("key", None, crypto.load_privatekey(crypto.FILETYPE_PEM, data))
+
+
+def load_data(kind, data, password=None):
+    """
+    Parse data of a file type
+    :param kind: csr, p12, crt, pem (certificate) or key
+    :param data:
+    :param password: Use only to read p12
+    :return: Parsed
+    """
+    if kind == "csr":
+        return load_csr(data)
+    if kind == "p12":
+        return load_p12(data, password)
+    if kind == "key":
+        return load_key(data)
+    return load_certificate(data)
+
+
+def load(path, password=None):
+    """
+    Read csr or p12 file
+    :param path:
+    :param password: Use only to read p12 file
+    :return: Parsed
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if path.endswith(".csr"):
+        return load_csr(data)
+    return load_p12(data, password)
+
+
+def extract(parsed, fields=None):
+    """
+    Return fields of csr or p12, same schema for both
+    :param parsed:
+    :param fields: extract only these fields, all if None
+    :return:
+    """
+    return OrderedDict((field, FIELDS[field](parsed)) for field in fields or FIELDS)
+
+
+def read_job(job):
+    """
+    Worker: read file and extract fields, errors are returned in record
+    :param job: dict with path, password and fields (all fields if empty)
+    :return: record
+    """
+    path = job["path"]
+    record = OrderedDict([("path", path), ("type", os.path.splitext(path)[1][1:])])
+    if not path.endswith(EXTENSIONS):
+        record["error"] = ".csr or .p12 expected"
+        return record
+    try:
+        record.update(extract(load(path, job.get("password")), job.get("fields")))
+    except Exception as e:
+        record["error"] = str(e) or e.__class__.__name__
+    return record
+
+
+def read_batch(jobs):
+    """
+    Worker: read several files, one round trip to the worker for a batch
+    :param jobs:
+    :return: records
+    """
+    return [read_job(job) for job in jobs]
+
+
+def expand_paths(paths):
+    """
+    Return an iterator over files, folders are walked and glob patterns expanded,
+    only .csr and .p12 files are returned from folders and patterns
+    :param paths:
+    :return:
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, folders, files in os.walk(path):
+                folders.sort()
+                for name in sorted(files):
+                    if name.endswith(EXTENSIONS):
+                        yield os.path.join(root, name)
+        elif glob.has_magic(path):
+            for match in glob.iglob(path):
+                if os.path.isfile(match) and match.endswith(EXTENSIONS):
+                    yield match
+        else:
+            yield path
@@ -0,0 +1,57 @@
+import json
+import sys
+import time
+from collections import Counter, OrderedDict
+
+
+class Report:
+    statuses = {
+        "generated": "generated",
+        "exists": "skipped",
+        "journal": "skipped",
+        "failed": "failed"
+    }
+
+    def __init__(self, path):
+        """
+        Write one json record per csv row as soon as the row is done (ndjson)
+        :param path: file path or "-" for stdout
+        """
+        self.path = path
+        self.stdout = path == "-"
+        self.file = sys.stdout if self.stdout else open(path, "w")
+        self.count = Counter()
+
+    def add(self, serial, status, paths, key_size=None, durations=None, error=None, archive=None):
+        """
+        Write record of serial and flush it
+        :param serial:
+        :param status: generated, exists, journal or failed
+        :param paths: generated files or files already existing
+        :param key_size:
+        :param durations: seconds spent in each stage for this row
+        :param error:
+        :param archive: archive containing paths
+        :return:
+        """
+        record = OrderedDict([
+            ("serial", serial),
+            ("status", self.statuses[status]),
+            ("paths", paths),
+            ("key_size", key_size),
+            ("durations", OrderedDict((k, round(v, 6)) for k, v in (durations or {}).items())),
+            ("time", round(time.time(), 3)),
+        ])
+        if record["status"] == "skipped":
+            record["reason"] = status
+        if error:
+            record["error"] = str(error)
+        if archive:
+            record["archive"] = archive
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        self.count[record["status"]] += 1
+
+    def close(self):
+        if not self.stdout:
+            self.file.close()
@@ -0,0 +1,404 @@
+import BaseHTTPServer
+import errno
+import hmac
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import SocketServer
+import threading
+import time
+from collections import Counter, OrderedDict
+from OpenSSL import crypto
+from workers import CURVES, KEY_TYPES, WorkerPool, sign_job
+
+KEY_SIZES = (1024, 2048, 4096)
+
+# max size of a request body
+MAX_BODY = 64 * 1024
+
+
+class RequestError(Exception):
+    def __init__(self, message, status=400):
+        """
+        Error returned to client
+        :param message:
+        :param status: http status
+        """
+        Exception.__init__(self, message)
+        self.status = status
+
+
+def text(value):
+    """
+    Return value of json request as str (utf-8)
+    :param value:
+    :return:
+    """
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    if not isinstance(value, str):
+        raise RequestError("{v} is not a string".format(v=json.dumps(value)))
+    return value
+
+
+def boolean(request, key, default=False):
+    """
+    Return value of json request that must be true or false
+    :param request:
+    :param key:
+    :param default: value if key is not in request
+    :return:
+    """
+    value = request.get(key, default)
+    if not isinstance(value, bool):
+        raise RequestError("{k} must be true or false".format(k=key))
+    return value
+
+
+def ignore_signals():
+    """
+    Worker initializer: Ctrl+C or SIGTERM sent to the process group only stops the server,
+    workers are stopped by the server when requests in progress are done
+    :return:
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+
+class Engine:
+    def __init__(self, cert, jobs=1, max_requests=8, timeout=60, force=False, token=None):
+        """
+        Warm csr generator of cert serve: options, subject and template of cert are loaded once
+        and keys are generated in worker processes started once
+        :param cert: Certificate, its subject and key settings are the defaults of requests
+        :param jobs: number of worker processes, keys are generated in request thread if 1
+        :param max_requests: requests generated at the same time, other requests are rejected (503).
+        A request timed out keeps its slot until a worker is done with its job
+        :param timeout: seconds to wait for a worker
+        :param force: default of "force" in requests
+        :param token: if defined, requests except GET /health must send "Authorization: Bearer [token]"
+        """
+        self.cert = cert
+        self.jobs = jobs
+        self.max_requests = max_requests
+        self.timeout = timeout
+        self.force = force
+        self.token = token
+        self.pool = None
+        self.slots = threading.BoundedSemaphore(max_requests)
+        # Certificate keeps paths of current serial and template reloaded if yaml file is modified,
+        # key pool isn't shared by threads
+        self.lock = threading.Lock()
+        self.metrics_lock = threading.Lock()
+        self.count = Counter()
+        self.durations = Counter()
+        self.in_flight = 0
+        # jobs of requests timed out, still queued or running in a worker
+        self.abandoned = 0
+        self.started = time.time()
+
+    def __enter__(self):
+        if self.jobs > 1:
+            self.pool = WorkerPool(self.jobs, initializer=ignore_signals).start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def authorized(self, header):
+        """
+        Return True if Authorization header contains token (or if no token is required)
+        :param header:
+        :return:
+        """
+        if self.token is None:
+            return True
+        scheme, _, value = (header or "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(value.strip(), self.token)
+
+    def add(self, status, durations=None):
+        with self.metrics_lock:
+            self.count[status] += 1
+            for stage, duration in (durations or {}).items():
+                self.durations[stage] += duration
+
+    def job(self, request):
+        """
+        Return job of sign_job() for request, settings not in request are settings of cert
+        :param request: dict with name and optional subject, san, key_type, key_size and curve
+        :return:
+        """
+        cert = self.cert
+        name = text(request.get("name") or "")
+        if not name or os.path.basename(name) != name or name.startswith("."):
+            raise RequestError("name is required and can't be a path")
+        subject = dict(cert.subject)
+        if not isinstance(request.get("subject") or {}, dict):
+            raise RequestError("subject must be an object")
+        subject.update((text(k), text(v)) for k, v in (request.get("subject") or {}).items())
+        with self.lock:
+            job = cert.row_settings(name, subject)
+        if request.get("san") is not None:
+            if not isinstance(request["san"], list):
+                raise RequestError("san must be a list")
+            job["san"] = ", ".join("DNS: {e}".format(e=text(entry)) for entry in request["san"]) or None
+        if request.get("key_type") is not None:
+            job["key_type"] = text(request["key_type"]).lower()
+            if job["key_type"] not in KEY_TYPES:
+                raise RequestError("key_type must be one of {t}".format(t=", ".join(KEY_TYPES)))
+        if request.get("key_size") is not None:
+            job["key_size"] = request["key_size"]
+            # bool is an int and 2048.0 == 2048
+            if not isinstance(job["key_size"], (int, long)) or isinstance(job["key_size"], bool) \
+                    or job["key_size"] not in KEY_SIZES:
+                raise RequestError("key_size must be one of {s}".format(s=", ".join(str(s) for s in KEY_SIZES)))
+        if request.get("curve") is not None:
+            job["curve"] = text(request["curve"])
+            if job["curve"] not in CURVES:
+                raise RequestError("curve must be one of {c}".format(c=", ".join(sorted(CURVES))))
+        job["key"] = None
+        if cert.keypool and job["key_type"] == "rsa":
+            with self.lock:
+                job["key"] = cert.keypool.take_pem(job["key_size"])
+        return job
+
+    def generate(self, request):
+        """
+        Generate key and csr of request, pem are returned or written in certificate folder
+        :param request: job() settings and optional write (bool) and force (bool)
+        :return: response
+        """
+        if not self.slots.acquire(False):
+            self.add("rejected")
+            raise RequestError("{m} requests in progress, try again later".format(m=self.max_requests), status=503)
+        with self.metrics_lock:
+            self.in_flight += 1
+        release = True
+        try:
+            write = boolean(request, "write")
+            force = boolean(request, "force", self.force)
+            job = self.job(request)
+            if write and not force and self.exists(job["name"]):
+                raise RequestError("{n} already exists, use force to overwrite it".format(n=job["name"]), status=409)
+            if self.pool is not None:
+                result = self.pool.submit(sign_job, job)
+                try:
+                    name, req, key, durations = result.get(self.timeout)
+                except multiprocessing.TimeoutError:
+                    # job stays in pool: its slot is released when a worker is done with it
+                    release = False
+                    self.release_later(result)
+                    self.add("timeout")
+                    raise RequestError("no worker available after {t} seconds".format(t=self.timeout), status=504)
+            else:
+                name, req, key, durations = sign_job(job)
+            response = OrderedDict([("name", name)])
+            if write:
+                response["paths"] = self.write(name, req, key, force=force)
+            else:
+                response["csr"] = req
+                response["key"] = key
+            response["durations"] = OrderedDict((k, round(v, 6)) for k, v in sorted(durations.items()))
+            self.add("generated", durations)
+            return response
+        finally:
+            if release:
+                self.release()
+
+    def release(self):
+        with self.metrics_lock:
+            self.in_flight -= 1
+        self.slots.release()
+
+    def release_later(self, result):
+        """
+        Release slot of a request timed out when its job is done
+        :param result: AsyncResult of job
+        :return:
+        """
+        def wait():
+            result.wait()
+            with self.metrics_lock:
+                self.abandoned -= 1
+            self.release()
+
+        with self.metrics_lock:
+            self.abandoned += 1
+        thread = threading.Thread(target=wait, name="certgen-abandoned")
+        thread.daemon = True
+        thread.start()
+
+    def exists(self, name):
+        """
+        Return True if key and csr of serial are in certificate folder
+        :param name:
+        :return:
+        """
+        path = os.path.join(self.cert.csr_folder, name, name)
+        return os.path.exists(path + ".csr") and os.path.exists(path + ".key")
+
+    def write(self, name, req, key, force=False):
+        """
+        Write key and csr files of serial in certificate folder
+        :param name:
+        :param req: csr pem
+        :param key: key pem
+        :param force: overwrite existing files
+        :return: paths
+        """
+        cert = self.cert
+        with self.lock:
+            cert.create_request(name=name)
+            if not force and cert.exists(cert.csr_file) and cert.exists(cert.key_file):
+                raise RequestError("{n} already exists, use force to overwrite it".format(n=name), status=409)
+            cert.generate_file(cert.key_file, key)
+            cert.generate_file(cert.csr_file, req)
+            cert.inventory_csr(name, crypto.load_certificate_request(crypto.FILETYPE_PEM, req), cert.key_file,
+                               cert.csr_file)
+            return [cert.key_file, cert.csr_file]
+
+    def metrics(self):
+        """
+        Return counters of requests and seconds spent in each stage since start
+        :return:
+        """
+        with self.metrics_lock:
+            return OrderedDict([
+                ("uptime", round(time.time() - self.started, 3)),
+                ("jobs", self.jobs),
+                ("max_requests", self.max_requests),
+                ("in_flight", self.in_flight),
+                ("abandoned", self.abandoned),
+                ("requests", OrderedDict(sorted(self.count.items()))),
+                ("durations", OrderedDict((k, round(v, 6)) for k, v in sorted(self.durations.items()))),
+                ("keypool_hits", self.cert.keypool.hits if self.cert.keypool else None),
+            ])
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    GET /health, GET /metrics and POST /csr (json request, json response)
+    """
+    server_version = "CertGenerator"
+
+    def do_GET(self):
+        engine = self.server.engine
+        if self.path == "/health":
+            self.reply(200, OrderedDict([("status", "ok"), ("in_flight", engine.in_flight)]))
+        elif not self.check_token():
+            return
+        elif self.path == "/metrics":
+            self.reply(200, engine.metrics())
+        else:
+            self.reply(404, {"error": "{p} not found".format(p=self.path)})
+
+    def do_POST(self):
+        engine = self.server.engine
+        if not self.check_token():
+            return
+        if self.path != "/csr":
+            self.reply(404, {"error": "{p} not found".format(p=self.path)})
+            return
+        try:
+            length = int(self.headers.getheader("Content-Length") or 0)
+            if length > MAX_BODY:
+                raise RequestError("request larger than {m} bytes".format(m=MAX_BODY), status=413)
+            try:
+                request = json.loads(self.rfile.read(length))
+            except ValueError as e:
+                raise RequestError("invalid json: {e}".format(e=e))
+            if not isinstance(request, dict):
+                raise RequestError("json object expected")
+            self.reply(200, engine.generate(request))
+        except RequestError as e:
+            if e.status < 500:
+                engine.add("invalid")
+            self.reply(e.status, {"error": str(e)})
+        except crypto.Error as e:
+            engine.add("invalid")
+            self.reply(400, {"error": str(e) or e.__class__.__name__})
+        except Exception as e:
+            engine.add("failed")
+            engine.cert.output("request failed: {e}", level=logging.WARNING, e=e)
+            self.reply(500, {"error": str(e) or e.__class__.__name__})
+
+    def check_token(self):
+        """
+        Reply 401 if request doesn't send token of server
+        :return: True if request is authorized
+        """
+        if self.server.engine.authorized(self.headers.getheader("Authorization")):
+            return True
+        self.server.engine.add("unauthorized")
+        self.reply(401, {"error": "missing or invalid token"})
+        return False
+
+    def reply(self, status, body):
+        data = json.dumps(body) + "\n"
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # client address of a unix socket is empty
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        self.server.engine.cert.output("{a} {m}", level=logging.DEBUG, a=self.address_string(), m=format % args)
+
+
+class HTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class UnixHTTPServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        # socket is created only usable by owner, no chmod after bind
+        umask = os.umask(0177)
+        try:
+            SocketServer.UnixStreamServer.server_bind(self)
+        finally:
+            os.umask(umask)
+        # used by BaseHTTPRequestHandler
+        self.server_name, self.server_port = "localhost", 0
+
+
+def make_server(engine, socket_path=None, port=None, host="127.0.0.1"):
+    """
+    Return http server of engine, on a unix socket (only usable by owner) or on a tcp port of localhost.
+    A tcp port is usable by any local user: engine must have a token
+    :param engine:
+    :param socket_path: stale socket of a stopped server is removed
+    :param port:
+    :param host:
+    :return:
+    """
+    if port:
+        if engine.token is None:
+            raise ValueError("a token is required to listen on a tcp port")
+        server = HTTPServer((host, port), Handler)
+    else:
+        if os.path.exists(socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(socket_path)
+                listening = True
+            except socket.error:
+                listening = False
+            finally:
+                probe.close()
+            if listening:
+                raise IOError(errno.EADDRINUSE, "a server is already listening on {s}".format(s=socket_path))
+            os.unlink(socket_path)
+        server = UnixHTTPServer(socket_path, Handler)
+    server.engine = engine
+    return server
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import re
+
+
+def parse_shard(value):
+    """
+    Return (index, count) of "I/N", index starts at 1
+    :param value:
+    :return:
+    """
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError("{v} is not I/N".format(v=value))
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError("shard {v}: I must be between 1 and N".format(v=value))
+    return index, count
+
+
+def shard_of(serial, count):
+    """
+    Return shard (1 to count) of serial, md5 is used because hash() changes between processes and versions
+    :param serial:
+    :param count:
+    :return:
+    """
+    return int(hashlib.md5(serial).hexdigest()[:8], 16) % count + 1
+
+
+def in_shard(names, shard):
+    """
+    Yield serials of shard
+    :param names:
+    :param shard: (index, count)
+    :return:
+    """
+    index, count = shard
+    for name in names:
+        if shard_of(name, count) == index:
+            yield name
+
+
+def split_extension(path):
+    """
+    Return (root, extension) of path, .tar.gz is one extension
+    :param path:
+    :return:
+    """
+    root, ext = os.path.splitext(path)
+    if root.endswith(".tar"):
+        root, ext = root[:-4], ".tar" + ext
+    return root, ext
+
+
+def shard_path(path, shard):
+    """
+    Return path of a file written by shard: [name].shard-[I]-of-[N][extension]
+    :param path:
+    :param shard: (index, count), path is returned as is if None
+    :return:
+    """
+    if not shard:
+        return path
+    root, ext = split_extension(path)
+    return "{r}.shard-{i}-of-{n}{e}".format(r=root, i=shard[0], n=shard[1], e=ext)
+
+
+def shard_files(path):
+    """
+    Return files written by shards for path, sorted by shard
+    :param path: path given to bulk command
+    :return: list of ((index, count), file)
+    """
+    folder, name = os.path.split(os.path.abspath(path))
+    root, ext = split_extension(name)
+    pattern = re.compile(re.escape(root) + r"\.shard-(\d+)-of-(\d+)" + re.escape(ext) + "$")
+    files = []
+    for entry in os.listdir(folder) if os.path.isdir(folder) else []:
+        match = pattern.match(entry)
+        if match:
+            files.append(((int(match.group(1)), int(match.group(2))), os.path.join(folder, entry)))
+    return sorted(files)
+
+
+def missing_shards(files):
+    """
+    Return shards missing in files of shard_files(), several values of N are an error of caller
+    :param files:
+    :return: list of "I/N"
+    """
+    counts = set(count for (_, count), _ in files)
+    done = set(shard for shard, _ in files)
+    return ["{i}/{n}".format(i=i, n=n) for n in sorted(counts) for i in range(1, n + 1) if (i, n) not in done]
+
+
+def merge_reports(files, path):
+    """
+    Concatenate reports of shards in path, records of each shard keep their order
+    :param files: list of ((index, count), file)
+    :param path:
+    :return: number of records
+    """
+    count = 0
+    with open(path, "wb") as out:
+        for _, name in files:
+            with open(name, "rb") as f:
+                for line in f:
+                    if line.strip():
+                        out.write(line if line.endswith("\n") else line + "\n")
+                        count += 1
+    return count
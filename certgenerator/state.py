@@ -0,0 +1,59 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from tools import Tools
+
+
+class RowState:
+    def __init__(self, path, settings):
+        """
+        Fingerprints of csv rows done by the last successful run, one "serial<TAB>fingerprint" line per row.
+        Fingerprint of a row is the hash of its serial and of the settings of its csr,
+        a row is generated again only if it is new or if its fingerprint changed
+        :param path:
+        :param settings: subject, san, usage, ca and key settings shared by all rows (json serializable)
+        """
+        self.path = path
+        self.settings = hashlib.sha1(json.dumps(settings, sort_keys=True)).hexdigest()
+        self.previous = {}
+        self.current = OrderedDict()
+        self.changed = set()
+        self.unchanged = 0
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with open(self.path, "rb") as f:
+            for line in f:
+                name, sep, fingerprint = line.rstrip("\n").rpartition("\t")
+                if sep:
+                    self.previous[name] = fingerprint
+
+    def fingerprint(self, name):
+        return hashlib.sha1(self.settings + "\t" + name).hexdigest()
+
+    def filter(self, names):
+        """
+        Yield new and changed serials, changed ones are added to self.changed
+        :param names: serials of csv file
+        :return:
+        """
+        for name in names:
+            fingerprint = self.fingerprint(name)
+            self.current[name] = fingerprint
+            previous = self.previous.get(name)
+            if previous == fingerprint:
+                self.unchanged += 1
+                continue
+            if previous is not None:
+                self.changed.add(name)
+            yield name
+
+    def save(self):
+        """
+        Replace fingerprints of last run, serials removed from csv file are dropped
+        :return:
+        """
+        Tools.write_atomic(self.path, "".join("{n}\t{f}\n".format(n=name, f=fingerprint)
+                                              for name, fingerprint in self.current.items()), sync=True)
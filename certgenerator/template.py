@@ -0,0 +1,50 @@
+import os
+from tools import get_yaml
+from workers import get_extensions
+
+
+class RequestTemplate:
+    def __init__(self, usage, ca, yaml_file=None, san=None):
+        """
+        Yaml values, san and extensions shared by every csr of a run
+        :param usage:
+        :param ca: "TRUE" or "FALSE"
+        :param yaml_file: path of csr.yaml, compiled again only when modified
+        :param san: list of dns (--san), used if yaml file doesn't define san
+        """
+        self.usage = usage
+        self.ca = ca
+        self.yaml_file = yaml_file
+        self.default_san = san or []
+        self.mtime = None
+        self.cfg = {}
+        self.san = None
+        self.extensions = []
+        self.compile()
+
+    def compile(self):
+        """
+        Parse yaml file and build san and extensions
+        :return:
+        """
+        self.cfg = {}
+        if self.yaml_file:
+            self.mtime = os.stat(self.yaml_file).st_mtime
+            with open(self.yaml_file, 'r') as stream:
+                self.cfg = get_yaml().load(stream) or {}
+
+        if "san" in self.cfg:
+            entries = self.cfg["san"].split(" ")
+        else:
+            entries = self.default_san
+        self.san = ", ".join(["DNS: {e}".format(e=entry) for entry in entries]) or None
+        self.extensions = get_extensions(self.usage, self.ca, self.san)
+
+    def is_stale(self):
+        """
+        Return True if yaml file has been modified since compile
+        :return:
+        """
+        if self.yaml_file is None:
+            return False
+        return os.stat(self.yaml_file).st_mtime != self.mtime
@@ -0,0 +1,33 @@
+import os
+import pytest
+
+
+@pytest.fixture(scope="session")
+def home(tmpdir_factory):
+    """
+    HOME of tests: app folder is created in a temporary Documents folder
+    :param tmpdir_factory:
+    :return:
+    """
+    from certgenerator.context import reset_context
+    previous = os.environ.get("HOME")
+    home = tmpdir_factory.mktemp("home")
+    home.mkdir("Documents")
+    os.environ["HOME"] = str(home)
+    reset_context()
+    yield str(home)
+    if previous is not None:
+        os.environ["HOME"] = previous
+    reset_context()
+
+
+@pytest.fixture(scope="session")
+def cert(home):
+    """
+    Certificate with default settings
+    :param home:
+    :return:
+    """
+    from certgenerator.certificate import Certificate
+    from certgenerator.context import get_context
+    return Certificate(logger=get_context().logger, opts={})
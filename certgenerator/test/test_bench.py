@@ -0,0 +1,30 @@
+import pytest
+from certgenerator.bench import STAGES, Bench
+
+
+@pytest.fixture(scope="module")
+def bench(cert):
+    """
+    Bench with key, csr, csv and p12 read by stages, key settings of cert are restored after tests
+    :param cert:
+    :return:
+    """
+    key_size, key_type, curve = cert._key_size, cert._key_type, cert._curve
+    bench = Bench(cert)
+    bench.setup()
+    yield bench
+    bench.teardown()
+    cert._key_size, cert._key_type, cert._curve = key_size, key_type, curve
+
+
+@pytest.mark.parametrize("stage", STAGES)
+def test_stage(benchmark, bench, stage):
+    """
+    Same stages as cert bench, compare runs with pytest --benchmark-autosave and --benchmark-compare
+    :param benchmark:
+    :param bench:
+    :param stage:
+    :return:
+    """
+    benchmark.group = stage.split("-")[0]
+    benchmark(bench.stages[stage])
@@ -0,0 +1,75 @@
+import pytest
+from certgenerator.bundle import Bundle, BundleReader
+
+SERIALS = ("s3", "s1", "s4", "s2", "s0")
+
+
+def pem(serial, kind):
+    return "-----BEGIN {k}-----\n{s}\n-----END {k}-----\n".format(k=kind.upper(), s=serial)
+
+
+@pytest.fixture(params=[100000, 2], ids=["one-run", "merged-runs"])
+def bundle(request, tmpdir):
+    """
+    Bundle of key and csr of SERIALS written in csv order, index is sorted in one run or merged from runs of 2 lines
+    :param request:
+    :param tmpdir:
+    :return: path of bundle
+    """
+    path = str(tmpdir.join("bundle.pem"))
+    writer = Bundle(path)
+    writer.sort_lines = request.param
+    for serial in SERIALS:
+        for kind in ("key", "csr"):
+            writer.add("{s}/{s}.{k}".format(s=serial, k=kind), pem(serial, kind), serial=serial)
+    writer.close()
+    assert not tmpdir.join("bundle.pem.idx.tmp").exists()
+    return path
+
+
+def test_index_is_sorted(bundle):
+    with open(bundle + ".idx") as f:
+        serials = [line.split("\t")[0] for line in f][1:]
+    assert serials == sorted(serials)
+    assert len(serials) == 2 * len(SERIALS)
+
+
+def test_lookup(bundle):
+    """
+    Objects of a serial are found in the order they were added
+    :param bundle:
+    :return:
+    """
+    with BundleReader(bundle) as reader:
+        for serial in SERIALS:
+            assert reader.get(serial) == [(kind, "{s}/{s}.{k}".format(s=serial, k=kind), pem(serial, kind))
+                                          for kind in ("key", "csr")]
+        assert reader.get("s2", kind="csr") == [("csr", "s2/s2.csr", pem("s2", "csr"))]
+
+
+def test_missing_serial(bundle):
+    """
+    Serials before, between and after indexed serials are not found
+    :param bundle:
+    :return:
+    """
+    with BundleReader(bundle) as reader:
+        for serial in ("a", "s", "s10", "s5", "z"):
+            assert serial not in reader
+            assert reader.lookup(serial) == []
+        assert reader.first(BundleReader.encode("a")) == reader.start
+        assert reader.first(BundleReader.encode("z")) == len(reader.index)
+
+
+def test_empty_bundle(tmpdir):
+    path = str(tmpdir.join("empty.pem"))
+    Bundle(path).close()
+    with BundleReader(path) as reader:
+        assert reader.lookup("s1") == []
+
+
+def test_p12_is_rejected(tmpdir):
+    writer = Bundle(str(tmpdir.join("bundle.pem")))
+    with pytest.raises(ValueError):
+        writer.add("s1.p12", b"\x30\x82", serial="s1")
+    writer.close()
@@ -0,0 +1,99 @@
+import json
+import os
+import time
+import pytest
+from certgenerator.claim import ClaimDir, claim_files, claim_path
+
+
+@pytest.fixture
+def folder(tmpdir):
+    return str(tmpdir.join("run"))
+
+
+def expire(claims, name):
+    """
+    Set mtime of claim older than lease, as if its process crashed
+    :param claims:
+    :param name:
+    :return:
+    """
+    old = time.time() - claims.lease - 10
+    os.utime(claims.path(name), (old, old))
+
+
+def test_claim_is_exclusive(folder):
+    first, second = ClaimDir(folder, owner="host:1"), ClaimDir(folder, owner="host:2")
+    assert list(first.filter(["a1", "a2"])) == ["a1", "a2"]
+    assert list(second.filter(["a1", "a2", "a3"])) == ["a3"]
+    assert second.count["busy"] == 2
+    with open(first.path("a1")) as f:
+        assert json.load(f)["owner"] == "host:1"
+
+
+def test_done_is_skipped(folder):
+    first, second = ClaimDir(folder, owner="host:1"), ClaimDir(folder, owner="host:2")
+    assert first.claim("a1")
+    first.done("a1")
+    assert os.path.exists(first.path("a1", "done")) and not os.path.exists(first.path("a1"))
+    assert not second.claim("a1")
+    assert second.count["done"] == 1
+
+
+def test_expired_claim_is_taken_over(folder):
+    first, second = ClaimDir(folder, owner="host:1"), ClaimDir(folder, owner="host:2")
+    assert first.claim("a1")
+    assert not second.claim("a1")
+    expire(first, "a1")
+    assert second.claim("a1")
+    assert second.count["reclaimed"] == 1
+    assert [name for name in os.listdir(folder)] == ["a1.claim"]
+
+
+def test_claim_taken_over_is_not_touched_by_first_owner(folder):
+    """
+    A stalled process doesn't renew, mark done or remove a claim taken over by another process
+    :param folder:
+    :return:
+    """
+    first, second = ClaimDir(folder, owner="host:1"), ClaimDir(folder, owner="host:2")
+    assert first.claim("a1") and first.claim("a2")
+    expire(first, "a1")
+    assert second.claim("a1")
+    expire(second, "a1")
+    first.renew()
+    assert second.expired(second.path("a1"))
+    assert "a1" not in first.held and first.count["lost"] == 1
+    first.done_batch(["a1", "a2"])
+    assert os.path.exists(first.path("a2", "done"))
+    assert not os.path.exists(first.path("a1", "done"))
+    first.close()
+    assert os.path.exists(second.path("a1"))
+    second.done("a1")
+    assert os.path.exists(second.path("a1", "done"))
+
+
+def test_done_skips_lost_claim(folder):
+    first, second = ClaimDir(folder, owner="host:1"), ClaimDir(folder, owner="host:2")
+    assert first.claim("a1")
+    expire(first, "a1")
+    assert second.claim("a1")
+    first.done("a1")
+    assert first.count["lost"] == 1
+    assert not os.path.exists(first.path("a1", "done")) and os.path.exists(first.path("a1"))
+
+
+def test_release_keeps_claims_of_others(folder):
+    first, second = ClaimDir(folder, owner="host:1"), ClaimDir(folder, owner="host:2")
+    assert first.claim("a1") and first.claim("a2")
+    expire(first, "a1")
+    assert second.claim("a1")
+    first.close()
+    assert sorted(os.listdir(folder)) == ["a1.claim"]
+
+
+def test_claim_path_and_files(tmpdir):
+    path = str(tmpdir.join("report.json"))
+    for owner in ("node2:7", "node1:12"):
+        open(claim_path(path, "nightly", owner), "w").close()
+    assert claim_path(path, None, "node1:12") == path
+    assert [owner for owner, _ in claim_files(path, "nightly")] == ["node1-12", "node2-7"]
@@ -0,0 +1,22 @@
+import threading
+from certgenerator.context import get_context, reset_context
+
+
+def test_context_is_shared(home):
+    """
+    Threads get the same context, built once, until reset_context()
+    :param home:
+    :return:
+    """
+    contexts = []
+    threads = [threading.Thread(target=lambda: contexts.append(get_context())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(id(context) for context in contexts)) == 1
+    context = contexts[0]
+    assert context.folders() is context.folders()
+    assert context.new_tools().config is context.config
+    reset_context()
+    assert get_context() is not context
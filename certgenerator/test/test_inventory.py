@@ -0,0 +1,57 @@
+from certgenerator.inventory import Inventory, describe
+
+
+def rows(path):
+    with Inventory(path) as inventory:
+        return list(inventory.query())
+
+
+def test_merge_is_idempotent(tmpdir):
+    """
+    Merging the same shard inventory twice adds its rows once, a newer row of main inventory is kept
+    :param tmpdir:
+    :return:
+    """
+    main, shard = str(tmpdir.join("inventory.sqlite")), str(tmpdir.join("inventory.shard-1-of-2.sqlite"))
+    with Inventory(shard) as inventory:
+        inventory.add_row(describe("a1", "csr", "/out/a1/a1.csr", created=10.0))
+        inventory.add_row(describe("a2", "csr", "/out/a2/a2.csr", created=10.0))
+    with Inventory(main) as inventory:
+        inventory.add_row(describe("a0", "csr", "/out/a0/a0.csr", created=5.0))
+        assert inventory.merge(shard) == 2
+        merged = list(inventory.query())
+        assert inventory.merge(shard) == 0
+        assert list(inventory.query()) == merged
+    assert [row["serial"] for row in rows(main)] == ["a0", "a1", "a2"]
+
+
+def test_merge_keeps_created_of_main(tmpdir):
+    main, shard = str(tmpdir.join("inventory.sqlite")), str(tmpdir.join("inventory.shard-1-of-2.sqlite"))
+    with Inventory(main) as inventory:
+        inventory.add_row(describe("a1", "csr", "/out/a1/a1.csr", created=1.0))
+    with Inventory(shard) as inventory:
+        inventory.add_row(describe("a1", "csr", "/out/a1/a1.csr", created=2.0))
+    with Inventory(main) as inventory:
+        assert inventory.merge(shard) == 1
+    (row,) = rows(main)
+    assert row["created"] == 1.0
+
+
+def test_add_and_query(tmpdir):
+    """
+    A file written again keeps its created time, query filters combine
+    :param tmpdir:
+    :return:
+    """
+    path = str(tmpdir.join("inventory.sqlite"))
+    with Inventory(path, batch=2) as inventory:
+        inventory.add_row(describe("a1", "csr", "/out/a1/a1.csr", created=1.0))
+        inventory.add_row(describe("a1", "key", "/out/a1/a1.key", created=1.0))
+        inventory.add_row(describe("a2", "key", "/out/a2/a2.key", created=1.0))
+        inventory.add_row(describe("a1", "csr", "/out/a1/a1.csr", created=5.0))
+        assert [(row["serial"], row["type"]) for row in inventory.query(kind="key")] == [("a1", "key"), ("a2", "key")]
+        assert [row["serial"] for row in inventory.query(kind="key", missing="csr")] == ["a2"]
+        (row,) = inventory.query(serial="a1", kind="csr")
+        assert row["created"] == 1.0 and row["updated"] > 5.0
+        assert inventory.stats()["serials"] == 2
+        assert inventory.paths(["/out/a1"]) == {"/out/a1/a1.csr", "/out/a1/a1.key"}
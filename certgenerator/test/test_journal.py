@@ -0,0 +1,38 @@
+import json
+from certgenerator.journal import Journal
+
+
+def test_load_truncates_torn_record(tmpdir):
+    """
+    A record interrupted by a crash is removed on resume, records before it are kept
+    :param tmpdir:
+    :return:
+    """
+    path = str(tmpdir.join("journal.jsonl"))
+    journal = Journal(path)
+    journal.add_batch([("a1", ["a1.key"], "generated"), ("a2", ["a2.key"], "exists")])
+    journal.close()
+    with open(path, "ab") as f:
+        f.write('{"serial": "a3", "sta')
+    journal = Journal(path, resume=True)
+    assert "a1" in journal and "a2" in journal and "a3" not in journal
+    journal.add("a3", ["a3.key"])
+    journal.close()
+    with open(path, "rb") as f:
+        records = [json.loads(line) for line in f]
+    assert [record["serial"] for record in records] == ["a1", "a2", "a3"]
+
+
+def test_new_journal_is_truncated(tmpdir):
+    """
+    Without resume a journal starts empty
+    :param tmpdir:
+    :return:
+    """
+    path = str(tmpdir.join("journal.jsonl"))
+    journal = Journal(path)
+    journal.add("a1", [])
+    journal.close()
+    journal = Journal(path)
+    journal.close()
+    assert "a1" not in journal and tmpdir.join("journal.jsonl").size() == 0
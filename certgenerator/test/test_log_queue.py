@@ -0,0 +1,69 @@
+import logging
+import Queue
+import pytest
+from certgenerator.log_queue import QueueHandler, QueueListener
+
+
+class Recorder(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class Formatted(object):
+    """
+    Count how many times a value is formatted in a message
+    """
+    count = 0
+
+    def __format__(self, spec):
+        Formatted.count += 1
+        return "formatted"
+
+
+def test_records_are_written_in_order():
+    """
+    Records are formatted in the thread logging them and written in order by the listener
+    :return:
+    """
+    recorder = Recorder()
+    queue = Queue.Queue(-1)
+    listener = QueueListener(queue, recorder)
+    listener.start()
+    logger = logging.getLogger("certgenerator.test.queue")
+    logger.propagate = False
+    handler = QueueHandler(queue)
+    logger.addHandler(handler)
+    try:
+        for i in range(100):
+            logger.warning("row %s of %s", i, [100])
+    finally:
+        logger.removeHandler(handler)
+        listener.stop()
+    assert recorder.messages[:3] == ["row 0 of [100]", "row 1 of [100]", "row 2 of [100]"]
+    assert len(recorder.messages) == 100
+
+
+@pytest.fixture
+def quiet(cert):
+    """
+    cert logging only warnings, not verbose
+    :param cert:
+    :return:
+    """
+    logger = logging.getLogger("certgenerator.test.quiet")
+    logger.setLevel(logging.WARNING)
+    previous = cert._logger, cert._verbose, cert._debug
+    cert._logger, cert._verbose, cert._debug = logger, False, False
+    yield cert
+    cert._logger, cert._verbose, cert._debug = previous
+
+
+def test_hidden_message_is_not_formatted(quiet):
+    Formatted.count = 0
+    quiet.output("[+] {v} done", level=logging.DEBUG, v=Formatted())
+    quiet.output("[+] {v} done", level=logging.INFO, v=Formatted())
+    assert Formatted.count == 0
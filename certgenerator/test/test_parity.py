@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+import pytest
+from certgenerator import reader
+
+SERIALS = ("p1", "p2", "p3", "p4", "p5")
+MODES = {
+    "sequential": [],
+    "jobs": ["-j", "2"],
+    "pipeline": ["-pl"],
+}
+
+
+def create_multiple(folder, csv_file, options):
+    """
+    Run cert create-multiple with ec keys in a new HOME
+    :param folder: HOME of run
+    :param csv_file:
+    :param options: options selecting the generation mode
+    :return: certificate folder of run
+    """
+    folder.mkdir("Documents")
+    env = dict(os.environ, HOME=str(folder))
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    subprocess.check_call([sys.executable, "-W", "ignore", "-c", "from certgenerator.cli import main; main()",
+                           "create-multiple", "-csv", csv_file, "-kt", "ec"] + options, cwd=root, env=env)
+    return os.path.join(str(folder), "Documents", "CertGenerator", "certificate", "csr")
+
+
+def summary(folder):
+    """
+    Return files of folder and subject, key type and extensions of each csr
+    :param folder:
+    :return:
+    """
+    files, csrs = [], {}
+    for root, _, names in os.walk(folder):
+        for name in names:
+            path = os.path.join(root, name)
+            files.append(os.path.relpath(path, folder))
+            if name.endswith(".csr"):
+                csrs[name] = reader.extract(reader.load(path), ["subject", "key_type", "extensions"])
+    return sorted(files), csrs
+
+
+@pytest.fixture(scope="module")
+def runs(tmpdir_factory):
+    csv_file = tmpdir_factory.mktemp("csv").join("parity.csv")
+    csv_file.write("serial\n" + "\n".join(SERIALS) + "\n")
+    return dict((mode, summary(create_multiple(tmpdir_factory.mktemp(mode), str(csv_file), options)))
+                for mode, options in MODES.items())
+
+
+@pytest.mark.parametrize("mode", ["jobs", "pipeline"])
+def test_create_multiple_parity(runs, mode):
+    """
+    -j and -pl write the same files, subjects and extensions as a sequential run
+    :param runs:
+    :param mode:
+    :return:
+    """
+    files, csrs = runs["sequential"]
+    assert files == sorted(os.path.join(s, s + ext) for s in SERIALS for ext in (".csr", ".key"))
+    assert runs[mode] == (files, csrs)
+    for serial in SERIALS:
+        assert csrs[serial + ".csr"]["subject"]["CN"] == serial
+        assert csrs[serial + ".csr"]["key_type"] == "EC"
@@ -0,0 +1,44 @@
+import os
+import pytest
+from certgenerator.pipeline import Pipeline
+
+
+@pytest.fixture
+def ec_cert(cert):
+    """
+    cert generating ec keys, key settings are restored after test
+    :param cert:
+    :return:
+    """
+    previous = cert._key_type, cert._curve
+    cert._key_type, cert._curve = "ec", "P-256"
+    yield cert
+    cert._key_type, cert._curve = previous
+
+
+def test_rows_are_generated_then_skipped(ec_cert):
+    names = ["pipe{i}".format(i=i) for i in range(6)]
+    count = Pipeline(ec_cert, queue_size=1).run(iter(names), {})
+    assert count["generated"] == 6
+    for name in names:
+        assert os.path.exists(os.path.join(ec_cert.csr_folder, name, name + ".csr"))
+    count = Pipeline(ec_cert, queue_size=1).run(iter(names), {})
+    assert count == {"exists": 6}
+
+
+def test_error_of_a_stage_stops_pipeline(ec_cert):
+    """
+    An error of reader is raised by join() and stages blocked on full queues are stopped
+    :param ec_cert:
+    :return:
+    """
+    def names():
+        for i in range(3):
+            yield "broken{i}".format(i=i)
+        raise ValueError("csv row 4")
+
+    pipeline = Pipeline(ec_cert, queue_size=1).start(names(), {})
+    with pytest.raises(ValueError) as e:
+        pipeline.join(timeout=60)
+    assert str(e.value) == "csv row 4"
+    assert pipeline.done()
@@ -0,0 +1,75 @@
+import pytest
+from certgenerator import reader
+from certgenerator.workers import build_request, fill_subject, generate_key, get_extensions
+
+SUBJECT = {"C": "FR", "O": "Acme/R&D", "CN": "reader"}
+PASSWORD = "3z6F2Xfc"
+
+
+@pytest.fixture(scope="module")
+def files(tmpdir_factory):
+    """
+    csr and p12 of the same ec key and subject
+    :param tmpdir_factory:
+    :return: paths of csr and p12
+    """
+    from OpenSSL import crypto
+    folder = tmpdir_factory.mktemp("reader")
+    key = generate_key(key_type="ec", curve="P-256")
+    req = build_request(key, SUBJECT, get_extensions("digitalSignature", "FALSE", "DNS:reader.com"))
+    x509 = crypto.X509()
+    fill_subject(x509, SUBJECT, self_signed=True)
+    x509.set_serial_number(0x1F)
+    x509.gmtime_adj_notBefore(0)
+    x509.gmtime_adj_notAfter(3600)
+    x509.set_pubkey(key)
+    x509.sign(key, "sha256")
+    pkcs12 = crypto.PKCS12()
+    pkcs12.set_privatekey(key)
+    pkcs12.set_certificate(x509)
+    folder.join("reader.csr").write(crypto.dump_certificate_request(crypto.FILETYPE_PEM, req))
+    folder.join("reader.p12").write_binary(pkcs12.export(passphrase=PASSWORD))
+    return str(folder.join("reader.csr")), str(folder.join("reader.p12"))
+
+
+def test_csr_and_p12_share_schema(files):
+    """
+    csr and p12 have every field of FIELDS in the same order, fields of certificate are None for csr
+    :param files:
+    :return:
+    """
+    csr = reader.extract(reader.load(files[0]))
+    p12 = reader.extract(reader.load(files[1], PASSWORD))
+    assert list(csr) == list(p12) == list(reader.FIELDS)
+    for record in (csr, p12):
+        assert list(record["subject"].items()) == [("C", "FR"), ("O", "Acme/R&D"), ("CN", "reader")]
+        assert record["key_type"] == "EC"
+        assert record["key_size"] == 256
+        assert sorted(record["fingerprints"]) == ["sha1", "sha256"]
+        assert record["ca"] == []
+    assert csr["issuer"] is None and csr["serial"] is None and csr["validity"] is None
+    assert "DNS:reader.com" in csr["extensions"]
+    assert p12["issuer"] == p12["subject"]
+    assert p12["serial"] == "1F"
+    assert p12["validity"]["not_before"].endswith("Z")
+
+
+def test_extract_selected_fields(files):
+    """
+    Only requested fields are extracted, in requested order
+    :param files:
+    :return:
+    """
+    record = reader.extract(reader.load(files[1], PASSWORD), ["serial", "subject"])
+    assert list(record) == ["serial", "subject"]
+
+
+def test_read_job_reports_errors(files, tmpdir):
+    """
+    Errors are returned in record instead of raised
+    :param files:
+    :param tmpdir:
+    :return:
+    """
+    assert reader.read_job({"path": files[1], "password": "wrong"})["error"]
+    assert reader.read_job({"path": str(tmpdir.join("reader.pem"))})["error"] == ".csr or .p12 expected"
@@ -0,0 +1,34 @@
+import json
+from certgenerator.report import Report
+
+
+def test_one_record_per_row(tmpdir):
+    path = str(tmpdir.join("report.json"))
+    report = Report(path)
+    report.add("a1", "generated", ["a1/a1.key", "a1/a1.csr"], key_size=256, durations={"keygen": 0.0012345678})
+    report.add("a2", "journal", [])
+    report.add("a3", "failed", [], error=ValueError("bad row"))
+    report.close()
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert [(r["serial"], r["status"]) for r in records] == [("a1", "generated"), ("a2", "skipped"), ("a3", "failed")]
+    assert records[0]["durations"] == {"keygen": 0.001235}
+    assert records[0]["paths"] == ["a1/a1.key", "a1/a1.csr"]
+    assert records[1]["reason"] == "journal" and "reason" not in records[0]
+    assert records[2]["error"] == "bad row"
+    assert report.count == {"generated": 1, "skipped": 1, "failed": 1}
+
+
+def test_record_is_flushed(tmpdir):
+    """
+    A record can be read as soon as its row is done
+    :param tmpdir:
+    :return:
+    """
+    path = str(tmpdir.join("report.json"))
+    report = Report(path)
+    report.add("a1", "exists", ["a1/a1.key"], archive="csr.tar")
+    with open(path) as f:
+        record = json.loads(f.readline())
+    report.close()
+    assert record["status"] == "skipped" and record["reason"] == "exists" and record["archive"] == "csr.tar"
@@ -0,0 +1,77 @@
+import threading
+import pytest
+from certgenerator.serve import Engine, RequestError
+
+
+@pytest.fixture
+def engine(cert):
+    with Engine(cert, max_requests=2) as engine:
+        yield engine
+
+
+@pytest.mark.parametrize("request_", [
+    {},
+    {"name": "../a1"},
+    {"name": ".a1"},
+    {"name": "a1", "subject": ["CN"]},
+    {"name": "a1", "san": "a1.com"},
+    {"name": "a1", "key_type": "dsa"},
+    {"name": "a1", "key_size": 2048.0},
+    {"name": "a1", "key_size": "2048"},
+    {"name": "a1", "key_size": True},
+    {"name": "a1", "key_size": 512},
+    {"name": "a1", "curve": "P-192"},
+    {"name": 1},
+], ids=lambda request_: repr(request_))
+def test_invalid_job(engine, request_):
+    with pytest.raises(RequestError) as e:
+        engine.job(request_)
+    assert e.value.status == 400
+
+
+def test_job(engine):
+    job = engine.job({"name": "a1", "subject": {"O": u"Acm\xe9"}, "san": ["a1.com"], "key_type": "RSA",
+                      "key_size": 1024})
+    assert job["name"] == "a1"
+    assert job["subject"]["CN"] == "a1" and job["subject"]["O"] == "Acm\xc3\xa9"
+    assert job["san"] == "DNS: a1.com"
+    assert (job["key_type"], job["key_size"]) == ("rsa", 1024)
+
+
+@pytest.mark.parametrize("flag", ["write", "force"])
+@pytest.mark.parametrize("value", [1, "true", None, [True]])
+def test_flags_must_be_boolean(engine, flag, value):
+    with pytest.raises(RequestError) as e:
+        engine.generate({"name": "a1", "key_type": "ec", flag: value})
+    assert e.value.status == 400
+    assert engine.in_flight == 0
+
+
+def test_generate(engine):
+    response = engine.generate({"name": "a1", "key_type": "ec", "write": False, "force": False})
+    assert response["name"] == "a1"
+    assert response["csr"].startswith("-----BEGIN CERTIFICATE REQUEST-----")
+    assert engine.metrics()["requests"]["generated"] == 1
+
+
+def test_concurrent_jobs(engine):
+    """
+    Jobs built by request threads at the same time get their own name and subject
+    :param engine:
+    :return:
+    """
+    jobs, errors = {}, []
+
+    def build(name):
+        try:
+            jobs[name] = engine.job({"name": name, "key_type": "ec"})
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=build, args=("a{i}".format(i=i),)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert all(job["subject"]["CN"] == name for name, job in jobs.items()) and len(jobs) == 16
@@ -0,0 +1,41 @@
+import pytest
+from certgenerator.shard import in_shard, missing_shards, parse_shard, shard_files, shard_of, shard_path
+
+SERIALS = ["serial{i}".format(i=i) for i in range(200)]
+
+
+def test_shard_of_is_stable():
+    """
+    Shard of a serial doesn't depend on process or python version (md5, not hash())
+    :return:
+    """
+    assert [shard_of(serial, 4) for serial in ("a1", "serial0", "test")] == [2, 4, 2]
+    assert all(1 <= shard_of(serial, 3) <= 3 for serial in SERIALS)
+
+
+def test_shards_partition_serials():
+    shards = [list(in_shard(SERIALS, (index, 3))) for index in (1, 2, 3)]
+    assert sorted(sum(shards, [])) == sorted(SERIALS)
+    assert all(shards)
+
+
+@pytest.mark.parametrize("value", ["0/2", "3/2", "1/0", "a/2", "1", "1/2/3"])
+def test_parse_shard_rejects(value):
+    with pytest.raises(ValueError):
+        parse_shard(value)
+
+
+def test_shard_path():
+    assert shard_path("out/report.json", None) == "out/report.json"
+    assert shard_path("out/report.json", (2, 3)) == "out/report.shard-2-of-3.json"
+    assert shard_path("out/csr.tar.gz", (1, 3)) == "out/csr.shard-1-of-3.tar.gz"
+    assert shard_path("out/inventory", (1, 3)) == "out/inventory.shard-1-of-3"
+
+
+def test_shard_files(tmpdir):
+    for index in (3, 1):
+        tmpdir.join(shard_path("csr.tar.gz", (index, 3))).write("")
+    tmpdir.join("csr.shard-1-of-3.tar").write("")
+    files = shard_files(str(tmpdir.join("csr.tar.gz")))
+    assert [shard for shard, _ in files] == [(1, 3), (3, 3)]
+    assert missing_shards(files) == ["2/3"]
@@ -0,0 +1,65 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+# ruamel itself is a namespace module created at interpreter startup by ruamel.yaml-*-nspkg.pth
+HEAVY_MODULES = ("OpenSSL", "cryptography", "ruamel.yaml", "yaml", "certgenerator.certificate")
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def imported_modules(statement, home):
+    """
+    Return modules imported by statement in a new interpreter
+    :param statement:
+    :param home: HOME of interpreter
+    :return:
+    """
+    code = "import json, sys\n{s}\nprint(json.dumps(sorted(sys.modules)))".format(s=statement)
+    env = dict(os.environ, HOME=home)
+    output = subprocess.check_output([sys.executable, "-W", "ignore", "-c", code], cwd=ROOT, env=env)
+    return set(json.loads(output.decode("utf-8").strip().splitlines()[-1]))
+
+
+def test_cli_import_is_lazy(home):
+    """
+    cert --help and cli startup must not load OpenSSL, yaml parsers or Certificate
+    :param home:
+    :return:
+    """
+    modules = imported_modules("import certgenerator.cli", home)
+    assert "certgenerator.cli" in modules
+    for name in HEAVY_MODULES:
+        assert name not in modules, "{n} is imported by certgenerator.cli".format(n=name)
+
+
+def wall_time(args, home, rounds=3):
+    """
+    Return best wall time of a new interpreter running args
+    :param args: arguments of python
+    :param home: HOME of interpreter
+    :param rounds:
+    :return: seconds
+    """
+    env = dict(os.environ, HOME=home)
+    best = None
+    with open(os.devnull, "w") as devnull:
+        for _ in range(rounds):
+            start = time.time()
+            subprocess.check_call([sys.executable, "-W", "ignore"] + args, cwd=ROOT, env=env, stdout=devnull)
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def test_cli_help_is_fast(home):
+    """
+    cert --help must take less time than importing Certificate alone, whatever the speed of the machine
+    :param home:
+    :return:
+    """
+    baseline = wall_time(["-c", "import certgenerator.certificate"], home)
+    elapsed = wall_time(["-c", "from certgenerator.cli import main; main()", "--help"], home)
+    assert elapsed < baseline, "cert --help took {e:.3f}s, import of Certificate {b:.3f}s".format(e=elapsed,
+                                                                                                  b=baseline)
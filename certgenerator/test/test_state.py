@@ -0,0 +1,60 @@
+from certgenerator.state import RowState
+
+SETTINGS = {"subject": {"O": "Acme"}, "key_type": "ec", "curve": "P-256"}
+
+
+def run(path, settings, names):
+    """
+    Filter names like a run of create-multiple, fingerprints are saved at the end of the run
+    :param path:
+    :param settings:
+    :param names:
+    :return: RowState and serials to generate
+    """
+    state = RowState(path, settings)
+    selected = list(state.filter(names))
+    state.save()
+    return state, selected
+
+
+def test_first_run_generates_every_row(tmpdir):
+    state, selected = run(str(tmpdir.join("rows")), SETTINGS, ["a1", "a2"])
+    assert selected == ["a1", "a2"]
+    assert state.changed == set() and state.unchanged == 0
+
+
+def test_only_new_rows_are_generated(tmpdir):
+    path = str(tmpdir.join("rows"))
+    run(path, SETTINGS, ["a1", "a2"])
+    state, selected = run(path, SETTINGS, ["a1", "a2", "a3"])
+    assert selected == ["a3"]
+    assert state.changed == set() and state.unchanged == 2
+
+
+def test_changed_settings_generate_every_row_again(tmpdir):
+    path = str(tmpdir.join("rows"))
+    run(path, SETTINGS, ["a1", "a2"])
+    state, selected = run(path, dict(SETTINGS, curve="P-384"), ["a1", "a2"])
+    assert selected == ["a1", "a2"]
+    assert state.changed == {"a1", "a2"} and state.unchanged == 0
+
+
+def test_removed_rows_are_dropped(tmpdir):
+    """
+    A serial removed from csv is new again if it comes back
+    :param tmpdir:
+    :return:
+    """
+    path = str(tmpdir.join("rows"))
+    run(path, SETTINGS, ["a1", "a2"])
+    run(path, SETTINGS, ["a1"])
+    state, selected = run(path, SETTINGS, ["a1", "a2"])
+    assert selected == ["a2"]
+    assert state.changed == set() and state.unchanged == 1
+
+
+def test_settings_order_does_not_matter(tmpdir):
+    path = str(tmpdir.join("rows"))
+    run(path, SETTINGS, ["a1"])
+    _, selected = run(path, dict(reversed(list(SETTINGS.items()))), ["a1"])
+    assert selected == []
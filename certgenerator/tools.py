@@ -1,5 +1,4 @@
 import os
-import ruamel.yaml
 import time
 import csv
 import logging
@@ -11,9 +10,23 @@ import subprocess
 from codecs import open as c_open
 from config import Config
 from cert_exceptions import *
+from log_queue import queue_handler
 
 here = os.path.abspath(os.path.dirname(__file__))
-yaml = ruamel.yaml.YAML()
+_yaml = None
+_about = {}
+
+
+def get_yaml():
+    """
+    Return yaml parser, ruamel.yaml is imported on first call
+    :return:
+    """
+    global _yaml
+    if _yaml is None:
+        import ruamel.yaml
+        _yaml = ruamel.yaml.YAML()
+    return _yaml
 
 
 def edit_config(cert_folder, csv_file, _yaml):
@@ -130,12 +143,14 @@ def validate_subject(field):
 
 
 class Tools:
-    def __init__(self):
+    def __init__(self, config=None):
+        """
+        :param config: Config already loaded, config.ini is read if None
+        """
         self.here = here
         self.basedir = os.path.dirname(self.here)
         self.opts = Options()
-        self.config = Config()
-        self.about = self.get_app_info()
+        self.config = config if config is not None else Config()
         self.documents = os.path.join(os.environ["HOME"], "Documents")
         self.app_folder = os.path.join(self.documents, self.get_app_info("__title__"))
         self.csv_folder = os.path.join(self.app_folder, "csv")
@@ -144,22 +159,27 @@ class Tools:
         # Set cert folder
         self.load_config()
 
+    @property
+    def about(self):
+        return self.get_app_info()
+
     @staticmethod
     def get_app_info(item=None):
         """
-        Return app info
+        Return app info, __version__.py is read once per process
+        and long description only when it is asked
         :param item:
         :return:
         """
-        about = {}
-        with c_open(os.path.join(here, "__version__.py"), 'r', 'utf-8') as f:
-            exec (f.read(), about)
-        for i in about:
-            if "__long_description__" in i:
-                try:
-                    about[i] = open(about[i]).read()
-                except IOError:
-                    about[i] = ""
+        if not _about:
+            with c_open(os.path.join(here, "__version__.py"), 'r', 'utf-8') as f:
+                exec (f.read(), _about)
+        about = dict(_about)
+        if item is None or item == "__long_description__":
+            try:
+                about["__long_description__"] = open(_about["__long_description__"]).read()
+            except IOError:
+                about["__long_description__"] = ""
         if item:
             return about[item]
         return about
@@ -203,18 +223,22 @@ class Tools:
 
     def get_logger(self):
         """
-        create and return logger
+        create and return logger, log file is written by a background thread
+        and has a single handler whatever the number of calls
         :return:
         """
         default = self.get_config("default")
         log_file = os.path.join(self.logger_folder(), default["log_file"])
         try:
             logger = logging.getLogger('certgen')
+            logger.setLevel(logging.WARNING)
+            for handler in logger.handlers:
+                if getattr(handler, "log_file", None) == log_file:
+                    return logger
             handler = logging.handlers.TimedRotatingFileHandler(log_file, when="midnight", backupCount=3)
             formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
             handler.setFormatter(formatter)
-            logger.addHandler(handler)
-            logger.setLevel(logging.WARNING)
+            logger.addHandler(queue_handler(handler, log_file=log_file))
             return logger
         except AttributeError as err:
             self.error("[!] Unable to open log file {f}: {e}\n".format(f=default["log_file"], e=err))
@@ -358,6 +382,56 @@ class Tools:
             os.mkdir(path)
             os.chmod(path, 0777)
 
+    @staticmethod
+    def write_atomic(path, data, mode=0644, sync=False):
+        """
+        Write data in a temporary file of the same folder then rename it to path,
+        path never contains a partially written file
+        :param path:
+        :param data:
+        :param mode:
+        :param sync: fsync file before rename and folder after rename
+        :return:
+        """
+        folder, name = os.path.split(path)
+        tmp = os.path.join(folder, ".{n}.{p}.tmp".format(n=name, p=os.getpid()))
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+        try:
+            os.write(fd, data)
+            if sync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.rename(tmp, path)
+        if sync:
+            Tools.sync_folder(folder)
+
+    @staticmethod
+    def sync_file(path):
+        """
+        fsync data of a file already written
+        :param path:
+        :return:
+        """
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def sync_folder(folder):
+        """
+        fsync folder so files created, renamed or removed in it are on disk
+        :param folder:
+        :return:
+        """
+        fd = os.open(folder or ".", os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
     @staticmethod
     def check_extension(_file, ext):
         """
@@ -386,7 +460,7 @@ class Tools:
             click.echo("configure csr.yaml\n")
             subject = get_subject()
             with open(yaml_file, "w") as f:
-                yaml.dump(subject, f)
+                get_yaml().dump(subject, f)
             click.echo("\ncsr.yaml has been configured")
         else:
             self.error("app folder: {p} doesn't exist\nTry \"cert init\" or \"cert config edit\" to create app folder"
@@ -402,7 +476,7 @@ class Tools:
             if not os.path.exists(yaml_file):
                 self.add_config_file()
             with open(yaml_file) as f:
-                yaml_conf = yaml.load(f)
+                yaml_conf = get_yaml().load(f)
             return yaml_conf
         else:
             self.error("app folder: {p} doesn't exist\nTry \"cert init\" or \"cert config edit\" to create app folder"
@@ -0,0 +1,306 @@
+import multiprocessing
+from collections import deque
+from timeit import default_timer
+from OpenSSL import crypto
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+
+# OpenSSL NIDs of EC and Ed25519 keys, not exported by pyOpenSSL
+TYPE_EC = 408
+TYPE_ED25519 = 1087
+
+KEY_TYPES = ("rsa", "ec", "ed25519")
+
+CURVES = {
+    "P-256": ec.SECP256R1,
+    "P-384": ec.SECP384R1,
+    "P-521": ec.SECP521R1
+}
+
+
+def fill_subject(cert, subject, self_signed=False):
+    """
+    add subject to cert
+    :param cert:
+    :param subject:
+    :param self_signed:
+    :return:
+    """
+    if "C" in subject:
+        cert.get_subject().countryName = subject.get("C")
+    if "ST" in subject:
+        cert.get_subject().stateOrProvinceName = subject.get("ST")
+    if "L" in subject:
+        cert.get_subject().localityName = subject.get("L")
+    if "O" in subject:
+        cert.get_subject().organizationName = subject.get("O")
+    if "OU" in subject:
+        cert.get_subject().organizationalUnitName = subject.get("OU")
+    if "CN" in subject:
+        cert.get_subject().CN = subject.get("CN")
+    if "emailAddress" in subject:
+        cert.get_subject().emailAddress = subject.get('emailAddress')
+    if self_signed:
+        cert.set_issuer(cert.get_subject())
+
+
+_extensions = {}
+
+
+def get_extensions(usage, ca, san=None):
+    """
+    Return csr extensions, built once per process for the same values,
+    cache is bounded because each request of cert serve can have its own san
+    :param usage:
+    :param ca: "TRUE" or "FALSE"
+    :param san:
+    :return:
+    """
+    key = (usage, ca, san)
+    if key not in _extensions:
+        if len(_extensions) >= 256:
+            _extensions.clear()
+        x509_extensions = [
+            crypto.X509Extension("keyUsage", False, usage),
+            crypto.X509Extension("basicConstraints", False, "CA:{c}".format(c=ca)),
+        ]
+        if san:
+            x509_extensions.append(crypto.X509Extension("subjectAltName", False, san))
+        _extensions[key] = x509_extensions
+    return _extensions[key]
+
+
+def new_request(subject, extensions):
+    """
+    Create X509Req with subject and extensions
+    :param subject:
+    :param extensions:
+    :return: req
+    """
+    req = crypto.X509Req()
+    fill_subject(req, subject)
+    req.add_extensions(extensions)
+    return req
+
+
+def sign_request(req, key):
+    """
+    Set public key and sign X509Req, Ed25519 requests are rebuilt and signed by cryptography
+    because X509Req.sign requires a digest
+    :param req:
+    :param key:
+    :return: req, a new X509Req for Ed25519
+    """
+    if key.type() == TYPE_ED25519:
+        unsigned = req.to_cryptography()
+        builder = x509.CertificateSigningRequestBuilder().subject_name(unsigned.subject)
+        for extension in unsigned.extensions:
+            builder = builder.add_extension(extension.value, extension.critical)
+        return crypto.X509Req.from_cryptography(builder.sign(key.to_cryptography_key(), None, default_backend()))
+    req.set_pubkey(key)
+    req.sign(key, "sha256")
+    return req
+
+
+def build_request(key, subject, extensions):
+    """
+    Build and sign X509Req with key
+    :param key:
+    :param subject:
+    :param extensions:
+    :return: req
+    """
+    return sign_request(new_request(subject, extensions), key)
+
+
+def generate_key(key_type="rsa", size=2048, curve="P-256"):
+    """
+    Generate private key, EC and Ed25519 keys are generated by cryptography
+    and loaded from PEM (PKey.from_cryptography_key only supports RSA and DSA)
+    :param key_type: rsa, ec or ed25519
+    :param size: rsa key size
+    :param curve: ec curve
+    :return: key
+    """
+    if key_type == "rsa":
+        key = crypto.PKey()
+        key.generate_key(crypto.TYPE_RSA, size)
+        return key
+    if key_type == "ec":
+        private_key = ec.generate_private_key(CURVES[curve](), default_backend())
+        key_format = serialization.PrivateFormat.TraditionalOpenSSL
+    else:
+        private_key = ed25519.Ed25519PrivateKey.generate()
+        key_format = serialization.PrivateFormat.PKCS8
+    pem = private_key.private_bytes(serialization.Encoding.PEM, key_format, serialization.NoEncryption())
+    return crypto.load_privatekey(crypto.FILETYPE_PEM, pem)
+
+
+def key_bits(key_type="rsa", size=2048, curve="P-256"):
+    """
+    Return key size in bits of key type, same as PKey.bits() (253 for Ed25519)
+    :param key_type:
+    :param size:
+    :param curve:
+    :return:
+    """
+    if key_type == "ec":
+        return CURVES[curve].key_size
+    if key_type == "ed25519":
+        return 253
+    return size
+
+
+def generate_key_pem(size):
+    """
+    Worker: generate private key
+    :param size:
+    :return: key pem
+    """
+    key = crypto.PKey()
+    key.generate_key(crypto.TYPE_RSA, size)
+    return crypto.dump_privatekey(crypto.FILETYPE_PEM, key)
+
+
+def sign_job(job):
+    """
+    Worker: generate key, build and sign csr
+    :param job: dict with name, subject, usage, ca, san, key_type, key_size, curve and optional key pem
+    :return: (name, csr pem, key pem, seconds spent in keygen and sign)
+    """
+    start = default_timer()
+    if job.get("key"):
+        key = crypto.load_privatekey(crypto.FILETYPE_PEM, job["key"])
+    else:
+        key = generate_key(job.get("key_type", "rsa"), job["key_size"], job.get("curve", "P-256"))
+    key_done = default_timer()
+    req = build_request(key, job["subject"], get_extensions(job["usage"], job["ca"], job.get("san")))
+    durations = {"keygen": key_done - start, "sign": default_timer() - key_done}
+    return (job["name"],
+            crypto.dump_certificate_request(crypto.FILETYPE_PEM, req),
+            crypto.dump_privatekey(crypto.FILETYPE_PEM, key),
+            durations)
+
+
+_ca = {}
+
+
+def load_ca(cert_file, key_file):
+    """
+    Return CA certificate and key, read once per process
+    :param cert_file:
+    :param key_file:
+    :return: (X509, PKey)
+    """
+    if (cert_file, key_file) not in _ca:
+        with open(cert_file, "rb") as f:
+            cert = crypto.load_certificate(crypto.FILETYPE_PEM, f.read())
+        with open(key_file, "rb") as f:
+            key = crypto.load_privatekey(crypto.FILETYPE_PEM, f.read())
+        _ca[(cert_file, key_file)] = (cert, key)
+    return _ca[(cert_file, key_file)]
+
+
+# csr extensions copied in certificates signed by local CA, basicConstraints is always CA:FALSE
+SIGNED_EXTENSIONS = ("keyUsage", "extendedKeyUsage", "subjectAltName")
+
+
+def ca_sign_job(job):
+    """
+    Worker: sign csr with local CA, extensions of SIGNED_EXTENSIONS are copied from csr, other ones are dropped
+    so a csr can't get a CA certificate
+    :param job: dict with name, csr path, serial, days and ca (certificate and key paths)
+    :return: (name, certificate pem or None, seconds spent in sign, error)
+    """
+    start = default_timer()
+    try:
+        ca_cert, ca_key = load_ca(*job["ca"])
+        with open(job["csr"], "rb") as f:
+            req = crypto.load_certificate_request(crypto.FILETYPE_PEM, f.read())
+        req.verify(req.get_pubkey())
+        cert = crypto.X509()
+        cert.set_version(2)
+        cert.set_serial_number(job["serial"])
+        cert.set_subject(req.get_subject())
+        cert.set_issuer(ca_cert.get_subject())
+        cert.set_pubkey(req.get_pubkey())
+        cert.gmtime_adj_notBefore(0)
+        cert.gmtime_adj_notAfter(job["days"] * 86400)
+        cert.add_extensions([ext for ext in req.get_extensions() if ext.get_short_name() in SIGNED_EXTENSIONS])
+        cert.add_extensions([
+            crypto.X509Extension("basicConstraints", True, "CA:FALSE"),
+            crypto.X509Extension("subjectKeyIdentifier", False, "hash", subject=cert),
+            crypto.X509Extension("authorityKeyIdentifier", False, "keyid:always", issuer=ca_cert),
+        ])
+        cert.sign(ca_key, "sha256")
+        pem, error = crypto.dump_certificate(crypto.FILETYPE_PEM, cert), None
+    except (IOError, crypto.Error) as e:
+        pem, error = None, str(e) or e.__class__.__name__
+    return job["name"], pem, {"ca-sign": default_timer() - start}, error
+
+
+class WorkerPool:
+    def __init__(self, jobs, initializer=None):
+        """
+        Process pool used by bulk commands
+        :param jobs: number of worker processes
+        :param initializer: called by each worker when it starts
+        """
+        self.jobs = jobs
+        self.initializer = initializer
+        self.pool = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(terminate=exc_type is not None)
+
+    def start(self):
+        """
+        Start worker processes
+        :return: self
+        """
+        self.pool = multiprocessing.Pool(processes=self.jobs, initializer=self.initializer)
+        return self
+
+    def close(self, terminate=False):
+        """
+        Stop worker processes
+        :param terminate: stop workers without waiting for pending jobs
+        :return:
+        """
+        if terminate:
+            self.pool.terminate()
+        else:
+            self.pool.close()
+        self.pool.join()
+
+    def imap(self, func, iterable, window=None):
+        """
+        Ordered lazy map over iterable, at most window items are submitted
+        and not yet consumed so iterable is never read ahead
+        :param func:
+        :param iterable:
+        :param window: default is 4 items per worker
+        :return:
+        """
+        window = window or self.jobs * 4
+        pending = deque()
+        for item in iterable:
+            pending.append(self.pool.apply_async(func, (item,)))
+            if len(pending) >= window:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+    def submit(self, func, item):
+        """
+        Queue func(item) for a worker
+        :param func:
+        :param item:
+        :return: AsyncResult, get(timeout) raises multiprocessing.TimeoutError when timeout expires
+        """
+        return self.pool.apply_async(func, (item,))
@@ -47,7 +47,11 @@ setup(
     description=about('__description__'),
     long_description=long_description(),
     py_modules='cert',
-    install_requires=['click', 'PyYAML', 'pyOpenSSL', 'ruamel.yaml'],
+    install_requires=['click', 'cryptography', 'PyYAML', 'pyOpenSSL', 'ruamel.yaml'],
+    extras_require={
+        # pip install --editable .[dev]
+        'dev': ['pytest<5', 'pytest-benchmark<3.3'],
+    },
     packages=find_packages(),
     include_package_data=True,
     package_data={